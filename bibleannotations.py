@@ -0,0 +1,339 @@
+"""
+Tags and notes on verses
+
+Verses can be tagged ("memorize", "promises") and given a note, and both
+can be searched along with the text (see biblequery.py):
+
+    tag:memorize love               tagged verses with love in them
+    tag:memorize OR tag:promises
+    note:wedding book:Ro            verses in Romans whose note says wedding
+
+The corpus and its word index are compiled once and mapped read only (see
+biblecorpus.py), so annotations are a small index of their own beside it,
+held in memory: tag -> verses and note word -> verses, as sets, and sorted
+posting arrays of them made when a query asks and kept until the next
+change.  The query planner reads tag:name and note:word like any word's
+postings, so they merge with the text index at query time.
+
+Every change is appended to a log file, one JSON record per line, and
+flushed to disk before it's applied in memory, so a new tag is one small
+write and a few set operations however big the text or how many
+annotations there are, and nothing is ever re-indexed.  Opening replays
+the log; a line a crash cut short is skipped.  Verses are recorded by
+book, chapter and verse rather than ordinal, so the log keeps its meaning
+when the text is recompiled.  compact() rewrites the log with only what is
+current.
+
+    {"op": "tag", "book": "Joh", "chapter": 3, "verse": 16, "tag": "memorize"}
+    {"op": "untag", "book": "Joh", "chapter": 3, "verse": 16, "tag": "memorize"}
+    {"op": "note", "book": "Joh", "chapter": 3, "verse": 16, "text": "..."}
+
+Usage:
+    annotations = Annotations(corpus, "biblesearch.notes.log")
+    annotations.tag(ordinal, "memorize")
+    annotations.note(ordinal, "read at the wedding")
+    annotations.postings("tag", "memorize")     array of ordinals
+    annotations.close()
+"""
+import json
+import os
+import re
+from array import array
+
+from bibleindex import POSTING_TYPE, tokenize
+
+# what a tag can be called: letters, digits, _ and -
+TAG_RE = re.compile(r"[\w-]+")
+
+
+def notes_path(path):
+    """
+    Where the annotations of a text go.
+
+    Parameters:
+    - path (str): The text file or its compiled .bin.
+
+    Returns:
+    - str: Same path with a .notes.log extension.
+    """
+    return os.path.splitext(path)[0] + ".notes.log"
+
+
+def tag_name(name):
+    """
+    The form a tag is stored and searched in.
+
+    Parameters:
+    - name (str): Tag as typed.
+
+    Returns:
+    - str: Lower case tag.
+
+    Raises:
+    - ValueError: If it isn't letters, digits, _ and - only.
+    """
+    if not TAG_RE.fullmatch(name):
+        raise ValueError("a tag is letters, digits, _ and - only: %r" % name)
+    return name.lower()
+
+
+class Annotations:
+    """
+    Tags and notes of one corpus, in memory and in an append only log.
+
+    Parameters:
+    - corpus (Corpus): The verses being annotated.
+    - path (str, optional): Log file, replayed now and appended to on every
+      change; annotations only live in memory if not given.
+    - sync (bool): fsync after every change, not just flush.
+
+    Attributes:
+    - generation (int): Goes up with every change, for caching searches.
+    - records (int): Records in the log.
+    - skipped (int): Records replayed that were cut short or are for verses
+      this corpus doesn't have.
+    """
+
+    def __init__(self, corpus, path=None, sync=True):
+        self.corpus = corpus
+        self.path = path
+        self.sync = sync
+        self.generation = 0
+        self.records = 0
+        self.skipped = 0
+        self._tags = {}
+        self._verse_tags = {}
+        self._notes = {}
+        self._words = {}
+        self._postings = {}
+        self._log = None
+        if path is not None:
+            self._replay()
+            self._log = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            data = f.read()
+        for line in data.splitlines():
+            self.records += 1
+            try:
+                record = json.loads(line)
+                ordinal = self._ordinal(record)
+                if ordinal is not None:
+                    self._apply(record, ordinal)
+                    continue
+            except (ValueError, KeyError, TypeError, AttributeError):
+                pass
+            self.skipped += 1
+        if data and not data.endswith(b"\n"):
+            # finish the cut short line so the next record starts on its own
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+
+    def _ordinal(self, record):
+        book = self.corpus.find_book(record["book"])
+        if book is None:
+            return None
+        return self.corpus.verse_ordinal(book, record["chapter"], record["verse"])
+
+    def _write(self, op, ordinal, **fields):
+        # to the log first, then memory
+        corpus = self.corpus
+        record = {
+            "op": op,
+            "book": corpus.books[corpus.book[ordinal]],
+            "chapter": corpus.chapter[ordinal],
+            "verse": corpus.verse[ordinal],
+        }
+        record.update(fields)
+        if self._log is not None:
+            self._log.write(json.dumps(record) + "\n")
+            self._log.flush()
+            if self.sync:
+                os.fsync(self._log.fileno())
+        self.records += 1
+        self._apply(record, ordinal)
+
+    def _apply(self, record, ordinal):
+        op = record["op"]
+        if op == "tag":
+            name = record["tag"]
+            self._tags.setdefault(name, set()).add(ordinal)
+            self._verse_tags.setdefault(ordinal, set()).add(name)
+            self._postings.pop(("tag", name), None)
+        elif op == "untag":
+            name = record["tag"]
+            _discard(self._tags, name, ordinal)
+            _discard(self._verse_tags, ordinal, name)
+            self._postings.pop(("tag", name), None)
+        elif op == "note":
+            text = record["text"]
+            for word in set(tokenize(self._notes.pop(ordinal, ""))):
+                _discard(self._words, word, ordinal)
+                self._postings.pop(("note", word), None)
+            if text:
+                self._notes[ordinal] = text
+                for word in set(tokenize(text)):
+                    self._words.setdefault(word, set()).add(ordinal)
+                    self._postings.pop(("note", word), None)
+        else:
+            raise ValueError("unknown annotation: %r" % op)
+        self.generation += 1
+
+    def tag(self, ordinal, name):
+        """
+        Tag a verse.
+
+        Parameters:
+        - ordinal (int): The verse.
+        - name (str): Tag, any case, see tag_name().
+
+        Returns:
+        - bool: False if the verse already had the tag.
+
+        Raises:
+        - ValueError: For a tag that can't be used.
+        """
+        name = tag_name(name)
+        if name in self._verse_tags.get(ordinal, ()):
+            return False
+        self._write("tag", ordinal, tag=name)
+        return True
+
+    def untag(self, ordinal, name):
+        """
+        Take a tag off a verse.
+
+        Parameters:
+        - ordinal (int): The verse.
+        - name (str): Tag, any case.
+
+        Returns:
+        - bool: False if the verse didn't have the tag.
+        """
+        name = name.lower()
+        if name not in self._verse_tags.get(ordinal, ()):
+            return False
+        self._write("untag", ordinal, tag=name)
+        return True
+
+    def note(self, ordinal, text):
+        """
+        Set a verse's note, replacing any it had.
+
+        Parameters:
+        - ordinal (int): The verse.
+        - text (str): The note, empty to remove it.
+
+        Returns:
+        - bool: False if the note was already that.
+        """
+        text = text.strip()
+        if self._notes.get(ordinal, "") == text:
+            return False
+        self._write("note", ordinal, text=text)
+        return True
+
+    def tags(self, ordinal=None):
+        """
+        Parameters:
+        - ordinal (int, optional): A verse.
+
+        Returns:
+        - dict[str, int] or list[str]: Every tag and how many verses have
+          it, by name; or the tags of one verse, sorted.
+        """
+        if ordinal is None:
+            return {name: len(self._tags[name]) for name in sorted(self._tags)}
+        return sorted(self._verse_tags.get(ordinal, ()))
+
+    def note_of(self, ordinal):
+        """
+        Returns:
+        - str or None: The note on a verse, None if it has none.
+        """
+        return self._notes.get(ordinal)
+
+    def postings(self, kind, value):
+        """
+        Verses with a tag or with a word in their note, for the query
+        planner.
+
+        Parameters:
+        - kind (str): "tag" or "note".
+        - value (str): Tag name or note word (a token, see tokenize()).
+
+        Returns:
+        - array: Sorted verse ordinals, don't modify it.
+        """
+        key = (kind, value.lower())
+        found = self._postings.get(key)
+        if found is None:
+            verses = (self._tags if kind == "tag" else self._words).get(key[1], ())
+            found = self._postings[key] = array(POSTING_TYPE, sorted(verses))
+        return found
+
+    def compact(self):
+        """
+        Rewrite the log with one record per current tag and note, dropping
+        removed ones and records for verses the corpus doesn't have.
+        """
+        if self.path is None:
+            return
+        corpus = self.corpus
+        lines = []
+        for ordinal in sorted(set(self._verse_tags) | set(self._notes)):
+            where = {
+                "book": corpus.books[corpus.book[ordinal]],
+                "chapter": corpus.chapter[ordinal],
+                "verse": corpus.verse[ordinal],
+            }
+            for name in sorted(self._verse_tags.get(ordinal, ())):
+                lines.append(json.dumps({"op": "tag", **where, "tag": name}))
+            if ordinal in self._notes:
+                text = self._notes[ordinal]
+                lines.append(json.dumps({"op": "note", **where, "text": text}))
+        temp = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(temp, self.path)
+        self._log = open(self.path, "a", encoding="utf-8")
+        self.records = len(lines)
+        self.skipped = 0
+
+    def stats(self):
+        """
+        Returns:
+        - dict: tags, tagged verses, notes, log records and skipped ones.
+        """
+        return {
+            "tags": len(self._tags),
+            "tagged": len(self._verse_tags),
+            "notes": len(self._notes),
+            "records": self.records,
+            "skipped": self.skipped,
+        }
+
+    def close(self):
+        """
+        Close the log, later changes are kept in memory only.
+        """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def _discard(index, key, value):
+    # take value out of index[key], and the key out once it's empty
+    values = index.get(key)
+    if values is not None:
+        values.discard(value)
+        if not values:
+            del index[key]
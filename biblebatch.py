@@ -0,0 +1,267 @@
+"""
+Batch mode: run a file of commands against one loaded corpus
+
+Takes the same commands as the interactive biblesearch.py prompt, one per
+line, and writes the results as JSON Lines or TSV with no prompts, help
+text or colours:
+
+    Joh 3:16-21; Ro 8           reference list
+    Re,22                       a chapter
+    Re,22,3                     a verse
+    S love AND brother          a search (S: love works too)
+
+Blank lines and lines starting with # are skipped.  The corpus is loaded
+once; with --jobs the commands are shared out to a pool of processes that
+each attach to the same compiled biblesearch.bin (see biblecorpus.py), and
+the results still come out in input order.
+
+Output, one JSON object per command:
+    {"line": 1, "command": "Re,22,3", "count": 1,
+     "verses": [{"ref": "Re 22:3", "text": "..."}]}
+    {"line": 2, "command": "Xx 1", "error": "no such book: Xx"}
+or with --format tsv one row per verse, line <tab> command <tab> ref <tab>
+text, with errors reported on stderr.
+
+Usage:
+    python biblebatch.py [queries.txt|-] [--format jsonl|tsv] [--jobs 4]
+                         [--mode regex|word] [--refs-only]
+                         [--source biblesearch.txt]
+"""
+import argparse
+import json
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bibleengine import BibleEngine
+from biblerefs import looks_like_refs, parse_refs
+
+# commands handed to a worker process at a time
+CHUNK_SIZE = 256
+
+# the engine and options of this process, see _start_worker()
+_engine = None
+_options = None
+
+# (engine, every reference string), see ref_table()
+_refs = (None, None)
+
+
+def run_command(engine, command, mode="regex"):
+    """
+    Run one command the way the interactive prompt would.
+
+    Parameters:
+    - engine (BibleEngine): Loaded engine.
+    - command (str): A reference list, "B,C", "B,C,V" or "S <search>".
+    - mode (str): Search mode for S commands, see BibleEngine.search().
+
+    Returns:
+    - list[int]: Verse ordinals, in order.
+
+    Raises:
+    - ValueError: For an unknown command, reference or invalid search.
+    """
+    # S first, "S 12" would otherwise look like a book S, chapter 12
+    if command[:1] in ("S", "s") and command[1:2] in ("", " ", ":", "\t"):
+        search = command[1:].lstrip(" :\t")
+        if not search:
+            raise ValueError("nothing to search for")
+        try:
+            return engine.search(search, mode=mode)
+        except re.error as e:
+            raise ValueError("invalid search: %s" % e)
+
+    if looks_like_refs(command):
+        return _ordinals(parse_refs(engine.corpus, command))
+
+    params = [part.strip() for part in command.split(",")]
+    if len(params) == 2:
+        span = engine.chapter_range(*params)
+        if span is None:
+            raise ValueError("no such book, chapter: %s %s" % tuple(params))
+        return range(*span)
+    if len(params) == 3 and params[2].isdigit():
+        book, chapter, verse = params
+        ref = "%s %s:%s" % (book, chapter, verse)
+        return _ordinals(parse_refs(engine.corpus, ref))
+    raise ValueError("not a reference, B,C, B,C,V or S command")
+
+
+def _ordinals(ranges):
+    ordinals = []
+    for first, end in ranges:
+        ordinals.extend(range(first, end))
+    return ordinals
+
+
+def ref_table(engine):
+    """
+    Every reference string of the corpus, made once per process.  A batch
+    prints the same verses over and over, formatting them each time is
+    most of its work.
+
+    Parameters:
+    - engine (BibleEngine): Loaded engine.
+
+    Returns:
+    - list[str]: Reference by ordinal, e.g. "Ge 1:1".
+    """
+    global _refs
+    if _refs[0] is not engine:
+        ref = engine.corpus.ref
+        _refs = (engine, [ref(ordinal) for ordinal in range(len(engine))])
+    return _refs[1]
+
+
+def format_result(engine, lineno, command, options):
+    """
+    Run a command and format its output.
+
+    Parameters:
+    - engine (BibleEngine): Loaded engine.
+    - lineno (int): Line number in the input, to match results up.
+    - command (str): The command.
+    - options (dict): format, mode and refs_only.
+
+    Returns:
+    - tuple[str, str]: (output, error message).  JSON Lines output carries
+      the error too, TSV output is empty for a failed command.
+    """
+    try:
+        ordinals = run_command(engine, command, options["mode"])
+    except ValueError as e:
+        error = "line %d: %s: %s\n" % (lineno, command, e)
+        if options["format"] == "tsv":
+            return "", error
+        record = {"line": lineno, "command": command, "error": str(e)}
+        return json.dumps(record, ensure_ascii=False) + "\n", error
+
+    refs = ref_table(engine)
+    text = engine.corpus.text
+    if options["format"] == "tsv":
+        prefix = "%d\t%s\t" % (lineno, command.replace("\t", " "))
+        if options["refs_only"]:
+            rows = [prefix + refs[ordinal] + "\n" for ordinal in ordinals]
+        else:
+            rows = [
+                prefix + refs[ordinal] + "\t" + " ".join(text(ordinal).split()) + "\n"
+                for ordinal in ordinals
+            ]
+        return "".join(rows), ""
+
+    if options["refs_only"]:
+        found = [refs[ordinal] for ordinal in ordinals]
+    else:
+        found = [{"ref": refs[ordinal], "text": text(ordinal)} for ordinal in ordinals]
+    record = {
+        "line": lineno,
+        "command": command,
+        "count": len(ordinals),
+        "verses": found,
+    }
+    return json.dumps(record, ensure_ascii=False) + "\n", ""
+
+
+def _start_worker(cache, options):
+    global _engine, _options
+    _engine = BibleEngine.attach(cache)
+    _options = options
+
+
+def _work(item):
+    lineno, command = item
+    return format_result(_engine, lineno, command, _options)
+
+
+def read_commands(lines):
+    """
+    Numbered commands from input lines, skipping blanks and # comments.
+
+    Parameters:
+    - lines (iterable[str]): Input lines.
+
+    Returns:
+    - iterator[tuple[int, str]]: (line number, command).
+    """
+    for lineno, line in enumerate(lines, start=1):
+        command = line.strip()
+        if command and not command.startswith("#"):
+            yield lineno, command
+
+
+def run_batch(commands, source, options, jobs=1, out=sys.stdout, err=sys.stderr):
+    """
+    Run every command and write the results in input order.
+
+    Parameters:
+    - commands (iterable[tuple[int, str]]): See read_commands().
+    - source (str): Path to the text file.
+    - options (dict): format, mode and refs_only.
+    - jobs (int): Worker processes, 1 runs everything in this process, as
+      does a corpus that couldn't be compiled to a file.
+    - out (file): Where results go.
+    - err (file): Where TSV errors go, JSON Lines has them inline.
+
+    Returns:
+    - int: Number of commands that failed.
+    """
+    # loading here compiles biblesearch.bin if needed, workers attach to it;
+    # if it couldn't be written the corpus is only in this process's memory
+    # and there's nothing for workers to attach to
+    engine = BibleEngine(source)
+    pool = None
+    if jobs > 1 and engine.corpus.path is not None:
+        pool = ProcessPoolExecutor(
+            jobs, initializer=_start_worker, initargs=(engine.corpus.path, options)
+        )
+        results = pool.map(_work, commands, chunksize=CHUNK_SIZE)
+    else:
+        results = (
+            format_result(engine, lineno, command, options)
+            for lineno, command in commands
+        )
+
+    failed = 0
+    try:
+        for output, error in results:
+            out.write(output)
+            if error:
+                failed += 1
+                if options["format"] == "tsv":
+                    err.write(error)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    out.flush()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run biblesearch commands from a file or stdin"
+    )
+    parser.add_argument(
+        "input", nargs="?", default="-", help="file of commands, - for stdin"
+    )
+    parser.add_argument("--format", choices=("jsonl", "tsv"), default="jsonl")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes")
+    parser.add_argument("--mode", choices=("regex", "word"), default="regex")
+    parser.add_argument(
+        "--refs-only", action="store_true", help="leave out verse text"
+    )
+    parser.add_argument("--source", default="biblesearch.txt")
+    args = parser.parse_args()
+
+    options = {"format": args.format, "mode": args.mode, "refs_only": args.refs_only}
+    if args.input == "-":
+        lines = sys.stdin
+    else:
+        lines = open(args.input, encoding="utf-8")
+    with lines:
+        failed = run_batch(read_commands(lines), args.source, options, args.jobs)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
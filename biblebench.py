@@ -0,0 +1,536 @@
+"""
+Benchmarks for loading, lookups, searches and formatting
+
+Runs against a synthetic corpus shaped like the KJV (66 books, 1,189
+chapters, about 31,100 verses of about 26 words, a Zipf distributed
+vocabulary of about 12,800 words) so it needs no data file and gives the
+same numbers on every machine for the same seed.  The corpus is written to
+a temporary directory, biblesearch.txt and biblesearch.bin are not touched.
+
+Every benchmark reports ops/sec, latency percentiles and the peak memory
+traced while running it (measured in a separate pass, tracemalloc slows
+everything down).  The report is JSON so runs can be kept and compared:
+
+    python biblebench.py --output before.json
+    ... change things ...
+    python biblebench.py --compare before.json
+
+--compare prints the change in median latency for each benchmark and exits
+with status 1 if any got slower than --tolerance allows.
+
+Usage:
+    python biblebench.py [--seed 1] [--verses 31102] [--ops 1000]
+                         [--only search_rare ...] [--output FILE]
+                         [--compare FILE] [--tolerance 0.25]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from biblecache import QueryCache
+from biblecorpus import CORPUS_VERSION, compile_corpus
+from bibleengine import BOOK_NAMES, BibleEngine
+from bibleload import percentile
+from biblerender import DEFAULT_WIDTH, Renderer
+
+# chapters per book, in BOOK_NAMES order
+KJV_CHAPTERS = (
+    50, 40, 27, 36, 34, 24, 21, 4, 31, 24, 22, 25, 29, 36, 10, 13, 10, 42, 150,
+    31, 12, 8, 66, 52, 5, 48, 12, 14, 3, 9, 1, 4, 7, 3, 3, 3, 2, 14, 4, 28, 16,
+    24, 21, 28, 16, 16, 13, 6, 6, 4, 4, 5, 3, 6, 4, 3, 1, 13, 5, 5, 3, 5, 1, 1,
+    1, 22,
+)  # fmt: skip
+KJV_VERSES = 31102
+VOCABULARY = 12800
+
+# quick benchmarks go through their operations again until they've run at
+# least this long, a few hundred microseconds of timings is mostly noise
+MIN_SECONDS = 0.5
+MAX_REPEAT = 1000
+
+# the most frequent KJV words, in order, then words the benchmarks search
+# for placed at about their KJV rank; everything else is made up
+COMMON_WORDS = (
+    "the and of to that in he shall unto for i his a lord they be is him not "
+    "them it with all thou thy was god which my me said but ye their have will "
+    "thee from as are when this out were upon man by you israel king son up "
+    "there hath then people came had house into on her come one we children s "
+    "before your also day land men go against us so"
+).split()
+RANKED_WORDS = {
+    "jesus": 150,
+    "christ": 250,
+    "love": 300,
+    "brother": 400,
+    "light": 450,
+    "faith": 700,
+    "hope": 900,
+    "wept": 1200,
+    "nebuchadnezzar": 1500,
+    "neighbour": 1800,
+    "charity": 2500,
+}
+SYLLABLES = (
+    "ab ad al am an ar ba be da de el en er ha he hi ia im ja ka la li ma me "
+    "mi na ne ni on or pa ra re ri sa se sh ta th ul ur za ze"
+).split()
+
+
+def make_vocabulary(rnd, size=VOCABULARY):
+    """
+    Words in frequency order: the common KJV words first, the searched for
+    words at their ranks, made up words everywhere else.
+    """
+    words = list(COMMON_WORDS)
+    seen = set(words) | set(RANKED_WORDS)
+    while len(words) < size:
+        word = "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    for word, rank in sorted(RANKED_WORDS.items(), key=lambda item: item[1]):
+        words.insert(rank, word)
+    return words[:size]
+
+
+def generate_corpus(seed=1, verses=KJV_VERSES):
+    """
+    A synthetic text file in the format of biblesearch.txt.
+
+    Parameters:
+    - seed (int): Same seed, same corpus.
+    - verses (int): About how many verses to make.
+
+    Returns:
+    - bytes: The text file contents, CRLF line endings like the original.
+    """
+    rnd = random.Random(seed)
+    words = make_vocabulary(rnd)
+    # Zipf: the word of rank r turns up in proportion to 1 / r
+    weights = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        weights.append(total)
+
+    chapters = [
+        (abbrev, chapter)
+        for abbrev, count in zip(BOOK_NAMES, KJV_CHAPTERS)
+        for chapter in range(1, count + 1)
+    ]
+    sizes = [rnd.uniform(0.3, 1.7) for _ in chapters]
+    scale = verses / sum(sizes)
+    sizes = [max(1, round(size * scale)) for size in sizes]
+
+    lines = []
+    new_testament = list(BOOK_NAMES).index("Mt")
+    book_index = {abbrev: k for k, abbrev in enumerate(BOOK_NAMES)}
+    for (abbrev, chapter), size in zip(chapters, sizes):
+        for verse in range(1, size + 1):
+            text = rnd.choices(words, cum_weights=weights, k=rnd.randint(8, 44))
+            if book_index[abbrev] >= new_testament and rnd.random() < 0.06:
+                text[1:1] = ["Jesus", "said"]
+            if rnd.random() < 0.05:
+                text.insert(3, "[was]")
+            text[0] = text[0].capitalize()
+            lines.append("%s %d:%d %s." % (abbrev, chapter, verse, " ".join(text)))
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def measure(ops):
+    """
+    Time a list of zero argument callables (going through it again until
+    MIN_SECONDS have passed), then run them once more under tracemalloc for
+    the peak memory.
+
+    Parameters:
+    - ops (list[callable]): One call is one operation.
+
+    Returns:
+    - dict: ops, seconds, ops_per_sec, p50/p90/p99/max in ms, peak_kb.
+    """
+    timer = time.perf_counter
+    latencies = []
+    start = timer()
+    for _ in range(MAX_REPEAT):
+        for op in ops:
+            begin = timer()
+            op()
+            latencies.append(timer() - begin)
+        if timer() - start >= MIN_SECONDS:
+            break
+    seconds = timer() - start
+
+    tracemalloc.start()
+    try:
+        for op in ops:
+            op()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return summarize(latencies, seconds, peak)
+
+
+def summarize(latencies, seconds, peak):
+    """
+    Returns:
+    - dict: ops, seconds, ops_per_sec, p50/p90/p99/max in ms, peak_kb.
+    """
+    latencies = sorted(latencies)
+    return {
+        "ops": len(latencies),
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(len(latencies) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def bench_cold_load(ctx):
+    # a fresh interpreter opening the compiled corpus, what starting
+    # biblesearch.py costs before the prompt; timed without tracemalloc,
+    # then run once more with it for the peak
+    script = (
+        "import sys, tracemalloc\n"
+        "trace = len(sys.argv) > 1\n"
+        "if trace: tracemalloc.start()\n"
+        "sys.path.insert(0, %r)\n"
+        "from bibleengine import BibleEngine\n"
+        "BibleEngine(%r).search('love')\n"
+        "if trace: print(tracemalloc.get_traced_memory()[1])\n"
+    ) % (os.path.dirname(os.path.abspath(__file__)), ctx["source"])
+    latencies = []
+    for _ in range(ctx["runs"]):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, "-c", script], check=True)
+        latencies.append(time.perf_counter() - begin)
+    output = subprocess.run(
+        [sys.executable, "-c", script, "trace"],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return summarize(latencies, sum(latencies), int(output))
+
+
+def bench_compile(ctx):
+    raw = ctx["raw"]
+    latencies = []
+    for _ in range(ctx["runs"]):
+        begin = time.perf_counter()
+        compile_corpus(raw)
+        latencies.append(time.perf_counter() - begin)
+    tracemalloc.start()
+    try:
+        compile_corpus(raw)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return summarize(latencies, sum(latencies), peak)
+
+
+def bench_lookup(ctx):
+    engine, rnd = ctx["engine"], ctx["rnd"]
+    refs = []
+    for _ in range(ctx["ops"]):
+        verse = engine.verse(rnd.randrange(len(engine)))
+        last = verse.number + rnd.randint(0, 5)
+        last = min(last, engine.count(None, engine.scope(verse.book, verse.chapter)))
+        refs.append("%s %d:%d-%d" % (verse.book, verse.chapter, verse.number, last))
+    return measure(
+        [lambda ref=ref: [v.text for v in engine.lookup(ref)] for ref in refs]
+    )
+
+
+def bench_chapter(ctx):
+    engine, rnd = ctx["engine"], ctx["rnd"]
+    books = engine.books()
+    chapters = []
+    for _ in range(ctx["ops"]):
+        book = rnd.choice(books)
+        chapters.append((book.name, rnd.randint(1, book.chapters)))
+    return measure(
+        [
+            lambda book=book, chapter=chapter: [
+                verse.text for verse in engine.iter_chapter(book, chapter)
+            ]
+            for book, chapter in chapters
+        ]
+    )
+
+
+def _uncached(ctx, queries, mode):
+    engine = ctx["uncached"]
+    return measure(
+        [lambda query=query: engine.search(query, mode=mode) for query in queries]
+    )
+
+
+def bench_search_rare(ctx):
+    index, rnd = ctx["engine"].index, ctx["rnd"]
+    rare = sorted(
+        word for word, hits in index.postings.items() if 1 <= len(hits) <= 5
+    )
+    return _uncached(ctx, [rnd.choice(rare) for _ in range(ctx["ops"])], "word")
+
+
+def bench_search_common(ctx):
+    words = COMMON_WORDS[:10]
+    queries = [words[k % len(words)] for k in range(ctx["ops"] // 10)]
+    return _uncached(ctx, queries, "word")
+
+
+def bench_search_phrase(ctx):
+    engine, rnd = ctx["engine"], ctx["rnd"]
+    queries = []
+    for _ in range(ctx["ops"]):
+        words = engine.verse(rnd.randrange(len(engine))).text.strip(".").split()
+        start = rnd.randrange(max(1, len(words) - 3))
+        queries.append('"%s"' % " ".join(words[start : start + 3]))
+    return _uncached(ctx, queries, "word")
+
+
+def bench_search_query(ctx):
+    queries = [
+        "love AND brother book:Mt-Joh",
+        "faith NEAR/5 hope",
+        "(love OR charity) NOT hate chapter:1-5",
+        "jesus wept",
+    ]
+    queries = [queries[k % len(queries)] for k in range(ctx["ops"])]
+    return _uncached(ctx, queries, "word")
+
+
+REGEX_QUERIES = ["l.ve", "neighbou?r", r"\bwept\b", "^And"]
+
+
+def bench_search_regex(ctx):
+    # the CLI's regex mode, a full scan for anything but plain words
+    count = max(len(REGEX_QUERIES), ctx["ops"] // 100)
+    queries = [REGEX_QUERIES[k % len(REGEX_QUERIES)] for k in range(count)]
+    return _uncached(ctx, queries, "regex")
+
+
+def bench_search_regex_jobs(ctx):
+    # the same scans on a process per core (at least two), compare with
+    # search_regex; the pool is started before timing
+    engine = BibleEngine(corpus=ctx["engine"].corpus)
+    engine.query_cache = QueryCache(max_entries=0)
+    engine.parallel_scan(max(2, os.cpu_count() or 1))
+    try:
+        engine.search(REGEX_QUERIES[0], mode="regex")
+        count = max(len(REGEX_QUERIES), ctx["ops"] // 100)
+        queries = [REGEX_QUERIES[k % len(REGEX_QUERIES)] for k in range(count)]
+        return measure(
+            [lambda query=query: engine.search(query, mode="regex") for query in queries]
+        )
+    finally:
+        engine.parallel_scan(1)
+
+
+def bench_search_ranked(ctx):
+    # the best 20 of a common word, compare with search_common for what
+    # ranking adds
+    engine = ctx["uncached"]
+    words = COMMON_WORDS[:10]
+    queries = [words[k % len(words)] for k in range(ctx["ops"] // 10)]
+    return measure(
+        [lambda query=query: engine.ranked(query, limit=20) for query in queries]
+    )
+
+
+def bench_spell(ctx):
+    # "did you mean" for a word with one letter dropped, doubled, swapped or
+    # changed, and autocomplete of its first three letters
+    engine, rnd = ctx["engine"], ctx["rnd"]
+    speller = engine.speller()
+    words = [word for word in speller.words if len(word) >= 5]
+    ops = []
+    for _ in range(ctx["ops"] // 2):
+        word = rnd.choice(words)
+        i = rnd.randrange(len(word) - 1)
+        typo = rnd.choice(
+            [
+                word[:i] + word[i + 1 :],
+                word[:i] + word[i] + word[i:],
+                word[:i] + word[i + 1] + word[i] + word[i + 2 :],
+                word[:i] + "e" + word[i + 1 :],
+            ]
+        )
+        ops.append(lambda typo=typo: speller.correct(typo))
+        ops.append(lambda word=word: speller.complete(word[:3]))
+    return measure(ops)
+
+
+def bench_search_cached(ctx):
+    engine = ctx["engine"]
+    engine.search("love")
+    return measure([lambda: engine.search("love")] * ctx["ops"])
+
+
+def bench_format_cli(ctx):
+    # what biblesearch.py prints per verse, wrapped and coloured; its
+    # renderer is timed directly, importing the CLI would set up the terminal
+    engine, rnd = ctx["engine"], ctx["rnd"]
+    renderer = Renderer(width=DEFAULT_WIDTH, color=True)
+    verses = [engine.verse(rnd.randrange(len(engine))) for _ in range(ctx["ops"])]
+    return measure([lambda verse=verse: renderer.format(verse) for verse in verses])
+
+
+def bench_format_json(ctx):
+    # what bibleserver.py sends per page of search results
+    from bibleserver import verse_json
+
+    engine = ctx["engine"]
+    hits = engine.search("love")
+    pages = [hits[k : k + 50] for k in range(0, len(hits), 50)][: ctx["ops"]]
+    return measure(
+        [
+            lambda page=page: json.dumps([verse_json(v) for v in engine.verses(page)])
+            for page in pages
+        ]
+    )
+
+
+BENCHMARKS = {
+    "cold_load": bench_cold_load,
+    "compile": bench_compile,
+    "lookup": bench_lookup,
+    "chapter": bench_chapter,
+    "search_rare": bench_search_rare,
+    "search_common": bench_search_common,
+    "search_phrase": bench_search_phrase,
+    "search_query": bench_search_query,
+    "search_regex": bench_search_regex,
+    "search_regex_jobs": bench_search_regex_jobs,
+    "search_ranked": bench_search_ranked,
+    "spell": bench_spell,
+    "search_cached": bench_search_cached,
+    "format_cli": bench_format_cli,
+    "format_json": bench_format_json,
+}
+
+
+def run_benchmarks(seed=1, verses=KJV_VERSES, ops=1000, runs=5, only=None):
+    """
+    Generate the corpus and run the benchmarks.
+
+    Parameters:
+    - seed (int): Corpus and query seed.
+    - verses (int): Corpus size.
+    - ops (int): Operations per benchmark (some use a fraction of it).
+    - runs (int): Runs of the slow benchmarks, cold_load and compile.
+    - only (list[str], optional): Names of the benchmarks to run.
+
+    Returns:
+    - dict: The report.
+    """
+    raw = generate_corpus(seed, verses)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "biblesearch.txt")
+        with open(source, "wb") as f:
+            f.write(raw)
+        engine = BibleEngine(source)
+        uncached = BibleEngine(corpus=engine.corpus)
+        uncached.query_cache = QueryCache(max_entries=0)
+        ctx = {
+            "raw": raw,
+            "source": source,
+            "engine": engine,
+            "uncached": uncached,
+            "ops": ops,
+            "runs": runs,
+        }
+
+        results = {}
+        for name, bench in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            # every benchmark gets the same queries whatever else runs
+            ctx["rnd"] = random.Random("%s-%s" % (seed, name))
+            results[name] = bench(ctx)
+
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_version": CORPUS_VERSION,
+        "corpus": {
+            "seed": seed,
+            "verses": len(engine),
+            "words": len(engine.index.postings),
+            "bytes": len(raw),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Print the change in median latency against an earlier report.  The
+    median is steadier than ops/sec, one stall doesn't move it.
+
+    Returns:
+    - list[str]: Benchmarks that got slower than the tolerance allows.
+    """
+    slower = []
+    print("%-16s %12s %12s %8s" % ("benchmark", "p50 before", "p50 after", "speed"))
+    for name, result in report["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if not old or not old["p50_ms"] or not result["p50_ms"]:
+            print("%-16s %12s %12.4f" % (name, "-", result["p50_ms"]))
+            continue
+        change = old["p50_ms"] / result["p50_ms"] - 1
+        flag = ""
+        if change < -tolerance:
+            slower.append(name)
+            flag = "  SLOWER"
+        print(
+            "%-16s %12.4f %12.4f %+7.0f%%%s"
+            % (name, old["p50_ms"], result["p50_ms"], change * 100, flag)
+        )
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark biblesearch")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verses", type=int, default=KJV_VERSES)
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.seed, args.verses, args.ops, args.runs, args.only)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
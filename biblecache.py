@@ -0,0 +1,171 @@
+"""
+LRU cache of search results
+
+The same searches ("love", "faith", "Jesus wept") come up over and over.
+Results are kept as compact arrays of verse ordinals, keyed by the
+normalized query, the scope it was run in and the match mode, so a repeat
+search is a dictionary lookup.  The cache is bounded by both entry count
+and bytes, least recently used results go first, and everything is dropped
+when the corpus it was filled from changes.
+
+Usage:
+    cache = QueryCache(version=corpus.digest)
+    key = (normalize_query(text), scope_key(scope), "word")
+    ordinals = cache.cached(key, lambda: index.search(...))
+    cache.stats()       {"hits": 3, "misses": 1, ...}
+"""
+from array import array
+from collections import OrderedDict
+
+from bibleindex import PLAIN_QUERY_RE, POSTING_TYPE
+from biblequery import is_query
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+def normalize_query(text):
+    """
+    Cache key form of a query: whitespace collapsed for an AND/OR/NOT
+    query, which only sees the words, and lower case for plain words.  Word
+    and regex searches match the text as typed, spaces and all, so
+    everything else is kept as it is (a regex is case sensitive too).
+
+    Parameters:
+    - text (str): Search text as typed.
+
+    Returns:
+    - str: The normalized query.
+    """
+    if is_query(text):
+        return " ".join(text.split())
+    if PLAIN_QUERY_RE.fullmatch(text):
+        return text.lower()
+    return text
+
+
+def scope_key(scope):
+    """
+    Hashable form of a list of ordinal ranges (None stays None).
+    """
+    return None if scope is None else tuple(scope)
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of verse ordinal arrays.
+
+    Parameters:
+    - max_entries (int): Most results to keep.
+    - max_bytes (int): Most bytes of ordinals to keep.
+    - version (any): Identifies the corpus, usually Corpus.digest.
+
+    Attributes:
+    - hits (int): Lookups answered from the cache.
+    - misses (int): Lookups that had to be computed.
+    - nbytes (int): Bytes of ordinals currently held.
+    """
+
+    def __init__(
+        self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, version=None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = version
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set_version(self, version):
+        """
+        Tell the cache which corpus it is answering for.  If that's not the
+        one it was filled from, everything is dropped.
+
+        Parameters:
+        - version (any): Identifies the corpus, usually Corpus.digest.
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def get(self, key):
+        """
+        Cached ordinals for a key, counting the hit or miss.
+
+        Parameters:
+        - key (tuple): (normalized query, scope, mode).
+
+        Returns:
+        - array or None: The ordinals, None if not cached.
+        """
+        ordinals = self.entries.get(key)
+        if ordinals is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return ordinals
+
+    def put(self, key, ordinals):
+        """
+        Store the ordinals for a key, evicting the least recently used
+        results until it fits the budget.
+
+        Parameters:
+        - key (tuple): (normalized query, scope, mode).
+        - ordinals (list[int] or array): Matching verse ordinals.
+
+        Returns:
+        - array: The ordinals as stored.
+        """
+        if not isinstance(ordinals, (array, memoryview)):
+            ordinals = array(POSTING_TYPE, ordinals)
+        size = len(ordinals) * ordinals.itemsize
+        if size > self.max_bytes:
+            return ordinals
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(old) * old.itemsize
+        self.entries[key] = ordinals
+        self.nbytes += size
+        while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.nbytes -= len(dropped) * dropped.itemsize
+        return ordinals
+
+    def cached(self, key, compute):
+        """
+        Cached ordinals for a key, computing and storing them on a miss.
+
+        Parameters:
+        - key (tuple): (normalized query, scope, mode).
+        - compute (callable): Returns the ordinals when they aren't cached.
+
+        Returns:
+        - array: Matching verse ordinals.
+        """
+        ordinals = self.get(key)
+        if ordinals is None:
+            ordinals = self.put(key, compute())
+        return ordinals
+
+    def stats(self):
+        """
+        Returns:
+        - dict: hits, misses, entries and bytes held.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
@@ -0,0 +1,648 @@
+"""
+Compiled binary corpus for the Bible text
+
+Parsing biblesearch.txt line by line and tokenizing every verse for the word
+index is most of the start up time of both front ends.  This module does
+that work once and saves the result next to the text file as
+biblesearch.bin, which later runs memory map and read on demand.  The cache
+records the sha1 of the text it was built from and is rebuilt automatically
+when the text changes or the format version is bumped.
+
+File layout (integers in native byte order, sections padded to 4 bytes):
+    header      magic, format version, byte order, sha1 of the source text,
+                verse/token/posting counts and section lengths
+    books       book abbreviations in file order, "\\n" separated UTF-8
+    columns     book, chapter and verse numbers, one array('H') each
+    flags       array('B') of attribute bits per verse (RED_LETTER, ...)
+    chapters    array('I'), ordinal of the first verse of every chapter plus
+                the verse count, so chapter k is chapters[k]:chapters[k + 1]
+    offsets     array('I'), verse i is text[offsets[i]:offsets[i + 1]]
+    text        every verse text as one UTF-8 blob
+    vocab       word index tokens, "\\n" separated UTF-8
+    starts      array('I'), token j owns postings[starts[j]:starts[j + 1]]
+    postings    array('I') of verse ordinals
+    pos_starts  array('I'), token j owns positions[pos_starts[j]:...[j + 1]]
+    positions   array('I') of packed (ordinal, word offset) positions
+    lengths     array('H'), words per verse
+    frequencies array('B'), times the token occurs in the verse, one per
+                posting
+    scan_starts array('I'), offset of each verse in scan, plus the end
+    scan        every verse text lower cased, each after a "\\n", for the
+                searches the index can't answer (see biblescan.py)
+
+Nothing in the file is copied into Python objects when it's opened: the
+columns, texts and posting lists are read straight from the mapping, and
+the pages are shared by every process that maps the same file.  Servers
+with many worker processes compile once in the parent and attach in each
+worker, which skips reading and hashing the text file:
+
+    load_corpus("biblesearch.txt")              (parent, before forking)
+    corpus = attach_corpus("biblesearch.bin")   (each worker)
+
+Usage:
+    python biblecorpus.py [biblesearch.txt]     (compile ahead of time)
+
+    corpus = load_corpus("biblesearch.txt")
+    corpus.ref(0), corpus.text(0)               ("Ge 1:1", "In the beginning...")
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from bibleindex import FREQUENCY_TYPE, LENGTH_TYPE, POSTING_TYPE, WordIndex
+from biblescan import Scanner
+
+MAGIC = b"BIBLEBIN"
+
+# bump this whenever the layout below changes, old caches then get rebuilt
+CORPUS_VERSION = 6
+
+# magic, version, little endian flag, sha1, verses, chapters, tokens,
+# postings, positions, then byte lengths of the books, text, vocab and scan
+# blobs
+HEADER = struct.Struct("<8sHH20sIIIIIIIII")
+
+# "Ge 1:1 In the beginning..."
+LINE_RE = re.compile(r"(\S+) (\d+):(\d+) ?(.*)")
+
+# verse attribute bits, see Corpus.flags
+RED_LETTER = 1  # words of Christ
+
+# how each attribute is recognized when compiling, so nothing has to run a
+# regex when a verse is printed.  These are the patterns biblesearch.py
+# used to try one by one on every verse it printed.
+ATTRIBUTE_PATTERNS = {
+    RED_LETTER: re.compile(
+        r"JESUS (?:SAI|ASK|LOOK|BEH|BEG|PRE)|THIS IS MY BODY", re.IGNORECASE
+    ),
+}
+
+
+def cache_path(source):
+    """
+    Where the compiled corpus for a text file lives.
+
+    Parameters:
+    - source (str): Path to the text file.
+
+    Returns:
+    - str: Same path with a .bin extension.
+    """
+    return os.path.splitext(source)[0] + ".bin"
+
+
+def decode_source(raw):
+    """
+    Decode the text file.  The CLI always read it as UTF-8 and the Tk app as
+    windows-1252, so try the first and fall back to the second.
+
+    Parameters:
+    - raw (bytes): Contents of the text file.
+
+    Returns:
+    - str: The decoded text.
+    """
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("windows-1252", errors="ignore")
+
+
+def _pad(length):
+    return b"\0" * (-length % 4)
+
+
+def compile_corpus(raw):
+    """
+    Build the compiled corpus from the text file contents.
+
+    Parameters:
+    - raw (bytes): Contents of the text file.
+
+    Returns:
+    - bytes: The compiled corpus, ready to write out or use directly.
+    """
+    book_names = []
+    book_numbers = {}
+    book_col = array("H")
+    chapter_col = array("H")
+    verse_col = array("H")
+    chapter_starts = array("I")
+    texts = []
+
+    for line in decode_source(raw).splitlines():
+        match = LINE_RE.match(line.strip())
+        if not match:
+            continue
+        book, chapter, verse, text = match.groups()
+        if book not in book_numbers:
+            book_numbers[book] = len(book_names)
+            book_names.append(book)
+        if (
+            not book_col
+            or book_col[-1] != book_numbers[book]
+            or chapter_col[-1] != int(chapter)
+        ):
+            chapter_starts.append(len(texts))
+        book_col.append(book_numbers[book])
+        chapter_col.append(int(chapter))
+        verse_col.append(int(verse))
+        texts.append(text.strip())
+    chapter_starts.append(len(texts))
+
+    flags = array("B")
+    for text in texts:
+        bits = 0
+        for bit, pattern in ATTRIBUTE_PATTERNS.items():
+            if pattern.search(text):
+                bits |= bit
+        flags.append(bits)
+
+    offsets = array("I", [0])
+    blobs = []
+    for text in texts:
+        blob = text.encode("utf-8")
+        blobs.append(blob)
+        offsets.append(offsets[-1] + len(blob))
+    text_blob = b"".join(blobs)
+
+    scan_starts = array("I")
+    scan_blobs = [b"\n"]
+    scan_length = 1
+    for text in texts:
+        blob = text.lower().encode("utf-8") + b"\n"
+        scan_starts.append(scan_length)
+        scan_blobs.append(blob)
+        scan_length += len(blob)
+    scan_starts.append(scan_length)
+    scan_blob = b"".join(scan_blobs)
+
+    index = WordIndex(texts)
+    tokens = sorted(index.postings)
+    starts = array("I", [0])
+    postings = array(POSTING_TYPE)
+    frequencies = array(FREQUENCY_TYPE)
+    pos_starts = array("I", [0])
+    positions = array(POSTING_TYPE)
+    for token in tokens:
+        postings.extend(index.postings[token])
+        frequencies.extend(index.frequencies[token])
+        starts.append(len(postings))
+        positions.extend(index.positions[token])
+        pos_starts.append(len(positions))
+
+    books_blob = "\n".join(book_names).encode("utf-8")
+    vocab_blob = "\n".join(tokens).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC,
+        CORPUS_VERSION,
+        sys.byteorder == "little",
+        hashlib.sha1(raw).digest(),
+        len(texts),
+        len(chapter_starts) - 1,
+        len(tokens),
+        len(postings),
+        len(positions),
+        len(books_blob),
+        len(text_blob),
+        len(vocab_blob),
+        len(scan_blob),
+    )
+
+    parts = [header, _pad(HEADER.size)]
+    for section in (
+        books_blob,
+        book_col.tobytes(),
+        chapter_col.tobytes(),
+        verse_col.tobytes(),
+        flags.tobytes(),
+        chapter_starts.tobytes(),
+        offsets.tobytes(),
+        text_blob,
+        vocab_blob,
+        starts.tobytes(),
+        postings.tobytes(),
+        pos_starts.tobytes(),
+        positions.tobytes(),
+        index.lengths.tobytes(),
+        frequencies.tobytes(),
+        scan_starts.tobytes(),
+        scan_blob,
+    ):
+        parts.append(section)
+        parts.append(_pad(len(section)))
+    return b"".join(parts)
+
+
+class TextView:
+    """
+    Read only list-like view of the verse texts, decoded on access.
+
+    Parameters:
+    - corpus (Corpus): The corpus to read from.
+    """
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def __getitem__(self, ordinal):
+        return self.corpus.text(ordinal)
+
+    def __iter__(self):
+        text = self.corpus.text
+        return (text(ordinal) for ordinal in range(len(self.corpus)))
+
+
+class PostingsView(Mapping):
+    """
+    Read only token -> list mapping over one of the posting sections.  A
+    token's list is sliced out of the corpus only when it's asked for, and
+    the postings, positions and frequencies views share one token table, so
+    opening the index doesn't allocate anything per token beyond that.
+
+    Parameters:
+    - tokens (dict[str, int]): Token -> its number in the vocab.
+    - starts (memoryview): Token j owns data[starts[j]:starts[j + 1]].
+    - data (memoryview): The postings, positions or frequencies section.
+    """
+
+    def __init__(self, tokens, starts, data):
+        self.tokens = tokens
+        self.starts = starts
+        self.data = data
+
+    def __getitem__(self, token):
+        j = self.tokens[token]
+        return self.data[self.starts[j] : self.starts[j + 1]]
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class Corpus:
+    """
+    A compiled corpus, usually backed by a memory mapped file.
+
+    Parameters:
+    - buffer (bytes or mmap.mmap): The compiled corpus.
+
+    Attributes:
+    - path (str or None): The file it's mapped from, None if it's in memory.
+    - digest (bytes): sha1 of the text file the corpus was built from.
+    - books (list[str]): Book abbreviations, indexed by the book column.
+    - book, chapter, verse (memoryview): array('H') columns per verse.
+    - flags (memoryview): Attribute bits per verse, e.g. RED_LETTER.
+    - offsets (memoryview): array('I') text offsets, one more than verses.
+    """
+
+    def __init__(self, buffer):
+        (
+            magic,
+            version,
+            little,
+            self.digest,
+            count,
+            chapter_count,
+            token_count,
+            posting_count,
+            position_count,
+            books_len,
+            text_len,
+            vocab_len,
+            scan_len,
+        ) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != CORPUS_VERSION:
+            raise ValueError("not a version %d corpus file" % CORPUS_VERSION)
+        if little != (sys.byteorder == "little"):
+            raise ValueError("corpus file was built with another byte order")
+
+        self.path = None
+        self.buffer = buffer
+        self._view = memoryview(buffer)
+        self._pos = HEADER.size + len(_pad(HEADER.size))
+
+        self.count = count
+        self.books = self._section(books_len).tobytes().decode("utf-8").split("\n")
+        self.book_numbers = {
+            abbrev.lower(): number for number, abbrev in enumerate(self.books)
+        }
+        self.book = self._section(2 * count).cast("H")
+        self.chapter = self._section(2 * count).cast("H")
+        self.verse = self._section(2 * count).cast("H")
+        self.flags = self._section(count)
+        self.chapter_starts = self._section(4 * (chapter_count + 1)).cast("I")
+        self.offsets = self._section(4 * (count + 1)).cast("I")
+        self._text_start = self._pos
+        self._section(text_len)
+        self._vocab = self._section(vocab_len)
+        self._starts = self._section(4 * (token_count + 1)).cast("I")
+        self._postings = self._section(4 * posting_count).cast(POSTING_TYPE)
+        self._pos_starts = self._section(4 * (token_count + 1)).cast("I")
+        self._positions = self._section(4 * position_count).cast(POSTING_TYPE)
+        self._lengths = self._section(2 * count).cast(LENGTH_TYPE)
+        self._frequencies = self._section(posting_count).cast(FREQUENCY_TYPE)
+        self._scan_starts = self._section(4 * (count + 1)).cast("I")
+        self._scan_start = self._pos
+        self._section(scan_len)
+        self._index = None
+        self._book_ranges = None
+        self._chapter_ranges = None
+
+    def _section(self, length):
+        view = self._view[self._pos : self._pos + length]
+        self._pos += length + len(_pad(length))
+        return view
+
+    def __len__(self):
+        return self.count
+
+    def ref(self, ordinal):
+        """
+        Reference of a verse, the way the text file writes it.
+
+        Parameters:
+        - ordinal (int): Verse ordinal.
+
+        Returns:
+        - str: e.g. "Ge 1:1".
+        """
+        return "%s %d:%d" % (
+            self.books[self.book[ordinal]],
+            self.chapter[ordinal],
+            self.verse[ordinal],
+        )
+
+    def text(self, ordinal):
+        """
+        Text of a verse.
+
+        Parameters:
+        - ordinal (int): Verse ordinal.
+
+        Returns:
+        - str: The verse text without its reference.
+        """
+        start = self._text_start + self.offsets[ordinal]
+        end = self._text_start + self.offsets[ordinal + 1]
+        return self.buffer[start:end].decode("utf-8")
+
+    def line(self, ordinal):
+        """
+        A verse as a line of the text file, reference and text.
+
+        Parameters:
+        - ordinal (int): Verse ordinal.
+
+        Returns:
+        - str: e.g. "Ge 1:1 In the beginning...".
+        """
+        return self.ref(ordinal) + " " + self.text(ordinal)
+
+    def find_book(self, name):
+        """
+        Book number for an abbreviation, ignoring case.
+
+        Parameters:
+        - name (str): e.g. "Joh" or "joh".
+
+        Returns:
+        - int or None: Index into books, None if there's no such book.
+        """
+        return self.book_numbers.get(name.lower())
+
+    def _build_ranges(self):
+        # 1,189 chapters, so this is cheap compared to walking the verses
+        books = {}
+        chapters = {}
+        starts = self.chapter_starts
+        for k in range(len(starts) - 1):
+            start, end = starts[k], starts[k + 1]
+            book = self.book[start]
+            chapters[(book, self.chapter[start])] = (start, end)
+            books[book] = (books.get(book, (start,))[0], end)
+        self._book_ranges = books
+        self._chapter_ranges = chapters
+
+    def book_range(self, book):
+        """
+        Ordinals of every verse in a book.
+
+        Parameters:
+        - book (int): Book number, see find_book().
+
+        Returns:
+        - tuple[int, int] or None: (first, end) with end exclusive.
+        """
+        if self._book_ranges is None:
+            self._build_ranges()
+        return self._book_ranges.get(book)
+
+    def chapter_range(self, book, chapter):
+        """
+        Ordinals of every verse in a chapter.
+
+        Parameters:
+        - book (int): Book number, see find_book().
+        - chapter (int): Chapter number.
+
+        Returns:
+        - tuple[int, int] or None: (first, end) with end exclusive.
+        """
+        if self._chapter_ranges is None:
+            self._build_ranges()
+        return self._chapter_ranges.get((book, int(chapter)))
+
+    def verse_ordinal(self, book, chapter, verse):
+        """
+        Ordinal of a single verse.
+
+        Parameters:
+        - book (int): Book number, see find_book().
+        - chapter (int): Chapter number.
+        - verse (int): Verse number.
+
+        Returns:
+        - int or None: The ordinal, None if there's no such verse.
+        """
+        span = self.chapter_range(book, chapter)
+        if span is None:
+            return None
+        first, end = span
+        # verses are numbered from 1 without gaps, check anyway
+        guess = first + int(verse) - self.verse[first]
+        if first <= guess < end and self.verse[guess] == int(verse):
+            return guess
+        for ordinal in range(first, end):
+            if self.verse[ordinal] == int(verse):
+                return ordinal
+        return None
+
+    def chapter_count(self, book):
+        """
+        Highest chapter number of a book.
+
+        Parameters:
+        - book (int): Book number, see find_book().
+
+        Returns:
+        - int: The last chapter, 0 if there's no such book.
+        """
+        span = self.book_range(book)
+        return self.chapter[span[1] - 1] if span else 0
+
+    def texts(self):
+        """
+        Returns:
+        - TextView: All verse texts as a lazily decoded list.
+        """
+        return TextView(self)
+
+    def index(self):
+        """
+        The word index stored in the corpus, unpacked on first use.
+
+        Returns:
+        - WordIndex: Index over texts(), postings read from the file.
+        """
+        if self._index is None:
+            vocab = self._vocab.tobytes().decode("utf-8").split("\n")
+            tokens = {token: j for j, token in enumerate(vocab)}
+            self._index = WordIndex.from_postings(
+                self.texts(),
+                PostingsView(tokens, self._starts, self._postings),
+                PostingsView(tokens, self._pos_starts, self._positions),
+                PostingsView(tokens, self._starts, self._frequencies),
+                self._lengths,
+                self.scanner(),
+            )
+        return self._index
+
+    def scanner(self):
+        """
+        Returns:
+        - Scanner: Searches the lower cased text section, see biblescan.py.
+        """
+        return Scanner(
+            self.buffer,
+            self._scan_start,
+            self._scan_start + self._scan_starts[-1],
+            self._scan_starts,
+            self.text,
+        )
+
+
+def open_cache(path, digest=None):
+    """
+    Memory map a compiled corpus file.
+
+    Parameters:
+    - path (str): Path to the .bin file.
+    - digest (bytes, optional): sha1 the corpus must have been built from.
+
+    Returns:
+    - Corpus or None: None if the file is missing, stale or unreadable.
+    """
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        corpus = Corpus(buffer)
+        corpus.path = path
+    except (OSError, ValueError, struct.error):
+        return None
+    if digest is not None and corpus.digest != digest:
+        return None
+    return corpus
+
+
+def attach_corpus(path):
+    """
+    Open a corpus compiled by another process, e.g. the parent of a pre-fork
+    server, without reading or hashing the text file.  The file is mapped
+    read only, so every process attached to it shares the same pages.
+
+    Parameters:
+    - path (str): Path to the .bin file.
+
+    Returns:
+    - Corpus: The mapped corpus.
+
+    Raises:
+    - ValueError: If the file is missing or isn't a current corpus file.
+    """
+    corpus = open_cache(path)
+    if corpus is None:
+        raise ValueError("no compiled corpus at %s, run load_corpus() first" % path)
+    return corpus
+
+
+def write_cache(path, data):
+    """
+    Write a compiled corpus, replacing any old one in a single step so other
+    processes never see half a file.
+
+    Parameters:
+    - path (str): Path to the .bin file.
+    - data (bytes): Output of compile_corpus().
+    """
+    temp = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def load_corpus(source, cache=None):
+    """
+    Load the corpus for a text file, compiling it first if the cache is
+    missing or was built from a different text.
+
+    Parameters:
+    - source (str): Path to the text file.
+    - cache (str, optional): Path to the .bin file, defaults to cache_path().
+
+    Returns:
+    - Corpus: The loaded corpus.
+    """
+    cache = cache or cache_path(source)
+    try:
+        with open(source, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        # shipped without the text, use whatever was compiled
+        corpus = open_cache(cache)
+        if corpus is None:
+            raise
+        return corpus
+
+    digest = hashlib.sha1(raw).digest()
+    corpus = open_cache(cache, digest)
+    if corpus is None:
+        data = compile_corpus(raw)
+        try:
+            write_cache(cache, data)
+            corpus = open_cache(cache, digest)
+        except OSError:
+            corpus = None
+        if corpus is None:
+            # read only directory, just use it from memory this time
+            corpus = Corpus(data)
+    return corpus
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "biblesearch.txt"
+    with open(source, "rb") as f:
+        raw = f.read()
+    write_cache(cache_path(source), compile_corpus(raw))
+    corpus = open_cache(cache_path(source))
+    print("compiled %d verses to %s" % (len(corpus), cache_path(source)))
@@ -0,0 +1,840 @@
+"""
+Headless Bible search engine
+
+The one place the corpus is loaded and searched.  biblesearch.py (the CLI)
+and tk.biblesearch.2.0.py (the Tk app) are thin front ends over it, and it
+imports nothing from tkinter or colorama, so it can be embedded in other
+programs as is.
+
+A BibleEngine holds the compiled corpus (see biblecorpus.py), its word
+index and a cache of recent search results.  Verses are addressed by their
+ordinal, the position in the text file; searches return sorted arrays of
+ordinals and Verse views are made only for the verses actually shown.
+
+Nothing is copied per verse: the corpus keeps book, chapter and verse
+numbers in array('H') columns and every text in one buffer with an offsets
+array, all memory mapped from biblesearch.bin, so processes on one host
+share a single copy.  A Verse only holds the corpus and its ordinal.
+
+Books can be named by abbreviation ("Joh") or full name ("John"), in any
+case.  Searches come in three modes:
+    word        whole words, ignoring case (the Tk app)
+    regex       a regular expression, ignoring case (the CLI)
+    query       AND/OR/NOT, book:/chapter:, "phrases", NEAR/n, see
+                biblequery.py; used for any text that looks like a query
+
+Results come in file order, or ranked best first by BM25 (see
+bibleranking.py) with ranked(), which keeps only the best few so nothing
+else has to be formatted.  complete() and suggest() finish and correct
+search words from the vocabulary (see biblespell.py).
+
+Usage:
+    engine = BibleEngine("biblesearch.txt")
+    engine.count()                              every verse
+    engine.count("love AND neighbour")          verses matching a query
+    for verse in engine.lookup("Joh 3:16-21; Ro 8"):
+        print(verse.ref, verse.text)
+    ordinals = engine.search("faith", scope=engine.scope("Ro"))
+    best = engine.ranked("grace", limit=10)      best first
+    engine.complete("nebu")                     ["nebuchadnezzar", ...]
+    engine.suggest("sheperd")                   "shepherd"
+    for verse in engine.iter_chapter("John", 3):
+        ...
+
+    python bibleengine.py [biblesearch.txt]     (memory report)
+
+Under a pre-fork server, load once in the parent so biblesearch.bin is
+compiled and current, then attach in each worker, which maps the file and
+is ready almost at once:
+
+    BibleEngine("biblesearch.txt")              (parent)
+    engine = BibleEngine.attach("biblesearch.bin")      (each worker)
+
+An engine loaded from a text file notices when the file is edited: the
+next search recompiles the corpus and drops every cached result, so a
+long running server or Tk session doesn't keep answering from the old
+text (see refresh()).
+
+Loading and every search are timed in named spans (see bibletiming.py),
+engine.stats() has the totals and the result cache hit rate.
+
+Regexes the word index can't answer can be scanned on several processes
+at once, each mapping the same compiled file (see bibleparallel.py):
+
+    engine.parallel_scan(8)
+
+Verses can be tagged and given notes, which searches find with tag:name
+and note:word (see bibleannotations.py).  They are kept in
+biblesearch.notes.log beside the compiled corpus and read the first time
+they're needed; adding one appends a line to it and re-indexes nothing:
+
+    engine.tag("Joh 3:16; Ro 8:28", "memorize")
+    engine.note("Ps 23:1", "read at the funeral")
+    engine.search("tag:memorize love")
+
+The result cache isn't locked, run searches from one thread at a time.
+"""
+import hashlib
+import os
+import re
+import sys
+import tracemalloc
+from collections import namedtuple
+
+from bibleannotations import Annotations, notes_path
+from biblecache import QueryCache, normalize_query, scope_key
+from biblecorpus import RED_LETTER, attach_corpus, load_corpus
+from bibleindex import PLAIN_QUERY_RE, restrict, tokenize
+from bibleparallel import ParallelScanner
+from biblequery import is_query, parse_query, query_terms, run_query, uses_annotations
+from bibleranking import BM25
+from biblerefs import parse_refs
+from biblespell import Speller
+from bibletiming import Timings
+
+MODES = ("word", "regex")
+
+# how many verses ranked() returns unless asked for more
+RANKED_LIMIT = 20
+
+# full names of the KJV books by the abbreviations the data file uses
+BOOK_NAMES = {
+    "Ge": "Genesis",
+    "Ex": "Exodus",
+    "Le": "Leviticus",
+    "Nu": "Numbers",
+    "De": "Deuteronomy",
+    "Jos": "Joshua",
+    "Jg": "Judges",
+    "Ru": "Ruth",
+    "1Sa": "1 Samuel",
+    "2Sa": "2 Samuel",
+    "1Ki": "1 Kings",
+    "2Ki": "2 Kings",
+    "1Ch": "1 Chronicles",
+    "2Ch": "2 Chronicles",
+    "Ezr": "Ezra",
+    "Ne": "Nehemiah",
+    "Es": "Esther",
+    "Job": "Job",
+    "Ps": "Psalms",
+    "Pr": "Proverbs",
+    "Ec": "Ecclesiastes",
+    "Song": "Song of Solomon",
+    "Isa": "Isaiah",
+    "Jer": "Jeremiah",
+    "La": "Lamentations",
+    "Eze": "Ezekiel",
+    "Da": "Daniel",
+    "Ho": "Hosea",
+    "Joe": "Joel",
+    "Am": "Amos",
+    "Ob": "Obadiah",
+    "Jon": "Jonah",
+    "Mic": "Micah",
+    "Na": "Nahum",
+    "Hab": "Habakkuk",
+    "Zep": "Zephaniah",
+    "Hag": "Haggai",
+    "Zec": "Zechariah",
+    "Mal": "Malachi",
+    "Mt": "Matthew",
+    "Mr": "Mark",
+    "Lu": "Luke",
+    "Joh": "John",
+    "Ac": "Acts",
+    "Ro": "Romans",
+    "1Co": "1 Corinthians",
+    "2Co": "2 Corinthians",
+    "Ga": "Galatians",
+    "Eph": "Ephesians",
+    "Php": "Philippians",
+    "Col": "Colossians",
+    "1Th": "1 Thessalonians",
+    "2Th": "2 Thessalonians",
+    "1Ti": "1 Timothy",
+    "2Ti": "2 Timothy",
+    "Tit": "Titus",
+    "Phm": "Philemon",
+    "Heb": "Hebrews",
+    "Jas": "James",
+    "1Pe": "1 Peter",
+    "2Pe": "2 Peter",
+    "1Jo": "1 John",
+    "2Jo": "2 John",
+    "3Jo": "3 John",
+    "Jude": "Jude",
+    "Re": "Revelation",
+}
+
+Book = namedtuple("Book", "abbrev name chapters")
+
+
+class Verse:
+    """
+    One verse, a view onto the corpus columns made on demand.
+
+    Parameters:
+    - corpus (Corpus): The corpus the verse is in.
+    - ordinal (int): Position in the corpus.
+
+    Attributes:
+    - book (str): Book abbreviation, e.g. "Joh".
+    - name (str): Full book name, e.g. "John".
+    - chapter (int): Chapter number.
+    - number (int): Verse number.
+    - text (str): Verse text without its reference, decoded when asked for.
+    - flags (int): Attribute bits, e.g. RED_LETTER.
+    """
+
+    __slots__ = ("corpus", "ordinal")
+
+    def __init__(self, corpus, ordinal):
+        self.corpus = corpus
+        self.ordinal = ordinal
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Verse)
+            and self.corpus is other.corpus
+            and self.ordinal == other.ordinal
+        )
+
+    def __hash__(self):
+        return hash(self.ordinal)
+
+    def __repr__(self):
+        return "Verse(%d, %r)" % (self.ordinal, self.ref)
+
+    @property
+    def book(self):
+        return self.corpus.books[self.corpus.book[self.ordinal]]
+
+    @property
+    def name(self):
+        book = self.book
+        return BOOK_NAMES.get(book, book)
+
+    @property
+    def chapter(self):
+        return self.corpus.chapter[self.ordinal]
+
+    @property
+    def number(self):
+        return self.corpus.verse[self.ordinal]
+
+    @property
+    def text(self):
+        return self.corpus.text(self.ordinal)
+
+    @property
+    def flags(self):
+        return self.corpus.flags[self.ordinal]
+
+    @property
+    def ref(self):
+        """
+        Reference the way the text file writes it, e.g. "Joh 3:16".
+        """
+        return self.corpus.ref(self.ordinal)
+
+    @property
+    def red_letter(self):
+        """
+        True for words of Jesus.
+        """
+        return bool(self.flags & RED_LETTER)
+
+
+class BibleEngine:
+    """
+    Loads the corpus once and answers lookups and searches.
+
+    Parameters:
+    - source (str): Path to the text file, see load_corpus().
+    - cache (str, optional): Path to the compiled corpus file.
+    - corpus (Corpus, optional): An already opened corpus, source and cache
+      are ignored.
+    - notes (str, optional): Path to the tags and notes log, by default
+      next to the compiled corpus, see notes_path().  Tags and notes of a
+      corpus that isn't in a file are kept in memory only.
+
+    Attributes:
+    - corpus (Corpus): The compiled corpus, reloaded when the text file
+      changes, see refresh().
+    - source (str or None): The text file, None for an engine made from an
+      already opened corpus, which is never reloaded.
+    - index (WordIndex): Word -> verse lookups over the verse texts.
+    - query_cache (QueryCache): Results of recent searches.
+    - timings (Timings): Load and search timing spans.
+    """
+
+    def __init__(self, source="biblesearch.txt", cache=None, corpus=None, notes=None):
+        self.timings = Timings()
+        # the text file is watched only if the corpus was loaded from it
+        self.source = source if corpus is None else None
+        self.cache = cache
+        with self.timings.span("load"):
+            if corpus is None:
+                corpus = load_corpus(source, cache)
+        self._stamp = _file_stamp(self.source)
+        self.query_cache = QueryCache()
+        if notes is None and corpus.path is not None:
+            notes = notes_path(corpus.path)
+        self.notes = notes
+        self._annotations = None
+        self._use(corpus)
+
+    def _use(self, corpus):
+        # everything made from the corpus, made again for a reloaded one
+        self.corpus = corpus
+        with self.timings.span("index"):
+            self.index = corpus.index()
+        self.query_cache.set_version(corpus.digest)
+        self._bm25 = None
+        self._speller = None
+        self._names = {}
+        for number, abbrev in enumerate(corpus.books):
+            self._names[BOOK_NAMES.get(abbrev, abbrev).lower()] = number
+
+    @classmethod
+    def attach(cls, cache="biblesearch.bin"):
+        """
+        Engine over a corpus another process compiled, see attach_corpus().
+
+        Parameters:
+        - cache (str): Path to the compiled corpus file.
+
+        Returns:
+        - BibleEngine: The engine, sharing the mapped file.
+
+        Raises:
+        - ValueError: If there's no current compiled corpus at that path.
+        """
+        return cls(corpus=attach_corpus(cache))
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def refresh(self):
+        """
+        Reload the corpus if its text file has changed since it was loaded,
+        dropping every cached search result.  search() calls this first; it
+        costs a stat of the file, and a hash of it only when its time or
+        size has changed.
+
+        Returns:
+        - bool: True if the corpus was reloaded.
+        """
+        stamp = _file_stamp(self.source)
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            with open(self.source, "rb") as f:
+                digest = hashlib.sha1(f.read()).digest()
+        except OSError:
+            return False
+        if digest == self.corpus.digest:
+            return False
+        with self.timings.span("load"):
+            corpus = load_corpus(self.source, self.cache)
+        scanner = self.index.scanner
+        jobs, pool = 1, None
+        if isinstance(scanner, ParallelScanner):
+            jobs, pool = scanner.jobs, None if scanner.owned else scanner.pool
+            scanner.close()
+        if self._annotations is not None:
+            # read again against the new verse numbering when next needed
+            self._annotations.close()
+            self._annotations = None
+        self._use(corpus)
+        self.parallel_scan(jobs, pool)
+        return True
+
+    def parallel_scan(self, jobs, pool=None):
+        """
+        Scan for regexes the word index can't answer on a pool of worker
+        processes, or go back to scanning in this one.
+
+        Parameters:
+        - jobs (int): Worker processes, 1 or less for none.
+        - pool (ScanPool, optional): Workers shared with other engines to
+          scan on rather than starting jobs of its own, see bibleparallel.py.
+
+        Returns:
+        - bool: True if searches now scan in parallel, False if not asked
+          to or the corpus isn't in a file the workers can map.
+        """
+        if pool is not None:
+            jobs = pool.jobs
+        old = self.index.scanner
+        if isinstance(old, ParallelScanner):
+            if old.pool is pool or (pool is None and old.owned and old.jobs == jobs):
+                return True
+            old.close()
+        if jobs > 1 and self.corpus.path is not None:
+            self.index.scanner = ParallelScanner(self.corpus, jobs, pool)
+            return True
+        self.index.scanner = self.corpus.scanner()
+        return False
+
+    def find_book(self, name):
+        """
+        Book number for an abbreviation or a full name, ignoring case.
+
+        Parameters:
+        - name (str): e.g. "Joh", "john" or "John".
+
+        Returns:
+        - int or None: Book number in the corpus, None if there's no such book.
+        """
+        number = self.corpus.find_book(name)
+        if number is None:
+            number = self._names.get(name.lower())
+        return number
+
+    def books(self):
+        """
+        Every book in corpus order.
+
+        Returns:
+        - list[Book]: (abbrev, name, chapters) per book.
+        """
+        books = []
+        for number, abbrev in enumerate(self.corpus.books):
+            name = BOOK_NAMES.get(abbrev, abbrev)
+            books.append(Book(abbrev, name, self.corpus.chapter_count(number)))
+        return books
+
+    def chapter_count(self, book):
+        """
+        Number of chapters in a book.
+
+        Parameters:
+        - book (str): Abbreviation or full name.
+
+        Returns:
+        - int: The last chapter, 0 if there's no such book.
+        """
+        number = self.find_book(book)
+        return 0 if number is None else self.corpus.chapter_count(number)
+
+    def verse(self, ordinal):
+        """
+        Parameters:
+        - ordinal (int): Verse ordinal.
+
+        Returns:
+        - Verse: The verse at that position.
+        """
+        return Verse(self.corpus, ordinal)
+
+    def verses(self, ordinals):
+        """
+        Verse views for a list of ordinals, made as they're iterated.
+
+        Parameters:
+        - ordinals (iterable[int]): e.g. the result of search().
+
+        Returns:
+        - iterator[Verse]: One verse per ordinal, in the same order.
+        """
+        return map(self.verse, ordinals)
+
+    def lookup(self, refs):
+        """
+        Verses for a reference list.
+
+        Parameters:
+        - refs (str): e.g. "Joh 3:16-21; Ro 8; 1Co 13:4-8,13", see biblerefs.py.
+
+        Returns:
+        - list[Verse]: The verses in the order written.
+
+        Raises:
+        - RefError: If a reference doesn't parse or isn't in the corpus.
+        """
+        verses = []
+        for first, end in parse_refs(self.corpus, refs):
+            verses.extend(self.verses(range(first, end)))
+        return verses
+
+    def chapter_range(self, book, chapter):
+        """
+        Ordinals of a chapter.
+
+        Parameters:
+        - book (str): Abbreviation or full name.
+        - chapter (int or str): Chapter number.
+
+        Returns:
+        - tuple[int, int] or None: (first, end), None if there's no such chapter.
+        """
+        number = self.find_book(book)
+        if number is None or not str(chapter).isdigit():
+            return None
+        return self.corpus.chapter_range(number, chapter)
+
+    def iter_chapter(self, book, chapter):
+        """
+        The verses of a chapter.
+
+        Parameters:
+        - book (str): Abbreviation or full name.
+        - chapter (int or str): Chapter number.
+
+        Returns:
+        - iterator[Verse]: Empty if there's no such chapter.
+        """
+        span = self.chapter_range(book, chapter)
+        return self.verses(range(*span) if span else ())
+
+    def scope(self, book=None, chapter=None):
+        """
+        Ordinal ranges to limit a search to a book or a chapter.
+
+        Parameters:
+        - book (str, optional): Abbreviation or full name, None for every book.
+        - chapter (int or str, optional): Chapter number, None for the whole book.
+
+        Returns:
+        - list[tuple[int, int]] or None: (first, end) ranges, None for
+          everything, empty if there's no such book or chapter.
+        """
+        if book is None:
+            return None
+        if chapter is None:
+            number = self.find_book(book)
+            span = None if number is None else self.corpus.book_range(number)
+        else:
+            span = self.chapter_range(book, chapter)
+        return [span] if span else []
+
+    def search(self, query, scope=None, mode="word"):
+        """
+        Find the verses matching a search.  Results are cached, a repeat
+        search is a dictionary lookup.
+
+        Parameters:
+        - query (str): Search text as typed.  Anything that looks like a
+          query (operators, filters, quotes, NEAR/n) runs as one.
+        - scope (list[tuple[int, int]], optional): Ordinal ranges to stay
+          in, see scope().
+        - mode (str): "word" for whole words, "regex" for a regular
+          expression, both ignoring case.
+
+        Returns:
+        - array: Sorted verse ordinals.
+
+        Raises:
+        - ValueError: For an invalid query or an unknown mode.
+        - re.error: For an invalid regular expression.
+        """
+        if mode not in MODES:
+            raise ValueError("unknown search mode: %s" % mode)
+        self.refresh()
+        if is_query(query):
+            mode = "query"
+        with self.timings.span("search"):
+            key = (normalize_query(query), scope_key(scope), mode, self._version(query))
+            return self.query_cache.cached(
+                key, lambda: self._search(query, scope, mode)
+            )
+
+    def _search(self, query, scope, mode):
+        # AND/OR/NOT, book:/chapter:, "phrases" and NEAR/n go to the query
+        # planner, which starts from the ordinal ranges of the scope.
+        timings = self.timings
+        if mode == "query":
+            annotations = self.annotations() if uses_annotations(query) else None
+            return run_query(self.corpus, query, scope, timings, annotations)
+
+        if mode == "regex":
+            with timings.span("compile"):
+                pattern = re.compile(query, re.IGNORECASE)
+            with timings.span("lookup"):
+                hits = self.index.search(
+                    query, pattern.search, whole_words=False, pattern=pattern
+                )
+            with timings.span("filter"):
+                return restrict(hits, scope)
+
+        # whole words: the index answers plain words and the regex only
+        # checks multi word candidates
+        query = query.lower()
+        with timings.span("compile"):
+            pattern = re.compile(
+                r"(?:\W|^)" + re.escape(query) + r"(?:\W|$)", re.IGNORECASE
+            )
+        with timings.span("lookup"):
+            hits = self.index.search(query, pattern.search, pattern=pattern)
+        with timings.span("filter"):
+            return restrict(hits, scope)
+
+    def ranked(self, query, scope=None, mode="word", limit=RANKED_LIMIT):
+        """
+        The best matching verses by BM25, best first.  The matches are the
+        same as search() finds (and share its cache), only the best `limit`
+        are kept, with a heap rather than a sort of every hit.
+
+        Parameters:
+        - query (str): Search text, see search().
+        - scope (list[tuple[int, int]], optional): Ordinal ranges to stay in.
+        - mode (str): See search().  A regex that isn't plain words has no
+          terms to rank by, its matches stay in file order.
+        - limit (int): Most verses to return.
+
+        Returns:
+        - array: Verse ordinals, best first.
+
+        Raises:
+        - ValueError: For an invalid query or an unknown mode.
+        - re.error: For an invalid regular expression.
+        """
+        hits = self.search(query, scope, mode)
+        with self.timings.span("rank"):
+            key = (
+                "rank",
+                normalize_query(query),
+                scope_key(scope),
+                mode,
+                limit,
+                self._version(query),
+            )
+            return self.query_cache.cached(
+                key, lambda: self.bm25().top(self._terms(query, mode), hits, limit)
+            )
+
+    def _version(self, query):
+        # results with tags or notes in them are cached per change to those
+        return self.annotations().generation if uses_annotations(query) else None
+
+    def annotations(self):
+        """
+        Returns:
+        - Annotations: The tags and notes, read from their log on first use.
+        """
+        if self._annotations is None:
+            with self.timings.span("annotations"):
+                self._annotations = Annotations(self.corpus, self.notes)
+        return self._annotations
+
+    def tag(self, refs, name):
+        """
+        Tag verses, searched for with tag:name.
+
+        Parameters:
+        - refs (str): Reference list, see lookup().
+        - name (str): Tag, letters, digits, _ and -, any case.
+
+        Returns:
+        - int: Verses newly tagged.
+
+        Raises:
+        - RefError: For a reference that isn't in the corpus.
+        - ValueError: For a tag that can't be used.
+        """
+        tag = self.annotations().tag
+        return sum(tag(verse.ordinal, name) for verse in self.lookup(refs))
+
+    def untag(self, refs, name):
+        """
+        Take a tag off verses.
+
+        Parameters:
+        - refs (str): Reference list, see lookup().
+        - name (str): Tag, any case.
+
+        Returns:
+        - int: Verses that had the tag.
+
+        Raises:
+        - RefError: For a reference that isn't in the corpus.
+        """
+        untag = self.annotations().untag
+        return sum(untag(verse.ordinal, name) for verse in self.lookup(refs))
+
+    def note(self, refs, text):
+        """
+        Set the note on verses, searched for with note:word.
+
+        Parameters:
+        - refs (str): Reference list, see lookup().
+        - text (str): The note, empty to remove it.
+
+        Returns:
+        - int: Verses whose note changed.
+
+        Raises:
+        - RefError: For a reference that isn't in the corpus.
+        """
+        note = self.annotations().note
+        return sum(note(verse.ordinal, text) for verse in self.lookup(refs))
+
+    def bm25(self):
+        """
+        Returns:
+        - BM25: The ranker over this engine's index, made on first use.
+        """
+        if self._bm25 is None:
+            self._bm25 = BM25(self.index)
+        return self._bm25
+
+    def _terms(self, query, mode):
+        # the index tokens a search is looking for, what ranked() scores by
+        if is_query(query):
+            return query_terms(parse_query(query)[0])
+        if mode == "word":
+            return tokenize(query)
+        # regex mode matches inside words, "love" also finds "beloved"
+        query = query.strip().lower()
+        if not PLAIN_QUERY_RE.fullmatch(query):
+            return []
+        return [token for word in query.split() for token in self.index.expand(word)]
+
+    def speller(self):
+        """
+        Returns:
+        - Speller: Completion and correction over this engine's vocabulary,
+          made on first use.
+        """
+        if self._speller is None:
+            self._speller = Speller(self.index)
+        return self._speller
+
+    def complete(self, prefix, limit=10):
+        """
+        Words of the text starting with a prefix, for autocomplete.
+
+        Parameters:
+        - prefix (str): What has been typed of the word, any case.
+        - limit (int): Most words to return.
+
+        Returns:
+        - list[str]: Lower case words, most frequent first.
+        """
+        with self.timings.span("spell"):
+            return self.speller().complete(prefix, limit)
+
+    def suggest(self, query, mode="word"):
+        """
+        "Did you mean": the search with unknown words corrected.
+
+        Parameters:
+        - query (str): Search text as typed.
+        - mode (str): See search().  Regexes other than plain words aren't
+          corrected.
+
+        Returns:
+        - str or None: The corrected search, None if there's nothing to
+          correct or no close enough words.
+        """
+        if (
+            mode == "regex"
+            and not is_query(query)
+            and not PLAIN_QUERY_RE.fullmatch(" ".join(query.split()))
+        ):
+            return None
+        with self.timings.span("spell"):
+            return self.speller().suggest(query)
+
+    def count(self, query=None, scope=None, mode="word"):
+        """
+        How many verses there are, or how many match a search.
+
+        Parameters:
+        - query (str, optional): Search text, None to count every verse.
+        - scope (list[tuple[int, int]], optional): Ordinal ranges to stay in.
+        - mode (str): See search().
+
+        Returns:
+        - int: Number of verses.
+        """
+        if query is None:
+            if scope is None:
+                return len(self.corpus)
+            return sum(end - first for first, end in scope)
+        return len(self.search(query, scope, mode))
+
+    def stats(self):
+        """
+        Timing spans and result cache counters, e.g. for a stats command.
+
+        Returns:
+        - dict: "spans" (see Timings.snapshot()) and "cache" (see
+          QueryCache.stats()).
+        """
+        return {"spans": self.timings.snapshot(), "cache": self.query_cache.stats()}
+
+
+def _file_stamp(path):
+    # (modified time, size) of a file, None if there's no file to watch
+    if path is None:
+        return None
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def _traced(build):
+    # bytes allocated by build() and still held by what it returns
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return used
+
+
+def memory_report(engine):
+    """
+    Compare the memory of the compact verse store with the layouts it
+    replaced: the dict of "Ge 1:1" keys biblesearch.py built and the list
+    of lines the Tk app kept.
+
+    Parameters:
+    - engine (BibleEngine): A loaded engine.
+
+    Returns:
+    - list[tuple[str, int]]: (what, bytes) rows.
+    """
+    corpus = engine.corpus
+    count = len(corpus)
+    old_dict = _traced(lambda: {corpus.ref(i): corpus.text(i) for i in range(count)})
+    old_lines = _traced(lambda: [corpus.line(i) for i in range(count)])
+    compact = sum(
+        column.nbytes
+        for column in (
+            corpus.book,
+            corpus.chapter,
+            corpus.verse,
+            corpus.flags,
+            corpus.chapter_starts,
+            corpus.offsets,
+        )
+    )
+    compact += corpus.offsets[count]
+    return [
+        ("dict of reference keys (old CLI)", old_dict),
+        ("list of lines (old Tk app)", old_lines),
+        ("columns, offsets and text buffer", compact),
+        ("one verse view", sys.getsizeof(Verse(corpus, 0))),
+    ]
+
+
+if __name__ == "__main__":
+    engine = BibleEngine(sys.argv[1] if len(sys.argv) > 1 else "biblesearch.txt")
+    print("verse storage for %d verses:" % len(engine))
+    for what, size in memory_report(engine):
+        print("  %-36s%12s bytes" % (what, format(size, ",")))
+    shared = not isinstance(engine.corpus.buffer, bytes)
+    print(
+        "the compact store is %s, verse views are made on demand"
+        % ("memory mapped and shared between processes" if shared else "in memory")
+    )
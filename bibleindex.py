@@ -0,0 +1,526 @@
+"""
+Inverted word index for the Bible text
+
+Maps every normalized word (lower case, split on non-word characters, which
+are the same boundaries the Tk whole word regex uses) to a sorted array of
+verse ordinals.  A verse ordinal is just the position of the verse in the
+data file, so Ge 1:1 is 0 and the last verse of Revelation is the highest.
+
+Both biblesearch.py and tk.biblesearch.2.0.py build one of these at load
+time.  Queries made of plain words are answered by intersecting posting
+lists, anything else (a real regex, punctuation) still scans every verse.
+
+Every token also has positional postings, packed as
+(ordinal << POSITION_SHIFT) + word offset within the verse, which answer
+phrase and proximity queries without touching the text:
+
+    "son of man"                the exact phrase (punctuation is ignored)
+    faith NEAR/5 hope           both words, at most 5 words apart
+    "holy ghost" NEAR/10 fire   phrases work with NEAR too
+    "son of man" glory          several items are ANDed together
+
+For ranking (see bibleranking.py) it also keeps how often each token occurs
+in each verse, lined up with the postings, and the length in words of
+every verse.
+
+Usage:
+    index = WordIndex(texts)
+    ordinals = index.search("jesus wept", pattern.search)
+    ordinals = index.phrase_query('faith NEAR/5 hope')
+"""
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# a token is a run of word characters, same as \w in the search regexes
+TOKEN_RE = re.compile(r"\w+")
+
+# queries we can answer from the index: words separated by single spaces
+PLAIN_QUERY_RE = re.compile(r"\w+(?: \w+)*")
+
+# typecode for posting arrays, 4 bytes per verse is plenty for 31,103 verses
+POSTING_TYPE = "I"
+
+# typecodes for term frequencies (capped at 255, no verse repeats a word
+# that often) and verse lengths in words
+FREQUENCY_TYPE = "B"
+MAX_FREQUENCY = 255
+LENGTH_TYPE = "H"
+
+# how many substring expansions to remember before starting over
+MAX_FRAGMENTS = 1024
+
+# packed positions: verse ordinal in the high bits, word offset in the low
+# 16 (the longest verse, Es 8:9, is about 90 words)
+POSITION_SHIFT = 16
+OFFSET_MASK = (1 << POSITION_SHIFT) - 1
+
+# pieces of a phrase query: "a quoted phrase", NEAR/n, or a bare word
+QUERY_ITEM_RE = re.compile(r'"([^"]*)"?|(NEAR/\d+)(?=\s|$)|([^\s"]+)', re.IGNORECASE)
+PHRASE_QUERY_RE = re.compile(r'"|(?:^|\s)NEAR/\d+(?:\s|$)', re.IGNORECASE)
+
+
+def tokenize(text):
+    """
+    Split text into normalized (lower case) word tokens.
+
+    Parameters:
+    - text (str): Verse text or query.
+
+    Returns:
+    - list[str]: The tokens in the order they appear.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def intersect(a, b):
+    """
+    Intersect two sorted posting arrays.
+
+    When one list is much shorter than the other we binary search the long
+    one for each entry of the short one, otherwise a set lookup is cheaper.
+
+    Parameters:
+    - a (array): Sorted verse ordinals.
+    - b (array): Sorted verse ordinals.
+
+    Returns:
+    - array: Sorted ordinals present in both.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return array(POSTING_TYPE)
+
+    if len(a) * 16 < len(b):
+        found = array(POSTING_TYPE)
+        lo = 0
+        end = len(b)
+        for ordinal in a:
+            lo = bisect_left(b, ordinal, lo)
+            if lo == end:
+                break
+            if b[lo] == ordinal:
+                found.append(ordinal)
+        return found
+
+    other = set(b)
+    return array(POSTING_TYPE, [ordinal for ordinal in a if ordinal in other])
+
+
+def union(lists):
+    """
+    Merge several sorted posting arrays into one.
+
+    Parameters:
+    - lists (list[array]): Sorted verse ordinals.
+
+    Returns:
+    - array: Sorted ordinals present in any of the lists.
+    """
+    if not lists:
+        return array(POSTING_TYPE)
+    if len(lists) == 1:
+        return lists[0]
+    merged = set()
+    for postings in lists:
+        merged.update(postings)
+    return array(POSTING_TYPE, sorted(merged))
+
+
+def difference(a, b):
+    """
+    Remove one sorted posting array from another.
+
+    Parameters:
+    - a (array): Sorted verse ordinals to keep.
+    - b (array): Sorted verse ordinals to drop.
+
+    Returns:
+    - array: Sorted ordinals in a but not in b.
+    """
+    if not a or not b:
+        return array(POSTING_TYPE, a)
+    if len(a) * 16 < len(b):
+        end = len(b)
+        kept = array(POSTING_TYPE)
+        for ordinal in a:
+            lo = bisect_left(b, ordinal)
+            if lo == end or b[lo] != ordinal:
+                kept.append(ordinal)
+        return kept
+    other = set(b)
+    return array(POSTING_TYPE, [ordinal for ordinal in a if ordinal not in other])
+
+
+def restrict(postings, ranges, shift=0):
+    """
+    Keep only the part of a sorted list that falls inside ordinal ranges.
+    Each range costs two binary searches, nothing outside it is looked at.
+
+    Parameters:
+    - postings (array): Sorted verse ordinals (or packed positions).
+    - ranges (list[tuple[int, int]] or None): Sorted (first, end) ordinal
+      ranges, end exclusive.  None means the whole corpus.
+    - shift (int): POSITION_SHIFT when restricting packed positions.
+
+    Returns:
+    - array: The entries inside the ranges.
+    """
+    if ranges is None:
+        return postings
+    kept = array(POSTING_TYPE)
+    for first, end in ranges:
+        lo = bisect_left(postings, first << shift)
+        hi = bisect_left(postings, end << shift, lo)
+        kept.extend(postings[lo:hi])
+    return kept
+
+
+def is_phrase_query(query):
+    """
+    Does the query use quotes or NEAR/n, so phrase_query() should answer it?
+
+    Parameters:
+    - query (str): Search text as typed.
+
+    Returns:
+    - bool: True for phrase and proximity queries.
+    """
+    return bool(PHRASE_QUERY_RE.search(query))
+
+
+def verses_of(positions):
+    """
+    Verse ordinals that appear in a packed position list.
+
+    Parameters:
+    - positions (array): Sorted packed positions.
+
+    Returns:
+    - array: Sorted unique verse ordinals.
+    """
+    verses = array(POSTING_TYPE)
+    last = -1
+    for position in positions:
+        ordinal = position >> POSITION_SHIFT
+        if ordinal != last:
+            verses.append(ordinal)
+            last = ordinal
+    return verses
+
+
+def _verse_slice(positions, ordinal):
+    lo = bisect_left(positions, ordinal << POSITION_SHIFT)
+    hi = bisect_left(positions, (ordinal + 1) << POSITION_SHIFT, lo)
+    return positions[lo:hi]
+
+
+class WordIndex:
+    """
+    Word -> verse ordinal index over a list of verse texts.
+
+    Attributes:
+    - texts (list[str]): The indexed texts, used to verify multi word hits
+      and for the regex fallback.
+    - postings (dict[str, array]): Sorted verse ordinals for every token
+      (memoryview slices of the file when loaded from biblecorpus.py).
+    - positions (dict[str, array]): Sorted packed positions for every token.
+    - frequencies (dict[str, array]): Times the token occurs in each verse
+      of its postings, in the same order.
+    - lengths (array): Number of words in every verse.
+    - scanner (Scanner or None): Runs searches the index can't answer over
+      the whole text at once, see biblescan.py.
+    """
+
+    def __init__(self, texts):
+        """
+        Build the index.
+
+        Parameters:
+        - texts (list[str]): One string per verse, in canonical order.
+        """
+        self.texts = texts
+        postings = {}
+        frequencies = {}
+        positions = {}
+        self.lengths = array(LENGTH_TYPE)
+        for ordinal, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                postings.setdefault(token, []).append(ordinal)
+                frequencies.setdefault(token, []).append(min(count, MAX_FREQUENCY))
+            base = ordinal << POSITION_SHIFT
+            for offset, token in enumerate(tokens):
+                positions.setdefault(token, []).append(base + offset)
+        self.postings = {
+            token: array(POSTING_TYPE, ordinals)
+            for token, ordinals in postings.items()
+        }
+        self.frequencies = {
+            token: array(FREQUENCY_TYPE, counts)
+            for token, counts in frequencies.items()
+        }
+        self.positions = {
+            token: array(POSTING_TYPE, packed) for token, packed in positions.items()
+        }
+        self.scanner = None
+        self._fragments = {}
+
+    @classmethod
+    def from_postings(
+        cls, texts, postings, positions, frequencies, lengths, scanner=None
+    ):
+        """
+        Wrap postings that were built earlier (see biblecorpus.py) without
+        tokenizing the texts again.
+
+        Parameters:
+        - texts (list[str]): One string per verse, in canonical order.
+        - postings (dict[str, array]): Sorted verse ordinals for every token.
+        - positions (dict[str, array]): Sorted packed positions for every token.
+        - frequencies (dict[str, array]): Term frequencies lined up with the
+          postings.
+        - lengths (array): Words per verse.
+        - scanner (Scanner, optional): For searches the index can't answer.
+
+        Returns:
+        - WordIndex: The index.
+        """
+        index = cls.__new__(cls)
+        index.texts = texts
+        index.postings = postings
+        index.positions = positions
+        index.frequencies = frequencies
+        index.lengths = lengths
+        index.scanner = scanner
+        index._fragments = {}
+        return index
+
+    def lookup(self, word):
+        """
+        Verses containing word as a whole word.
+
+        Parameters:
+        - word (str): A single token, any case.
+
+        Returns:
+        - array: Sorted verse ordinals (empty if the word never occurs).
+        """
+        return self.postings.get(word.lower(), array(POSTING_TYPE))
+
+    def containing(self, fragment):
+        """
+        Verses containing fragment anywhere inside a word, so "love" also
+        finds "beloved".  The vocabulary is only a few thousand words, so
+        expanding the fragment against it is far cheaper than a corpus scan.
+
+        Parameters:
+        - fragment (str): Run of word characters, any case.
+
+        Returns:
+        - array: Sorted verse ordinals.
+        """
+        fragment = fragment.lower()
+        hits = self._fragments.get(fragment)
+        if hits is None:
+            hits = union([self.postings[token] for token in self.expand(fragment)])
+            if len(self._fragments) >= MAX_FRAGMENTS:
+                self._fragments.clear()
+            self._fragments[fragment] = hits
+        return hits
+
+    def expand(self, fragment):
+        """
+        Tokens with fragment anywhere inside them, e.g. "love" gives
+        "beloved", "love", "loved", ...
+
+        Parameters:
+        - fragment (str): Run of word characters, lower case.
+
+        Returns:
+        - list[str]: The tokens, in no particular order.
+        """
+        return [token for token in self.postings if fragment in token]
+
+    def candidates(self, query, whole_words=True):
+        """
+        Verses that contain every word of the query.
+
+        Parameters:
+        - query (str): Search text as typed.
+        - whole_words (bool): Match whole words (Tk search) or substrings
+          of words (CLI search).
+
+        Returns:
+        - array or None: Sorted verse ordinals, or None if the query isn't
+          plain words and has to be scanned.  Spaces before or after the
+          words are part of the search, so those are scanned too.
+        """
+        query = query.lower()
+        if not PLAIN_QUERY_RE.fullmatch(query):
+            return None
+
+        get = self.lookup if whole_words else self.containing
+        lists = sorted((get(word) for word in query.split()), key=len)
+        hits = lists[0]
+        for postings in lists[1:]:
+            if not hits:
+                break
+            hits = intersect(hits, postings)
+        return hits
+
+    def phrase_positions(self, words, ranges=None):
+        """
+        Where a run of words appears consecutively.
+
+        Parameters:
+        - words (list[str]): Normalized tokens of the phrase.
+        - ranges (list[tuple[int, int]], optional): Only look inside these
+          ordinal ranges, see restrict().
+
+        Returns:
+        - array: Sorted packed positions of the first word of each match.
+        """
+        lists = [
+            restrict(
+                self.positions.get(word, array(POSTING_TYPE)), ranges, POSITION_SHIFT
+            )
+            for word in words
+        ]
+        if len(lists) == 1:
+            return lists[0]
+
+        # start with the rarest word, shifting every hit back to where the
+        # phrase would have to start, then keep only starts the others share
+        order = sorted(range(len(words)), key=lambda i: len(lists[i]))
+        first = order[0]
+        starts = {
+            position - first
+            for position in lists[first]
+            if position & OFFSET_MASK >= first
+        }
+        for i in order[1:]:
+            if not starts:
+                break
+            starts = {position - i for position in lists[i] if position - i in starts}
+        return array(POSTING_TYPE, sorted(starts))
+
+    def near(self, left, right, distance, ranges=None):
+        """
+        Verses where two phrases occur within distance words of each other,
+        in either order.
+
+        Parameters:
+        - left (list[str]): Tokens of the first phrase (or a single word).
+        - right (list[str]): Tokens of the second phrase.
+        - distance (int): Most words allowed from the end of one phrase to
+          the start of the other, so 1 means adjacent.
+        - ranges (list[tuple[int, int]], optional): Only look inside these
+          ordinal ranges.
+
+        Returns:
+        - array: Sorted verse ordinals.
+        """
+        left_positions = self.phrase_positions(left, ranges)
+        right_positions = self.phrase_positions(right, ranges)
+        found = array(POSTING_TYPE)
+        for ordinal in intersect(verses_of(left_positions), verses_of(right_positions)):
+            rights = _verse_slice(right_positions, ordinal)
+            for a in _verse_slice(left_positions, ordinal):
+                if any(
+                    b - (a + len(left) - 1) <= distance
+                    if a <= b
+                    else a - (b + len(right) - 1) <= distance
+                    for b in rights
+                ):
+                    found.append(ordinal)
+                    break
+        return found
+
+    def phrase_query(self, query):
+        """
+        Answer a phrase or proximity query from the positional postings.
+
+        The query is a list of items, each a "quoted phrase" or a bare word
+        (a bare word with punctuation in it, like lord's, is a phrase too).
+        Items next to each other must all appear in the verse, NEAR/n
+        between two items also requires them within n words of each other.
+
+        Parameters:
+        - query (str): e.g. '"son of man" NEAR/3 glory'.
+
+        Returns:
+        - array: Sorted verse ordinals.
+
+        Raises:
+        - ValueError: If a NEAR/n is missing an item on either side or a
+          phrase has no words in it.
+        """
+        items = []
+        nears = []
+        for match in QUERY_ITEM_RE.finditer(query):
+            phrase, near, word = match.groups()
+            if near:
+                if not items or nears and nears[-1][0] == len(items) - 1:
+                    raise ValueError("NEAR needs a word or phrase on both sides")
+                nears.append((len(items) - 1, int(near[5:])))
+                continue
+            words = tokenize(word if phrase is None else phrase)
+            if not words:
+                raise ValueError("nothing to search for in %r" % match.group())
+            items.append(words)
+        if not items:
+            raise ValueError("nothing to search for")
+        if nears and nears[-1][0] == len(items) - 1:
+            raise ValueError("NEAR needs a word or phrase on both sides")
+
+        lists = [verses_of(self.phrase_positions(words)) for words in items]
+        for i, distance in nears:
+            lists.append(self.near(items[i], items[i + 1], distance))
+        lists.sort(key=len)
+        hits = lists[0]
+        for verses in lists[1:]:
+            if not hits:
+                break
+            hits = intersect(hits, verses)
+        return hits
+
+    def search(self, query, matches, whole_words=True, pattern=None):
+        """
+        Find the verses matching a query.
+
+        Single words are answered straight from the postings.  For several
+        words the intersection is only a candidate list, so each candidate
+        is checked with matches() to make sure the words are adjacent.
+        Phrase and NEAR/n queries go to phrase_query().  Queries the index
+        can't answer are scanned: over the whole text at once with pattern
+        if there's a scanner that can take it, else verse by verse with
+        matches().
+
+        Parameters:
+        - query (str): Search text as typed.
+        - matches (callable): Takes a text, returns true if it matches.
+        - whole_words (bool): See candidates().
+        - pattern (re.Pattern, optional): The compiled search, for the
+          scanner.
+
+        Returns:
+        - list[int] or array: Matching verse ordinals in canonical order.
+        """
+        if is_phrase_query(query):
+            return self.phrase_query(query)
+        hits = self.candidates(query, whole_words)
+        if hits is None and pattern is not None and self.scanner is not None:
+            hits = self.scanner.search(pattern)
+            if hits is not None:
+                return hits
+        if hits is None:
+            return [
+                ordinal for ordinal, text in enumerate(self.texts) if matches(text)
+            ]
+        if len(query.split()) > 1:
+            return [ordinal for ordinal in hits if matches(self.texts[ordinal])]
+        return hits
@@ -0,0 +1,166 @@
+"""
+Load generator for bibleserver.py
+
+Opens a number of keep-alive connections and sends requests on each as fast
+as the server answers them, cycling through a list of paths, then reports
+requests per second and latency percentiles.  Standard library only.
+
+Usage:
+    python bibleserver.py &
+    python bibleload.py [--host 127.0.0.1] [--port 8080] [--connections 32]
+                        [--duration 10] [--path "/search?q=love"] ...
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import time
+from urllib.parse import urlencode
+
+# a mix of what the web front end asks for
+DEFAULT_PATHS = [
+    "/lookup?" + urlencode({"ref": "Joh 3:16-21; Ro 8"}),
+    "/search?" + urlencode({"q": "love"}),
+    "/search?" + urlencode({"q": "love", "offset": 50}),
+    "/search?" + urlencode({"q": "faith NEAR/5 hope"}),
+    "/search?" + urlencode({"q": "love AND brother book:Mt-Joh"}),
+    "/search?" + urlencode({"q": "jesus wept", "book": "Joh"}),
+    "/chapter?" + urlencode({"book": "Ps", "chapter": 119}),
+]
+
+# seconds to wait after a connection is refused before trying again
+RETRY_DELAY = 0.1
+
+
+async def fetch(reader, writer, host, path):
+    """
+    Send one GET on an open connection and read the whole response.
+
+    Returns:
+    - tuple[int, bool]: (status, server kept the connection open).
+    """
+    writer.write(
+        ("GET %s HTTP/1.1\r\nHost: %s\r\n\r\n" % (path, host)).encode("latin-1")
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+    length = 0
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            keep_alive = value.strip().lower() != "close"
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(host, port, paths, deadline, latencies, errors):
+    """
+    One connection's worth of requests until the deadline, reconnecting if
+    the server closes it.  A connection that can't be made counts as a
+    failed request.
+    """
+    reader = writer = None
+    try:
+        for path in paths:
+            if time.perf_counter() >= deadline:
+                break
+            if writer is None:
+                try:
+                    reader, writer = await asyncio.open_connection(host, port)
+                except OSError:
+                    errors.append(path)
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+            start = time.perf_counter()
+            try:
+                status, keep_alive = await fetch(reader, writer, host, path)
+            except (OSError, asyncio.IncompleteReadError):
+                errors.append(path)
+                writer.close()
+                writer = None
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(path)
+            if not keep_alive:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def percentile(ordered, p):
+    """
+    Nearest rank percentile of an already sorted list.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def run(host, port, connections, duration, paths):
+    """
+    Returns:
+    - tuple[list[float], list[str], float]: Latencies in seconds, paths that
+      failed, and the wall time the run took.
+    """
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(
+        *(
+            # each connection starts at a different place in the mix
+            client(
+                host,
+                port,
+                itertools.islice(itertools.cycle(paths), k, None),
+                deadline,
+                latencies,
+                errors,
+            )
+            for k in range(connections)
+        )
+    )
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test bibleserver.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument(
+        "--path", action="append", help="path to request, repeat for a mix"
+    )
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    latencies, errors, elapsed = asyncio.run(
+        run(args.host, args.port, args.connections, args.duration, paths)
+    )
+    latencies.sort()
+    print(
+        "%d requests in %.1fs over %d connections, %d errors"
+        % (len(latencies), elapsed, args.connections, len(errors))
+    )
+    print("%.0f requests/sec" % (len(latencies) / elapsed if elapsed else 0))
+    for p in (50, 90, 99):
+        print("p%-4d %8.2f ms" % (p, percentile(latencies, p) * 1000))
+    print("max   %8.2f ms" % ((latencies[-1] if latencies else 0) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Regex searches spread over several processes
+
+A regex the word index can't answer has to look at every verse (see
+biblescan.py), one core's worth of work however many the machine has.  A
+ParallelScanner splits the verses into shards of whole books, about the
+same amount of text each and a few per process so a long book doesn't
+leave the others idle, and scans them on a pool of worker processes.
+
+Nothing big crosses between processes: each worker maps the same compiled
+corpus file (see attach_corpus() in biblecorpus.py), so the text is in
+memory once for all of them, and a search sends only the regex and the
+shard's ordinals and gets back the matching ordinals as raw bytes.  Shards
+come back in canonical order, so the results are just joined.
+
+Plain text searches (bytes.find() over the whole text, a few ms) stay in
+this process, the round trip to the pool would cost more than it saves.
+Workers are started on the first search and run until close().
+
+The worker processes are a ScanPool, which several scanners can share:
+a Library (see bibletranslations.py) has one for all its translations
+rather than a pool per translation.  A worker maps a corpus the first time
+a shard of it comes, and keeps the last few it was sent.
+
+It's off unless asked for.  Each search costs a round trip to every
+worker, so it only pays on a machine with cores to spare: on a single
+core, biblebench.py's search_regex_jobs is slower than search_regex.
+
+Usage:
+    scanner = ParallelScanner(corpus, jobs=8)
+    ordinals = scanner.search(re.compile(r"\\w+eth\\b", re.IGNORECASE))
+    scanner.close()
+
+    pool = ScanPool(8)              one pool for several corpora
+    scanner = ParallelScanner(corpus, pool=pool)
+    pool.close()
+
+    engine.parallel_scan(8)         the same for an engine's searches
+"""
+import re
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from biblecorpus import attach_corpus
+from bibleindex import POSTING_TYPE
+from biblescan import literal_text
+
+# shards per worker process
+SHARDS_PER_JOB = 4
+
+# corpora a worker process keeps mapped
+MAX_ATTACHED = 4
+
+# (path, digest) -> (corpus, scanner) of this worker process, least
+# recently used first, see _attached()
+_corpora = OrderedDict()
+
+
+def book_shards(corpus, count):
+    """
+    Split the verses into runs of whole books with about the same amount
+    of text each.
+
+    Parameters:
+    - corpus (Corpus): The corpus.
+    - count (int): How many runs to aim for.
+
+    Returns:
+    - list[tuple[int, int]]: (first, end) ordinals, in order, covering
+      every verse.
+    """
+    offsets = corpus.offsets
+    total = offsets[len(corpus)]
+    size = total / max(1, count)
+    ends = sorted(corpus.book_range(number)[1] for number in range(len(corpus.books)))
+    shards = []
+    first = 0
+    for end in ends:
+        if offsets[end] - offsets[first] >= size:
+            shards.append((first, end))
+            first = end
+    if first < len(corpus):
+        shards.append((first, len(corpus)))
+    return shards
+
+
+def _attached(path, digest):
+    # the digest tells a recompiled file from the one mapped before
+    key = (path, digest)
+    found = _corpora.get(key)
+    if found is not None:
+        _corpora.move_to_end(key)
+        return found
+    corpus = attach_corpus(path)
+    found = _corpora[key] = corpus, corpus.scanner()
+    while len(_corpora) > MAX_ATTACHED:
+        _corpora.popitem(last=False)
+    return found
+
+
+def _scan_shard(path, digest, source, flags, first, end):
+    # re caches compiled patterns, so a shard after the first one is cheap
+    corpus, scanner = _attached(path, digest)
+    pattern = re.compile(source, flags)
+    hits = scanner.search(pattern, first, end)
+    if hits is None:
+        text = corpus.text
+        hits = array(
+            POSTING_TYPE,
+            (ordinal for ordinal in range(first, end) if pattern.search(text(ordinal))),
+        )
+    return hits.tobytes()
+
+
+class ScanPool:
+    """
+    Worker processes for ParallelScanners, started on the first search.
+
+    Parameters:
+    - jobs (int): Worker processes.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._executor = None
+
+    def submit(self, *args):
+        """
+        Scan a shard on a worker.
+
+        Parameters:
+        - *args: For _scan_shard(): path, digest, regex source, flags,
+          first and end ordinals.
+
+        Returns:
+        - Future: The matching ordinals as bytes.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.jobs)
+        return self._executor.submit(_scan_shard, *args)
+
+    def close(self):
+        """
+        Stop the worker processes, a later search starts them again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class ParallelScanner:
+    """
+    Scans for regexes on a pool of processes; takes the place of a
+    WordIndex's Scanner.
+
+    Parameters:
+    - corpus (Corpus): A corpus mapped from a file, the workers map it too.
+    - jobs (int, optional): Worker processes of a pool of its own.
+    - pool (ScanPool, optional): A pool shared with other scanners instead,
+      which close() leaves running.
+
+    Raises:
+    - ValueError: If the corpus isn't mapped from a file.
+    """
+
+    def __init__(self, corpus, jobs=None, pool=None):
+        if corpus.path is None:
+            raise ValueError("the corpus isn't in a file workers can map")
+        self.path = corpus.path
+        self.digest = corpus.digest
+        self.owned = pool is None
+        self.pool = ScanPool(jobs) if pool is None else pool
+        self.jobs = self.pool.jobs
+        self.shards = book_shards(corpus, self.jobs * SHARDS_PER_JOB)
+        self.scanner = corpus.scanner()
+
+    def search(self, pattern):
+        """
+        Verses the regex matches.
+
+        Parameters:
+        - pattern (re.Pattern): The compiled search.
+
+        Returns:
+        - array: Sorted verse ordinals.  Unlike Scanner.search() this is
+          never None, regexes the scan can't take are run verse by verse
+          in the workers.
+        """
+        if isinstance(pattern.pattern, str) and literal_text(pattern.pattern):
+            hits = self.scanner.search(pattern)
+            if hits is not None:
+                return hits
+        source, flags = pattern.pattern, pattern.flags
+        futures = [
+            self.pool.submit(self.path, self.digest, source, flags, first, end)
+            for first, end in self.shards
+        ]
+        hits = array(POSTING_TYPE)
+        for future in futures:
+            hits.frombytes(future.result())
+        return hits
+
+    def close(self):
+        """
+        Stop the worker processes if the pool is its own, a later search
+        starts them again.
+        """
+        if self.owned:
+            self.pool.close()
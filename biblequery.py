@@ -0,0 +1,501 @@
+"""
+Boolean query language for the Bible text
+
+Queries are words, "quoted phrases" and NEAR/n (see bibleindex.py) combined
+with AND, OR, NOT and parentheses, plus book and chapter filters:
+
+    love AND (neighbour OR brother) NOT hate book:Mt-Joh
+    "son of man" glory chapter:24       (chapter 24 of any book)
+    faith NEAR/5 hope book:Ro           (Romans only)
+    NOT lord book:Es                    (every verse of Esther without lord)
+    tag:memorize love                   (tagged verses, see bibleannotations.py)
+
+Operators must be upper case, "and", "or" and "not" are ordinary words in
+the KJV.  Words next to each other are ANDed, NOT binds tighter than AND,
+and AND tighter than OR.  Words match whole words, ignoring case.  book:
+takes an abbreviation or a range of them, chapter: a number or a range;
+filters apply to the whole query wherever they are written.  tag:name and
+note:word are terms like words, verses with that tag or that word in their
+note, and can be combined with anything else.
+
+The planner turns the filters into ordinal ranges and slices every posting
+list down to them before anything else, evaluates the terms of an AND from
+the smallest posting list up and stops as soon as the intersection is
+empty, so a query costs about as much as its rarest term.
+
+Usage:
+    if is_query(text):
+        ordinals = run_query(corpus, text, annotations=annotations)
+"""
+import re
+from array import array
+
+from bibleindex import (
+    POSTING_TYPE,
+    difference,
+    intersect,
+    is_phrase_query,
+    restrict,
+    tokenize,
+    union,
+    verses_of,
+)
+from bibletiming import NO_TIMINGS
+
+# ( ) "phrase" NEAR/n field:value or a bare word
+QUERY_TOKEN_RE = re.compile(
+    r'\(|\)|"[^"]*"?|NEAR/\d+(?=[\s()]|$)|\w+:[^\s()"]+|[^\s()"]+',
+    re.IGNORECASE,
+)
+FIELD_RE = re.compile(r"(book|chapter):(.+)", re.IGNORECASE)
+ANNOTATION_RE = re.compile(r"(tag|note):(.+)", re.IGNORECASE)
+OPERATORS = ("AND", "OR", "NOT")
+
+# things that only make sense in the query language, operators have to be
+# upper case but filters can be any case
+OPERATOR_RE = re.compile(r"(?:^|[\s(])(?:AND|OR|NOT)(?=[\s(]|$)")
+FILTER_RE = re.compile(r"(?:^|[\s(])(?:book|chapter|tag|note):\S", re.IGNORECASE)
+USES_ANNOTATIONS_RE = re.compile(r"(?:^|[\s(])(?:tag|note):\S", re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    """
+    Raised for a query that can't be parsed, e.g. a missing parenthesis or
+    an unknown book.
+    """
+
+
+def is_query(text):
+    """
+    Should text be run as a query rather than a plain search?
+
+    Parameters:
+    - text (str): Search text as typed.
+
+    Returns:
+    - bool: True if it has operators, filters, quotes or NEAR/n.
+    """
+    return bool(
+        is_phrase_query(text) or OPERATOR_RE.search(text) or FILTER_RE.search(text)
+    )
+
+
+def uses_annotations(text):
+    """
+    Does a query look at tags or notes, so its results change with them?
+
+    Parameters:
+    - text (str): Search text as typed.
+
+    Returns:
+    - bool: True if it has tag: or note: in it.
+    """
+    return bool(USES_ANNOTATIONS_RE.search(text))
+
+
+def is_near(token):
+    return token is not None and token[:5].upper() == "NEAR/"
+
+
+class Parser:
+    """
+    Recursive descent parser producing a tree of tuples:
+
+        ("word", token)
+        ("phrase", [tokens])
+        ("near", [tokens], [tokens], distance)
+        ("tag", name), ("note", token)
+        ("and", [nodes]), ("or", [nodes]), ("not", node)
+
+    Book and chapter filters are collected in `books` and `chapters` instead
+    of going into the tree.
+
+    Parameters:
+    - text (str): The query.
+    """
+
+    def __init__(self, text):
+        self.books = []
+        self.chapters = []
+        self.tokens = []
+        for token in QUERY_TOKEN_RE.findall(text):
+            field = FIELD_RE.fullmatch(token)
+            if field:
+                name, value = field.groups()
+                target = self.books if name.lower() == "book" else self.chapters
+                target.append(value)
+            else:
+                self.tokens.append(token)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        """
+        Returns:
+        - tuple or None: The query tree, None if it only had filters.
+        """
+        if not self.tokens:
+            return None
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError("unexpected %r" % self.peek())
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek() not in (None, ")", "OR"):
+            if self.peek() == "AND":
+                self.take()
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_near()
+
+    def parse_near(self):
+        node = self.parse_primary()
+        nears = []
+        while is_near(self.peek()):
+            distance = int(self.take()[5:])
+            right = self.parse_primary()
+            if node[0] not in ("word", "phrase") or right[0] not in ("word", "phrase"):
+                raise QueryError("NEAR only works between words and phrases")
+            nears.append(("near", self.words(node), self.words(right), distance))
+            node = right
+        if not nears:
+            return node
+        return nears[0] if len(nears) == 1 else ("and", nears)
+
+    def parse_primary(self):
+        token = self.take()
+        if token is None:
+            raise QueryError("query ends too soon")
+        if token == "(":
+            node = self.parse_or()
+            if self.take() != ")":
+                raise QueryError("missing )")
+            return node
+        if token == ")" or token in OPERATORS or is_near(token):
+            raise QueryError("unexpected %r" % token)
+        field = ANNOTATION_RE.fullmatch(token)
+        if field:
+            return self.annotation(*field.groups())
+        words = tokenize(token.strip('"'))
+        if not words:
+            raise QueryError("nothing to search for in %r" % token)
+        if len(words) == 1 and not token.startswith('"'):
+            return ("word", words[0])
+        return ("phrase", words)
+
+    @staticmethod
+    def words(node):
+        return [node[1]] if node[0] == "word" else node[1]
+
+    @staticmethod
+    def annotation(kind, value):
+        # tag:name, or note:word (every word, for note:well-known)
+        if kind.lower() == "tag":
+            return ("tag", value.lower())
+        nodes = [("note", token) for token in tokenize(value)]
+        if not nodes:
+            raise QueryError("nothing to search for in note:%s" % value)
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+
+def parse_query(text):
+    """
+    Parse a query.
+
+    Parameters:
+    - text (str): The query.
+
+    Returns:
+    - tuple: (tree, books, chapters) where books and chapters are the raw
+      filter values, e.g. (("word", "love"), ["Mt-Joh"], []).
+
+    Raises:
+    - QueryError: If the query can't be parsed.
+    """
+    parser = Parser(text)
+    return parser.parse(), parser.books, parser.chapters
+
+
+def query_terms(tree):
+    """
+    The words a query is looking for, for ranking: every word and phrase
+    word in the tree except those under a NOT.
+
+    Parameters:
+    - tree (tuple or None): From parse_query().
+
+    Returns:
+    - list[str]: Tokens, in query order, repeats kept.
+    """
+    if tree is None or tree[0] in ("not", "tag", "note"):
+        return []
+    kind = tree[0]
+    if kind == "word":
+        return [tree[1]]
+    if kind == "phrase":
+        return list(tree[1])
+    if kind == "near":
+        return tree[1] + tree[2]
+    return [term for node in tree[1] for term in query_terms(node)]
+
+
+def _span(value):
+    # "Mt-Joh" -> ("Mt", "Joh"), "3" -> ("3", "3")
+    first, _, last = value.partition("-")
+    return first, last or first
+
+
+def filter_ranges(corpus, books=(), chapters=()):
+    """
+    Turn book and chapter filters into ordinal ranges.
+
+    Parameters:
+    - corpus (Corpus): For the book and chapter tables.
+    - books (list[str]): e.g. ["Mt-Joh", "Ro"], empty for every book.
+    - chapters (list[str]): e.g. ["3", "5-7"], empty for every chapter.
+
+    Returns:
+    - list[tuple[int, int]] or None: Sorted (first, end) ranges, None if
+      there are no filters at all.
+
+    Raises:
+    - QueryError: For unknown books or chapters that aren't numbers.
+    """
+    if not books and not chapters:
+        return None
+
+    numbers = set()
+    for value in books or ["%s-%s" % (corpus.books[0], corpus.books[-1])]:
+        first, last = [corpus.find_book(name) for name in _span(value)]
+        if first is None or last is None:
+            raise QueryError("no such book: %s" % value)
+        numbers.update(range(min(first, last), max(first, last) + 1))
+
+    wanted = []
+    for value in chapters:
+        first, last = _span(value)
+        if not first.isdigit() or not last.isdigit():
+            raise QueryError("chapter must be a number: %s" % value)
+        first, last = int(first), int(last)
+        wanted.append((min(first, last), max(first, last)))
+
+    ranges = []
+    for book in sorted(numbers):
+        if not wanted:
+            ranges.append(corpus.book_range(book))
+            continue
+        # only the chapters the book has, chapter:1-999999999 is still at
+        # most 150 lookups
+        highest = corpus.chapter_count(book)
+        for first, last in wanted:
+            for chapter in range(first, min(last, highest) + 1):
+                span = corpus.chapter_range(book, chapter)
+                if span:
+                    ranges.append(span)
+    return merge_ranges(ranges)
+
+
+def merge_ranges(ranges):
+    """
+    Sort ranges and join the ones that touch.
+
+    Parameters:
+    - ranges (list[tuple[int, int]]): (first, end) ranges.
+
+    Returns:
+    - list[tuple[int, int]]: Sorted, non overlapping ranges.
+    """
+    merged = []
+    for first, end in sorted(ranges):
+        if merged and first <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((first, end))
+    return merged
+
+
+def intersect_ranges(a, b):
+    """
+    Ranges covered by both lists (None stands for everything).
+
+    Parameters:
+    - a (list[tuple[int, int]] or None): Sorted ranges.
+    - b (list[tuple[int, int]] or None): Sorted ranges.
+
+    Returns:
+    - list[tuple[int, int]] or None: Sorted ranges.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    both = []
+    for first, end in a:
+        for other_first, other_end in b:
+            lo, hi = max(first, other_first), min(end, other_end)
+            if lo < hi:
+                both.append((lo, hi))
+    return merge_ranges(both)
+
+
+class Planner:
+    """
+    Evaluates a query tree against the word index inside ordinal ranges.
+
+    Parameters:
+    - index (WordIndex): Postings to read.
+    - ranges (list[tuple[int, int]] or None): Where to look.
+    - count (int): Number of verses, for NOT on its own.
+    - annotations (Annotations, optional): Tags and notes, for tag: and
+      note:; without them those match nothing.
+    """
+
+    def __init__(self, index, ranges, count, annotations=None):
+        self.index = index
+        self.ranges = ranges
+        self.count = count
+        self.annotations = annotations
+        self._words = {}
+
+    def postings(self, token):
+        """
+        Postings of a word, already sliced down to the ranges.
+        """
+        if token not in self._words:
+            self._words[token] = restrict(self.index.lookup(token), self.ranges)
+        return self._words[token]
+
+    def annotated(self, node):
+        """
+        Verses with a tag or a note word, sliced down to the ranges like
+        word postings.
+        """
+        if node not in self._words:
+            if self.annotations is None:
+                found = array(POSTING_TYPE)
+            else:
+                found = self.annotations.postings(node[0], node[1])
+            self._words[node] = restrict(found, self.ranges)
+        return self._words[node]
+
+    def estimate(self, node):
+        """
+        Upper bound on how many verses a node can match, used to order the
+        terms of an AND.  Only word postings are looked at, nothing is
+        evaluated.
+        """
+        kind = node[0]
+        if kind == "word":
+            return len(self.postings(node[1]))
+        if kind in ("tag", "note"):
+            return len(self.annotated(node))
+        if kind == "phrase":
+            return min(len(self.postings(token)) for token in node[1])
+        if kind == "near":
+            return min(len(self.postings(token)) for token in node[1] + node[2])
+        if kind == "and":
+            positives = [self.estimate(n) for n in node[1] if n[0] != "not"]
+            return min(positives) if positives else self.count
+        if kind == "or":
+            return sum(self.estimate(n) for n in node[1])
+        return self.count
+
+    def universe(self):
+        """
+        Every ordinal inside the ranges, for a NOT with nothing to subtract
+        from.
+        """
+        ranges = self.ranges if self.ranges is not None else [(0, self.count)]
+        every = array(POSTING_TYPE)
+        for first, end in ranges:
+            every.extend(range(first, end))
+        return every
+
+    def evaluate(self, node):
+        """
+        Returns:
+        - array: Sorted verse ordinals matching the node.
+        """
+        kind = node[0]
+        if kind == "word":
+            return self.postings(node[1])
+        if kind in ("tag", "note"):
+            return self.annotated(node)
+        if kind == "phrase":
+            return verses_of(self.index.phrase_positions(node[1], self.ranges))
+        if kind == "near":
+            return self.index.near(node[1], node[2], node[3], self.ranges)
+        if kind == "or":
+            return union([self.evaluate(n) for n in node[1]])
+        if kind == "not":
+            return difference(self.universe(), self.evaluate(node[1]))
+
+        # AND: rarest term first, stop as soon as nothing is left
+        positives = sorted(
+            (n for n in node[1] if n[0] != "not"), key=self.estimate
+        )
+        negatives = [n[1] for n in node[1] if n[0] == "not"]
+        hits = self.evaluate(positives[0]) if positives else self.universe()
+        for child in positives[1:]:
+            if not hits:
+                return hits
+            hits = intersect(hits, self.evaluate(child))
+        for child in negatives:
+            if not hits:
+                break
+            hits = difference(hits, self.evaluate(child))
+        return hits
+
+
+def run_query(corpus, text, scope=None, timings=NO_TIMINGS, annotations=None):
+    """
+    Run a query.
+
+    Parameters:
+    - corpus (Corpus): Loaded corpus with its word index.
+    - text (str): The query.
+    - scope (list[tuple[int, int]], optional): Extra ordinal ranges to stay
+      inside, e.g. the Tk book and chapter dropdowns.
+    - timings (Timings, optional): Where to record the parse, filter and
+      lookup spans, see bibletiming.py.
+    - annotations (Annotations, optional): Tags and notes for tag: and
+      note:, see bibleannotations.py.
+
+    Returns:
+    - array: Sorted verse ordinals.
+
+    Raises:
+    - QueryError: If the query can't be parsed.
+    """
+    with timings.span("parse"):
+        tree, books, chapters = parse_query(text)
+    with timings.span("filter"):
+        ranges = intersect_ranges(filter_ranges(corpus, books, chapters), scope)
+    planner = Planner(corpus.index(), ranges, len(corpus), annotations)
+    if tree is None:
+        return planner.universe()
+    if ranges == []:
+        return array(POSTING_TYPE)
+    with timings.span("lookup"):
+        return planner.evaluate(tree)
@@ -0,0 +1,166 @@
+"""
+BM25 relevance ranking of search results
+
+A search finds every matching verse in file order, so a common word
+("grace", "lord") gives hundreds of verses before the useful ones.
+Ranking scores each matching verse as a document with Okapi BM25:
+
+    score = sum over the query terms of
+            idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+
+    idf = log(1 + (verses - df + 0.5) / (df + 0.5))
+
+tf (times the term occurs in the verse) and verse lengths are stored in the
+word index when the corpus is compiled (see bibleindex.py) and df is the
+length of a posting list, so nothing is tokenized at query time.  top()
+scores the hits one at a time into a heap of size k, so neither every
+hit's score nor a sort of them is kept, and the front ends only ever
+format those k.
+
+Usage:
+    ranker = BM25(corpus.index())
+    best = ranker.top(["grace"], hits, 20)      ordinals, best first
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+
+from bibleindex import POSTING_TYPE
+
+K1 = 1.2
+B = 0.75
+
+# below this many hits per posting, a term's frequency is found by
+# bisecting its postings for each hit instead of walking all of them
+BISECT_RATIO = 8
+
+
+class BM25:
+    """
+    BM25 scorer over a word index.
+
+    Parameters:
+    - index (WordIndex): Postings, term frequencies and verse lengths.
+    - k1 (float): Term frequency saturation.
+    - b (float): How much longer verses are penalized, 0 to 1.
+
+    Attributes:
+    - count (int): Number of verses.
+    - average (float): Average verse length in words.
+    """
+
+    def __init__(self, index, k1=K1, b=B):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.count = len(index.lengths)
+        self.average = sum(index.lengths) / self.count if self.count else 1.0
+        self._norms = None
+
+    def idf(self, token):
+        """
+        Inverse document frequency, higher for rarer words.
+
+        Parameters:
+        - token (str): A normalized token.
+
+        Returns:
+        - float: The idf, 0 for a word that doesn't occur.
+        """
+        postings = self.index.postings.get(token)
+        if postings is None:
+            return 0.0
+        df = len(postings)
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def norms(self):
+        """
+        The length part of the denominator for every verse, made once.
+
+        Returns:
+        - array: K1 * (1 - B + B * length / average) by ordinal.
+        """
+        if self._norms is None:
+            k1, b, average = self.k1, self.b, self.average
+            lengths = self.index.lengths
+            self._norms = array(
+                "d", (k1 * (1 - b + b * length / average) for length in lengths)
+            )
+        return self._norms
+
+    def scores(self, terms, hits):
+        """
+        Score a set of verses.
+
+        Parameters:
+        - terms (list[str]): Normalized query tokens, repeats count once.
+        - hits (sequence[int]): Sorted verse ordinals to score.
+
+        Returns:
+        - dict[int, float]: Score per ordinal, 0 for hits without any term.
+        """
+        return {-negated: score for score, negated in self.scored(terms, hits)}
+
+    def scored(self, terms, hits):
+        """
+        Score verses one at a time, nothing is kept per verse.
+
+        Parameters:
+        - terms (list[str]): Normalized query tokens, repeats count once.
+        - hits (sequence[int]): Sorted verse ordinals to score.
+
+        Yields:
+        - tuple[float, int]: Score and negated ordinal of each hit in order
+          (so equal scores sort in file order), 0 for hits without any term.
+        """
+        norms = self.norms()
+        end = len(norms)
+        # terms with many more postings than there are hits are bisected
+        # for each hit, the others walked along with the hits: each walk
+        # holds the posting at or after the last hit and its frequency
+        walks, bisects = [], []
+        for term in set(terms):
+            postings = self.index.postings.get(term)
+            if not postings:
+                continue
+            frequencies = self.index.frequencies[term]
+            weight = self.idf(term) * (self.k1 + 1)
+            if len(hits) * BISECT_RATIO < len(postings):
+                bisects.append([postings, frequencies, 0, weight])
+            else:
+                walk = zip(postings, frequencies)
+                walks.append([*next(walk, (end, 0)), walk, weight])
+        for ordinal in hits:
+            score = 0.0
+            for cursor in walks:
+                posting, tf, walk, weight = cursor
+                if posting < ordinal:
+                    posting, tf = next(walk, (end, 0))
+                    while posting < ordinal:
+                        posting, tf = next(walk, (end, 0))
+                    cursor[0], cursor[1] = posting, tf
+                if posting == ordinal:
+                    score += weight * tf / (tf + norms[ordinal])
+            for cursor in bisects:
+                postings, frequencies, i, weight = cursor
+                i = cursor[2] = bisect_left(postings, ordinal, i)
+                if i < len(postings) and postings[i] == ordinal:
+                    tf = frequencies[i]
+                    score += weight * tf / (tf + norms[ordinal])
+            yield score, -ordinal
+
+    def top(self, terms, hits, k):
+        """
+        The k best scoring verses.
+
+        Parameters:
+        - terms (list[str]): Normalized query tokens.
+        - hits (sequence[int]): Sorted verse ordinals that matched.
+        - k (int): How many to keep.
+
+        Returns:
+        - array: Ordinals, best first; equal scores keep file order.
+        """
+        best = heapq.nlargest(k, self.scored(terms, hits))
+        return array(POSTING_TYPE, (-negated for score, negated in best))
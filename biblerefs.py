@@ -0,0 +1,142 @@
+"""
+Bible reference lists
+
+Parses references like the ones in a service sheet or footnote and resolves
+them to ordinal ranges in the corpus, so the verses can be read with a slice
+instead of looking up keys one at a time:
+
+    Joh 3:16                one verse
+    Joh 3:16-21             a run of verses
+    Joh 3:16-4:2            a run across chapters
+    1Co 13:4-8,13           several pieces of one chapter
+    Ro 8                    a chapter
+    Ps 1-3                  several chapters
+    Jude                    a whole book
+    Joh 3:16-21; Ro 8; 1Co 13:4-8,13      any of the above, ; separated
+
+Books are the abbreviations of the data file, in any case.
+
+Usage:
+    for first, end in parse_refs(corpus, "Joh 3:16-21; Ro 8"):
+        ...
+"""
+import re
+
+# "1Co 13:4-8,13" -> book "1Co", spec "13:4-8,13"
+REF_RE = re.compile(r"\s*(\d?\s*[^\W\d_]+)\.?\s*(.*?)\s*")
+
+# one comma separated piece: [chapter:]verse[-[chapter:]verse]
+PIECE_RE = re.compile(r"(?:(\d+):)?(\d+)(?:-(?:(\d+):)?(\d+))?")
+
+# what a reference list command looks like: a book, a space, a number
+REF_COMMAND_RE = re.compile(r"\s*\d?\s*[^\W\d_]+\.?\s+\d")
+
+
+class RefError(ValueError):
+    """
+    Raised for a reference that doesn't parse or isn't in the corpus.
+    """
+
+
+def looks_like_refs(text):
+    """
+    Is this a reference list ("Joh 3:16; Ro 8") rather than a command?
+
+    Parameters:
+    - text (str): Command as typed.
+
+    Returns:
+    - bool: True if it starts with a book followed by a chapter.
+    """
+    return bool(REF_COMMAND_RE.match(text))
+
+
+def _ordinal(corpus, book, chapter, verse, ref):
+    ordinal = corpus.verse_ordinal(book, chapter, verse)
+    if ordinal is None:
+        raise RefError("no such verse: %s" % ref)
+    return ordinal
+
+
+def _chapter(corpus, book, chapter, ref):
+    span = corpus.chapter_range(book, chapter)
+    if span is None:
+        raise RefError("no such chapter: %s" % ref)
+    return span
+
+
+def parse_ref(corpus, ref):
+    """
+    Resolve one reference (no ;) to ordinal ranges.
+
+    Parameters:
+    - corpus (Corpus): For the book, chapter and verse tables.
+    - ref (str): e.g. "1Co 13:4-8,13".
+
+    Returns:
+    - list[tuple[int, int]]: (first, end) ranges in the order written.
+
+    Raises:
+    - RefError: If the reference doesn't parse or isn't in the corpus.
+    """
+    match = REF_RE.fullmatch(ref)
+    if not match:
+        raise RefError("can't read reference: %s" % ref.strip())
+    name, spec = match.groups()
+    book = corpus.find_book(name.replace(" ", ""))
+    if book is None:
+        raise RefError("no such book: %s" % name)
+    if not spec:
+        return [corpus.book_range(book)]
+
+    ranges = []
+    chapter = None  # set once a piece names a chapter with ':'
+    for piece in spec.replace(" ", "").split(","):
+        parts = PIECE_RE.fullmatch(piece)
+        if not parts:
+            raise RefError("can't read reference: %s" % ref.strip())
+        start_chapter, start, end_chapter, end = parts.groups()
+
+        if start_chapter is None and chapter is None:
+            # no chapter yet, so these numbers are chapters: "Ps 1-3"
+            if end_chapter is not None:
+                raise RefError("can't read reference: %s" % ref.strip())
+            first = _chapter(corpus, book, start, ref)[0]
+            last = _chapter(corpus, book, end or start, ref)[1]
+            if last <= first:
+                raise RefError("range runs backwards: %s" % ref.strip())
+            ranges.append((first, last))
+            continue
+
+        chapter = start_chapter or chapter
+        first = _ordinal(corpus, book, chapter, start, ref)
+        if end is None:
+            ranges.append((first, first + 1))
+            continue
+        chapter = end_chapter or chapter
+        last = _ordinal(corpus, book, chapter, end, ref)
+        if last < first:
+            raise RefError("range runs backwards: %s" % ref.strip())
+        ranges.append((first, last + 1))
+    return ranges
+
+
+def parse_refs(corpus, text):
+    """
+    Resolve a ; separated reference list to ordinal ranges.
+
+    Parameters:
+    - corpus (Corpus): For the book, chapter and verse tables.
+    - text (str): e.g. "Joh 3:16-21; Ro 8; 1Co 13:4-8,13".
+
+    Returns:
+    - list[tuple[int, int]]: (first, end) ranges in the order written.
+
+    Raises:
+    - RefError: If any reference doesn't parse or isn't in the corpus.
+    """
+    ranges = []
+    for ref in text.split(";"):
+        if ref.strip():
+            ranges.extend(parse_ref(corpus, ref))
+    return ranges
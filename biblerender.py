@@ -0,0 +1,302 @@
+"""
+Verse formatting for the terminal
+
+biblesearch.py prints each verse as its reference and its text wrapped to
+60 columns, red for the words of Jesus and dim otherwise.  Done naively
+that is a new TextWrapper and several writes per verse, and a long chapter
+or a big search result spends its time in Python rather than in the
+terminal.  A Renderer instead:
+
+    - keeps one TextWrapper per width, and wraps plain verses (no hyphens,
+      tabs or double spaces, which is nearly all of them) with a greedy
+      fill that gives the same lines without TextWrapper's regexes
+    - caches the wrapped layout of each verse per width (LRU), so paging
+      back and forth or printing a chapter again costs nothing
+    - builds a whole result set into one string and writes it once
+    - leaves the colour codes out when the stream isn't a terminal, so a
+      pipe gets plain text with nothing stripping codes on the way
+
+A Pager splits a long result list into screens and hands them out one at
+a time, so only the screens actually looked at are ever formatted.
+
+Usage:
+    renderer = Renderer(sys.stdout)
+    renderer.write(engine.iter_chapter("Ps", 119))
+    renderer.width = None               unwrapped
+
+    pager = Pager(engine.search("love"), 10)
+    for ordinals in pager:
+        renderer.write(engine.verses(ordinals))
+        pager.next()                    or previous(), jump(n), close()
+"""
+import sys
+import textwrap
+from collections import OrderedDict
+
+# columns verses are wrapped to, None for no wrapping
+DEFAULT_WIDTH = 60
+
+# wrapped verses to keep, a few times the longest chapter or page
+DEFAULT_MAX_LAYOUTS = 4096
+
+# ANSI codes, the same ones colorama's Style and Fore write
+RESET = "\x1b[0m"
+DIM = "\x1b[2m"
+RED = "\x1b[31m"
+
+_wrappers = {}
+
+
+def wrapper(width):
+    """
+    The shared TextWrapper for a width.
+
+    Parameters:
+    - width (int): Columns.
+
+    Returns:
+    - textwrap.TextWrapper: Made on first use, then reused.
+    """
+    found = _wrappers.get(width)
+    if found is None:
+        found = _wrappers[width] = textwrap.TextWrapper(width=width)
+    return found
+
+
+def wrap(text, width):
+    """
+    Lines of text wrapped to a width, exactly as TextWrapper(width).wrap()
+    would, but without its regexes for text with only single spaces in it.
+
+    Parameters:
+    - text (str): One verse.
+    - width (int): Columns.
+
+    Returns:
+    - list[str]: The lines.
+    """
+    if (
+        "-" in text
+        or "  " in text
+        or not text.isprintable()
+        or text[:1] == " "
+        or text[-1:] == " "
+    ):
+        return wrapper(width).wrap(text)
+
+    # each line ends at the last space that leaves it no wider than width
+    lines = []
+    start = 0
+    end = len(text)
+    while end - start > width:
+        cut = text.rfind(" ", start, start + width + 1)
+        if cut < 0:
+            # a word longer than a line, TextWrapper splits it
+            return wrapper(width).wrap(text)
+        lines.append(text[start:cut])
+        start = cut + 1
+    if start < end:
+        lines.append(text[start:])
+    return lines
+
+
+def is_terminal(stream):
+    """
+    Returns:
+    - bool: True if stream is an interactive terminal, so worth colouring.
+    """
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+class Renderer:
+    """
+    Formats verses for a terminal and writes them out in one go.
+
+    Parameters:
+    - stream (file, optional): Where write() sends the text, sys.stdout when
+      it's called if not given.
+    - width (int or None): Columns to wrap to, None not to wrap.
+    - color (bool, optional): Colour the output; by default only if stream
+      is a terminal.
+    - max_layouts (int): Wrapped verses to cache.
+
+    Attributes:
+    - width (int or None): Can be changed at any time, the cache keeps the
+      layouts of every width.
+    - color (bool): Can be changed at any time too.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        width=DEFAULT_WIDTH,
+        color=None,
+        max_layouts=DEFAULT_MAX_LAYOUTS,
+    ):
+        self.stream = stream
+        self.width = width
+        if color is None:
+            color = is_terminal(stream if stream is not None else sys.stdout)
+        self.color = color
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+
+    def layout(self, verse):
+        """
+        A verse's text as it is printed: wrapped if width is set, every line
+        ending in a newline.  Cached per verse and width.
+
+        Parameters:
+        - verse (Verse): The verse.
+
+        Returns:
+        - str: The text.
+        """
+        key = (verse.corpus.digest, verse.ordinal, self.width)
+        layouts = self._layouts
+        text = layouts.get(key)
+        if text is not None:
+            layouts.move_to_end(key)
+            return text
+        if self.width:
+            lines = wrap(verse.text, self.width)
+            text = "\n".join(lines) + "\n" if lines else ""
+        else:
+            text = verse.text + "\n"
+        layouts[key] = text
+        if len(layouts) > self.max_layouts:
+            layouts.popitem(last=False)
+        return text
+
+    def format(self, verse):
+        """
+        One verse as printed: reference, text and two blank lines, in red
+        for the words of Jesus (see ATTRIBUTE_PATTERNS in biblecorpus.py),
+        dim otherwise.
+
+        Parameters:
+        - verse (Verse): The verse.
+
+        Returns:
+        - str: The text, with colour codes if color is set.
+        """
+        body = verse.ref + "\n" + self.layout(verse) + "\n\n"
+        if not self.color:
+            return body
+        return RESET + (RED if verse.red_letter else DIM) + body + RESET
+
+    def render(self, verses):
+        """
+        Parameters:
+        - verses (iterable[Verse]): Verses in the order to print them.
+
+        Returns:
+        - str: All of them formatted, see format().
+        """
+        fmt = self.format
+        return "".join([fmt(verse) for verse in verses])
+
+    def render_parallel(self, rows, names):
+        """
+        Verses of several translations, each reference followed by the
+        text of every translation under its name.
+
+        Parameters:
+        - rows (list[tuple[str, list]]): (reference, [Verse or None per
+          translation]), see Library.parallel().
+        - names (list[str]): Translation names, in the same order.
+
+        Returns:
+        - str: All of them formatted, coloured by the first translation.
+        """
+        labels = [name.upper() + "\n" for name in names]
+        out = []
+        for ref, verses in rows:
+            body = [ref + "\n"]
+            for label, verse in zip(labels, verses):
+                body.append(label)
+                body.append(self.layout(verse) if verse is not None else "-\n")
+            body.append("\n\n")
+            if self.color:
+                out.append(RESET + (RED if verses[0].red_letter else DIM))
+                out.extend(body)
+                out.append(RESET)
+            else:
+                out.extend(body)
+        return "".join(out)
+
+    def write(self, verses):
+        """
+        Format verses and write them to the stream with one write.
+
+        Parameters:
+        - verses (iterable[Verse]): Verses in the order to print them.
+        """
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(self.render(verses))
+        stream.flush()
+
+    def clear(self):
+        """
+        Forget every cached layout.
+        """
+        self._layouts.clear()
+
+
+class Pager:
+    """
+    Walks a list a page at a time.  Iterating gives the items of the
+    current page, again after each move, until the last page is passed or
+    close() is called; nothing is done for the pages in between a jump.
+
+    Parameters:
+    - items (sequence): e.g. the verse ordinals of a search.
+    - size (int): Items per page.
+
+    Attributes:
+    - page (int or None): Current page, 0 based, None once finished.
+    - pages (int): Number of pages, at least 1.
+    """
+
+    def __init__(self, items, size):
+        self.items = items
+        self.size = max(1, size)
+        self.pages = max(1, -(-len(items) // self.size))
+        self.page = 0
+
+    def __iter__(self):
+        while self.page is not None:
+            first = self.page * self.size
+            yield self.items[first : first + self.size]
+
+    def next(self):
+        """
+        Move to the next page, finishing after the last one.
+        """
+        if self.page is not None:
+            self.page = self.page + 1 if self.page + 1 < self.pages else None
+
+    def previous(self):
+        """
+        Move back a page, staying on the first.
+        """
+        if self.page is not None:
+            self.page = max(0, self.page - 1)
+
+    def jump(self, page):
+        """
+        Move to a page, clamped to the first and last.
+
+        Parameters:
+        - page (int): Page number, 1 based as shown to the user.
+        """
+        self.page = min(max(page, 1), self.pages) - 1
+
+    def close(self):
+        """
+        Finish, the iteration ends.
+        """
+        self.page = None
@@ -0,0 +1,209 @@
+"""
+Whole corpus scans for searches the word index can't answer
+
+Regexes, punctuation and anything else that isn't plain words used to be
+matched verse by verse: decode the text, run the regex, 31,000 times per
+search.  The compiled corpus (see biblecorpus.py) also keeps every verse
+lower cased in one buffer, each followed by a newline:
+
+    \\nin the beginning god created the heaven and the earth.\\nand the...
+
+so a search is a handful of calls that run over the whole buffer in C,
+bytes.find() for plain text and one regex search per matching verse
+otherwise, and a byte offset becomes a verse ordinal with a bisect over
+the verse start offsets.  After a hit the scan jumps to the next verse,
+so the Python work is per matching verse, not per verse or per
+occurrence.  The buffer is part of the memory mapped file, so it isn't
+copied and is shared between processes.
+
+The newlines make ^ and $ (in MULTILINE mode) match at verse boundaries
+as they do on a single verse, and a match that runs into the next verse is
+checked again on its own verse.  Regexes whose meaning could still change
+(lookarounds, \\A and \\Z, case sensitive ones) and corpora that aren't
+ASCII are left to the verse by verse scan, and so are regexes starting
+with ^, which re only tries at the start of each verse anyway.  A regex
+that turns out to match most verses (\\s, "the") is finished verse by
+verse too, since then the work is per verse either way and the plain loop
+is cheaper per verse.
+
+Usage:
+    scanner = Scanner(buffer, start, end, starts, corpus.text)
+    ordinals = scanner.search(re.compile("lord's", re.IGNORECASE))
+"""
+import re
+from array import array
+from bisect import bisect_right
+
+from bibleindex import POSTING_TYPE
+
+# characters that make a regex more than plain text
+SPECIAL = frozenset(".^$*+?{}[]|()")
+
+# things that would see past a verse boundary differently in the buffer
+UNSCANNABLE_RE = re.compile(r"\(\?<?[=!]|\\[AZ]")
+
+# groups that turn ignoring case off, like (?-i:God); the buffer is lower cased
+CASE_SENSITIVE_RE = re.compile(r"\(\?[aiLmsux]*-")
+
+# after this many hits, a scan that has found them in under DENSE_RATIO
+# times as many verses goes on verse by verse
+DENSE_HITS = 256
+DENSE_RATIO = 4
+
+
+def literal_text(pattern):
+    """
+    The text a regex matches if it is plain text, e.g. re.escape() output.
+
+    Parameters:
+    - pattern (str): The regex source.
+
+    Returns:
+    - str or None: The text, None if the regex has anything special in it.
+    """
+    text = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            if char.isalnum():
+                return None
+            text.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in SPECIAL:
+            return None
+        else:
+            text.append(char)
+    return None if escaped else "".join(text)
+
+
+class Scanner:
+    """
+    Searches the lower cased scan buffer of a compiled corpus.
+
+    Parameters:
+    - buffer (bytes or mmap.mmap): The compiled corpus.
+    - start (int), end (int): Where the scan text is in buffer.
+    - starts (memoryview): array('I'), verse i is at [starts[i], starts[i + 1]
+      - 1) from start, the newline after it at starts[i + 1] - 1.
+    - text (callable): Verse text by ordinal, to check matches that cross
+      into the next verse.
+    """
+
+    def __init__(self, buffer, start, end, starts, text):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.starts = starts
+        self.text = text
+        self._ascii = None
+
+    def ascii(self):
+        """
+        Returns:
+        - bool: True if the scan text is plain ASCII, checked on first use.
+        """
+        if self._ascii is None:
+            self._ascii = self.buffer[self.start : self.end].isascii()
+        return self._ascii
+
+    def search(self, pattern, first=0, end=None):
+        """
+        Verses the regex matches, ignoring case.
+
+        Parameters:
+        - pattern (re.Pattern): Compiled with re.IGNORECASE.
+        - first (int), end (int, optional): Ordinals to search, every verse
+          by default.
+
+        Returns:
+        - array or None: Sorted verse ordinals, None if the regex has to be
+          run on each verse instead.
+        """
+        if end is None:
+            end = len(self.starts) - 1
+        if not pattern.flags & re.IGNORECASE or isinstance(pattern.pattern, bytes):
+            return None
+        literal = literal_text(pattern.pattern)
+        if literal is not None:
+            return self.find(literal, first, end)
+        if (
+            pattern.pattern.startswith("^")
+            or UNSCANNABLE_RE.search(pattern.pattern)
+            or CASE_SENSITIVE_RE.search(pattern.pattern)
+            or not pattern.pattern.isascii()
+            or not self.ascii()
+        ):
+            return None
+        flags = pattern.flags & ~re.UNICODE | re.MULTILINE
+        regex = re.compile(pattern.pattern.encode("ascii"), flags)
+        return self._scan(regex, pattern, first, end)
+
+    def find(self, literal, first=0, end=None):
+        """
+        Verses containing some text, ignoring case.
+
+        Parameters:
+        - literal (str): The text.
+        - first (int), end (int, optional): Ordinals to search, every verse
+          by default.
+
+        Returns:
+        - array: Sorted verse ordinals.
+        """
+        if end is None:
+            end = len(self.starts) - 1
+        needle = literal.lower().encode("utf-8")
+        if not needle:
+            # empty text is in every verse
+            return array(POSTING_TYPE, range(first, end))
+        buffer, start, starts = self.buffer, self.start, self.starts
+        hits = array(POSTING_TYPE)
+        pos = start + starts[first]
+        stop = start + starts[end]
+        while True:
+            at = buffer.find(needle, pos, stop)
+            if at < 0:
+                break
+            ordinal = bisect_right(starts, at - start) - 1
+            if ordinal >= end:
+                break
+            newline = start + starts[ordinal + 1] - 1
+            if at + len(needle) <= newline:
+                hits.append(ordinal)
+                pos = newline + 1
+            else:
+                pos = at + 1
+        return hits
+
+    def _scan(self, regex, pattern, first, end):
+        # the regex only sees verses first to end, so a match can't run
+        # into the verse after them
+        buffer, start, starts = self.buffer, self.start, self.starts
+        hits = array(POSTING_TYPE)
+        pos = start + starts[first]
+        stop = start + starts[end]
+        while pos < stop:
+            match = regex.search(buffer, pos, stop)
+            if match is None:
+                break
+            ordinal = bisect_right(starts, match.start() - start) - 1
+            if ordinal >= end:
+                break
+            newline = start + starts[ordinal + 1] - 1
+            if match.end() <= newline or pattern.search(self.text(ordinal)):
+                hits.append(ordinal)
+                if (
+                    len(hits) == DENSE_HITS
+                    and ordinal - first < DENSE_HITS * DENSE_RATIO
+                ):
+                    search, text = pattern.search, self.text
+                    hits.extend(
+                        ordinal
+                        for ordinal in range(ordinal + 1, end)
+                        if search(text(ordinal))
+                    )
+                    break
+            pos = newline + 1
+        return hits
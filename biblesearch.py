@@ -21,20 +21,55 @@ Version History
 1.3 small bugs, formatting, documentation, status, standardized colors
 1.4 search by entire chapter, not just verse, removed json dump, added exit
 1.5 added more color tags for Jesus Sai|loo|beg|ask|pre|beh but found nentire chapters missing
+1.6 verses are formatted by biblerender.py: wrapped once per width and cached,
+    written in one go, and no colours at all when output goes to a pipe
+1.7 P pages long searches: the count first, then a screen at a time
+1.8 other translations beside biblesearch.txt (biblesearch.asv.txt, ...):
+    T switches between them, C shows verses in all of them side by side
+1.9 --jobs N scans regex searches on N processes (see bibleparallel.py)
+1.10 tag and note verses, then search them: S tag:memorize love
+     (kept in biblesearch.notes.log, see bibleannotations.py)
+
+--profile prints how long each step of every command took (load, parse,
+lookup, filter, render...), "stats" prints the running totals, and
+--cprofile FILE / --tracemalloc FILE dump a profile of the whole session
+when it ends
+
+--jobs N runs regex searches the word index can't answer on N processes,
+each scanning a few books; off by default, it only pays with cores to spare
 
 """
-version = '1.5'
+version = '1.10'
 
+import argparse     # --profile and the dump files
 import re           # the main search function
-import textwrap     # wrapping text
-import codecs       # to avoid utf-8 errors
+import shutil       # terminal size, for paging
 import sys           # for sys.exit and argv
+from contextlib import ExitStack
 #import json         # dumping to json
 
+from biblerefs import RefError, looks_like_refs  # Joh 3:16-21; Ro 8
+from biblerender import Pager, Renderer, is_terminal  # wrapping, colours, pages
+from bibletiming import profiled, traced_memory  # timing spans and dumps
+from bibletranslations import Library, find_translations  # KJV, ASV, WEB...
+
 # and the pretty text
 from colorama import init
 from colorama import Fore, Back, Style
-init()
+
+
+class NoColor:
+    # stands in for Fore/Back/Style when there's nothing to colour
+    def __getattr__(self, name):
+        return ""
+
+
+# colours only on a terminal, piped output (python biblesearch.py > out.txt)
+# gets plain text and colorama doesn't have to strip anything out of it
+if is_terminal(sys.stdout):
+    init()
+else:
+    Fore = Back = Style = NoColor()
 
 # files in and out
 bibledata = 'biblesearch.txt' # in
@@ -47,304 +82,535 @@ Examples:
 
 Re,22,3 (to display just a verse Revelations 22:3)
 Re,22   (to display an entire chapter Revelations 22)
+Joh 3:16-21; Ro 8; 1Co 13:4-8,13   (any list of verses, ranges, chapters)
 
 Q       quits
 W       will toggle word wrap from 60 characters to none or back
+R       will toggle ranking: searches show the 20 best verses first
+        instead of every verse in order
+P       will toggle paging: long searches show the count, then a screen
+        at a time (Enter next, b back, a number jumps, q stops)
 S       will search for any string (case insensitive, otherwise exact)
+        if nothing matches it suggests the closest spelling
+        "son of man" finds the phrase, faith NEAR/5 hope finds both
+        words at most 5 words apart
+        love AND (neighbour OR brother) NOT hate book:Mt-Joh chapter:1-5
+        (AND OR NOT in capitals, these match whole words only)
+T       lists the translations, T asv switches to one (any
+        biblesearch.<name>.txt next to biblesearch.txt)
+C       shows verses in every translation side by side: C Joh 3:16-18
+tag     tags verses: tag Joh 3:16; Ro 8:28 memorize (untag takes it off)
+note    notes on verses: note Ps 23 read at the funeral
+        note Ps 23:1 shows its tags and note, unnote Ps 23 removes it
+        search them with tag:memorize and note:funeral
+tags    lists the tags and how many verses have each
+stats   how long loading, searching and printing have taken so far
 ?       prints this help message, lists the book names
 
 """
 
+
 # in case you forgot the abbrevs of the books
-books = """
--------------------------------------------
-        Book    #       Chapters
--------------------------------------------
-        Ge      1       (50)
-        Ex      2       (40)
-        Le      3       (27)
-        Nu      4       (36)
-        De      5       (34)
-        Jos     6       (24)
-        Jg      7       (21)
-        Ru      8       (4)
-        1Sa     9       (31)
-        2Sa     10      (24)
-        1Ki     11      (22)
-        2Ki     12      (25)
-        1Ch     13      (29)
-        2Ch     14      (36)
-        Ezr     15      (10)
-        Ne      16      (13)
-        Es      17      (10)
-        Job     18      (42)
-        Ps      19      (150)
-        Pr      20      (31)
-        Ec      21      (12)
-        Song    22      (8)
-        Isa     23      (66)
-        Jer     24      (52)
-        La      25      (5)
-        Eze     26      (48)
-        Da      27      (12)
-        Ho      28      (14)
-        Joe     29      (3)
-        Am      30      (9)
-        Ob      31      (1)
-        Jon     32      (4)
-        Mic     33      (7)
-        Na      34      (3)
-        Hab     35      (3)
-        Zep     36      (3)
-        Hag     37      (2)
-        Zec     38      (14)
-        Mal     39      (4)
-        Mt      40      (28)
-        Mr      41      (16)
-        Lu      42      (24)
-        Joh     43      (21)
-        Ac      44      (28)
-        Ro      45      (16)
-        1Co     46      (16)
-        2Co     47      (13)
-        Ga      48      (6)
-        Eph     49      (6)
-        Php     50      (4)
-        Col     51      (4)
-        1Th     52      (5)
-        2Th     53      (3)
-        1Ti     54      (6)
-        2Ti     55      (4)
-        Tit     56      (3)
-        Phm     57      (1)
-        Heb     58      (13)
-        Jas     59      (5)
-        1Pe     60      (5)
-        2Pe     61      (3)
-        1Jo     62      (5)
-        2Jo     63      (1)
-        3Jo     64      (1)
-        Jude    65      (1)
-        Re      66      (22)
-"""
+def book_list():
+    """
+    table of book abbreviations, numbers and chapter counts
+    built from the engine, so it's the same table the Tk app uses
+    """
+    lines = [
+        "",
+        "-------------------------------------------",
+        "        Book    #       Chapters",
+        "-------------------------------------------",
+    ]
+    for number, book in enumerate(engine.books(), start=1):
+        lines.append("        %-8s%-8d(%d)" % (book.abbrev, number, book.chapters))
+    return "\n".join(lines) + "\n"
+
 
+# everything about the text (verses, word index, searches) is in the engine
+engine = None
 
-# create dictionary to hold bible data from text file
-# maybe dumping as json would be better?
-bible_dict=dict()
+# every translation, each engine opened the first time it's used and closed
+# again if they'd take too much memory; engine is the one called translation
+library = None
+translation = None
 
-# by default we wrap words at 50
+# --jobs, processes each translation scans regexes on
+scan_jobs = 1
+
+# by default we wrap words at 60
 wrapped = 1
+WRAP_WIDTH = 60
+
+# formats verses, keeps each verse's wrapped text for next time
+renderer = Renderer(width=WRAP_WIDTH)
+
+# tag, untag, note: the references, then the tag or the note text
+# "Joh 3:16; Ro 8:28 memorize" -> "Joh 3:16; Ro 8:28", "memorize"
+ANNOTATE_RE = re.compile(
+    r"((?:\d?\s*[^\W\d_]+\.?\s+[\d:,-]+\s*;\s*)*\d?\s*[^\W\d_]+\.?\s+[\d:,-]+)\s*(.*)"
+)
+
+# R shows the best few verses of a search instead of all of them
+ranked = 0
+RANKED_RESULTS = 20
+
+# P pages long searches, on by default on a terminal (piped output has
+# nobody to press Enter)
+paged = is_terminal(sys.stdout)
 
+# about how many lines a verse takes: reference, wrapped text, blank lines
+VERSE_LINES = 6
 
-def search_bible(values, search_for):
+
+def search_bible(search_for):
     """
-    searches through our dictionary values for string
-    builds list of bcv to print later
+    searches the bible for a string (a regex, ignoring case)
+    builds list of verse ordinals to print later
+    plain words come straight from the word index, only a real
+    regex still has to scan every verse
+    queries (AND/OR/NOT, book:, "phrases", NEAR/n) go to the planner
+    repeat searches come from the engine's cache
     """
-    keys_list = []
-    items_list = values.items()
-    searched = re.compile(search_for, re.IGNORECASE)
-    for item in items_list:
-        if searched.search(item[1]):
-            keys_list.append(item[0])
-    return keys_list
+    return engine.search(search_for, mode="regex")
 
 
-def search_books(values, search_for):
-    # the full list of all books
-    # add a : to it so it's james 1:* not James 1* (matches James 11)
-    final = search_for + ":"
-    keys_list = list(values.keys())
+def search_ranked(search_for):
+    """
+    same search, but only the best RANKED_RESULTS verses, best first
+    (BM25, see bibleranking.py), so a common word doesn't print
+    hundreds of verses nobody reads
+    """
+    return engine.ranked(search_for, mode="regex", limit=RANKED_RESULTS)
 
-    # built our wanted list
-    wanted = [i for i in keys_list if final in i]
-    return wanted
 
+def search_books(book, chapter):
+    # every verse of a book, chapter like "Re", "22"
+    # the engine knows where each chapter starts and ends, so this is
+    # just a slice instead of checking all 31,103 verses
+    return list(engine.iter_chapter(book, chapter))
 
-def print_verse(bcv):
+
+def format_verse(verse):
     """
-    prints a bible verse based on book, chapter, verse
+    formats a bible verse (a Verse from the engine)
     if wrapped flag is set, it wraps text
+    returns the text with its colors, ready to write out
+    red for stuff Jesus said, dim for the rest, worked out once when the
+    corpus is compiled (see ATTRIBUTE_PATTERNS in biblecorpus.py)
     """
-    print(Style.RESET_ALL,end="")
+    return renderer.format(verse)
 
-    # https://pypi.org/project/colorama/ just doing red for stuff Jesus said
-    # could be all sorts of colors for all sorts of tpics though if desired
-    # my "red Jesus stuff" misses out entire chapters because it doesn't match these things
-    # fixme: consider database of verses that match instead of regex
-    if re.search("JESUS SAI",bible_dict[bcv], re.IGNORECASE): #108 verses
-        print(Fore.RED,end="")
-    elif re.search("JESUS ASK",bible_dict[bcv], re.IGNORECASE): # 2 verses
-        print(Fore.RED,end="")
-    elif re.search("JESUS LOOK",bible_dict[bcv], re.IGNORECASE):
-        print(Fore.RED,end="")
-    elif re.search("JESUS BEH",bible_dict[bcv], re.IGNORECASE):
-        print(Fore.RED,end="")
-    elif re.search("JESUS BEG",bible_dict[bcv], re.IGNORECASE):
-        print(Fore.RED,end="")
-    elif re.search("JESUS PRE",bible_dict[bcv], re.IGNORECASE):
-        print(Fore.RED,end="")
-    elif re.search("THIS IS MY BODY",bible_dict[bcv], re.IGNORECASE):
-        print(Fore.RED,end="")
-    #elif re.search("JESUS TOOK BREAD",bible_dict[bcv], re.IGNORECASE):
-    #    print(Fore.RED,end="")
-    else:
-        print(Style.DIM,end="")
-
-    if wrapped:
-        # do we want it wrapped at 60 characters?
-        wrapper = textwrap.TextWrapper(width=60)
-        word_list = wrapper.wrap(text=bible_dict[bcv])
-        print(bcv)
-        for element in word_list:
-            print(element)
-        print("\n")
-    
+
+def print_verse(verse):
+    """
+    prints a bible verse
+    """
+    print_verses([verse])
+
+
+def print_verses(verse_list):
+    """
+    prints a list of verses with one write instead of several
+    prints per verse, which is what makes long passages slow
+    formatting and writing are timed separately, a slow terminal
+    shows up as output rather than render
+    """
+    with engine.timings.span("render"):
+        text = renderer.render(verse_list)
+    with engine.timings.span("output"):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def list_translations():
+    """
+    the translations there are, * for the one in use and + for ones
+    already open
+    """
+    loaded = library.loaded()
+    lines = []
+    for name in library.names():
+        mark = "*" if name == translation else "+" if name in loaded else " "
+        lines.append("  %s %s  %s" % (mark, name.upper(), library.translations[name]))
+    return "\n".join(lines)
+
+
+def switch_translation(name):
+    """
+    makes another translation the one every command uses
+    it's pinned so opening others for C never closes it
+    """
+    global engine, translation
+    engine = library.engine(name)
+    library.pin(name)
+    if translation is not None and translation != name.lower():
+        library.unpin(translation)
+    translation = name.lower()
+
+
+def print_parallel(refs):
+    """
+    prints verses in every translation, the one in use first
+    verses are matched by book, chapter and verse, so a translation
+    that numbers them differently still lines up
+    """
+    names = [translation] + [name for name in library.names() if name != translation]
+    rows = library.parallel(refs, names)
+    with engine.timings.span("render"):
+        text = renderer.render_parallel(rows, names)
+    with engine.timings.span("output"):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def annotate(command, argument):
+    """
+    tag, untag, note and unnote: changes are written to the notes
+    log straight away and searches see them at once, nothing gets
+    re-indexed
+    """
+    match = ANNOTATE_RE.fullmatch(argument)
+    if not match:
+        example = " memorize" if command in ("tag", "untag") else ""
+        print("Try: " + command + " Joh 3:16" + example)
+        return
+    refs, rest = match.groups()
+    if command == "note" and not rest:
+        print_annotations(refs)
+    elif command == "unnote":
+        print("Removed the note on %d verses" % engine.note(refs, ""))
+    elif command == "note":
+        print("Noted %d verses" % engine.note(refs, rest))
+    elif not rest:
+        print("Which tag?  " + command + " " + refs + " memorize")
+    elif command == "tag":
+        print("Tagged %d verses %s" % (engine.tag(refs, rest), rest.lower()))
     else:
-        # if not, then ok, just print it
-        print(bcv)
-        print(bible_dict[bcv])
-        print("\n")
+        print("Untagged %d verses %s" % (engine.untag(refs, rest), rest.lower()))
 
-    print(Style.RESET_ALL,end="")
 
+def print_annotations(refs):
+    """
+    prints the tags and note of each verse that has any
+    """
+    annotations = engine.annotations()
+    found = 0
+    for verse in engine.lookup(refs):
+        tags = annotations.tags(verse.ordinal)
+        note = annotations.note_of(verse.ordinal)
+        if tags or note:
+            found += 1
+            print(verse.ref + (" [" + ", ".join(tags) + "]" if tags else ""))
+            if note:
+                print("    " + note)
+    if not found:
+        print("No tags or notes on " + refs)
+
+
+def list_tags():
+    """
+    every tag and how many verses have it
+    """
+    tags = engine.annotations().tags()
+    if not tags:
+        return "No tags yet, add one with: tag Joh 3:16 memorize"
+    return "\n".join("  %-20s%d" % (name, count) for name, count in tags.items())
 
-# colorize the status
-print(Style.DIM,end="")
-print(sys.argv[0] + " version: " + str(version))
-
-# open and read entire file in (31,103 lines)
-print("indexing...",end="")
-with codecs.open(bibledata, 'r', encoding='utf-8', errors='ignore') as f:
-    for line in f:
-        # split the line by spaces
-        fields=re.split('\s', line)
-        
-        # first field is the book (Ge)
-        book=fields[0]
-
-        # next filed is the chapter:verse, so split it again (1:1)
-        cv=re.split(':',fields[1])
-        chapter=cv[0]
-        verse=cv[1]
-        
-        # then we want the rest of the block into a text
-        text=' '.join(fields[2:])
-
-        # build key, then add to dictionary
-        key = book + ' ' + chapter + ':' +verse
-        bible_dict[key] = text
-print("done")
 
-"""
-dump data to json format to verify structure
-Not required, just wanted to see the structure
-fixme: use json data instead of munging line by line
-chiken and egg - already wrote line munger
-"""
-#print("Dumping to json...",end="")
-#with open (biblejson, 'w') as outfile:
-#    json.dump(bible_dict, outfile, indent=2)
-#print("done: ",biblejson)
+def page_size():
+    """
+    how many verses fit on the screen, roughly
+    """
+    lines = shutil.get_terminal_size((80, 24)).lines
+    return max(1, (lines - 2) // VERSE_LINES)
+
+
+def page_verses(ordinals):
+    """
+    prints a list of verse ordinals a screen at a time
+    only the pages you look at get formatted, so the first screen of
+    a search for "the" comes up straight away and skipped pages cost
+    nothing
+    """
+    pager = Pager(ordinals, page_size())
+    for page in pager:
+        print_verses(engine.verses(page))
+        if pager.pages == 1:
+            break
+        answer = input(
+            Fore.GREEN
+            + "-- page %d of %d: Enter next, b back, number jumps, q stops -- "
+            % (pager.page + 1, pager.pages)
+            + Style.RESET_ALL
+        ).strip().lower()
+        if answer == "q":
+            pager.close()
+        elif answer == "b":
+            pager.previous()
+        elif answer.isdigit():
+            pager.jump(int(answer))
+        else:
+            pager.next()
 
 
-# reset colorized
-print(Style.RESET_ALL,end="")
-print(quickhelp)
-print(Style.RESET_ALL,end="")
+def print_stats():
+    """
+    prints the timing spans and how well the search cache is doing
+    """
+    stats = engine.stats()
+    print(engine.timings.report())
+    cache = stats["cache"]
+    print(
+        "\nsearch cache: %d hits, %d misses, %d entries"
+        % (cache["hits"], cache["misses"], cache["entries"])
+    )
 
-while True:
+
+def main():
+    """
+    reads the command line flags and runs a session, under cProfile
+    and tracemalloc if asked so the dumps cover loading too
     """
-    loop over our commands and do stuff:
-    W: toggle wrapp
-    Q: quit
-    S: Search
-    ?: prints list of books and help message
-    BCV: prints that vers
+    parser = argparse.ArgumentParser(description="Bible search in the terminal")
+    parser.add_argument(
+        "--profile", action="store_true", help="time each step of every command"
+    )
+    parser.add_argument(
+        "--cprofile", metavar="FILE", help="write cProfile stats at exit (.prof: raw)"
+    )
+    parser.add_argument(
+        "--tracemalloc", metavar="FILE", help="write the biggest allocations at exit"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="processes to scan regex searches on (default 1, no pool)",
+    )
+    args = parser.parse_args()
+
+    with ExitStack() as dumps:
+        if args.cprofile:
+            dumps.enter_context(profiled(args.cprofile))
+        if args.tracemalloc:
+            dumps.enter_context(traced_memory(args.tracemalloc))
+        session(args.profile, args.jobs)
+
+    # cleanup
+    sys.exit()
+
+
+def session(profile=False, jobs=1):
     """
+    loads the engine and runs the command prompt
+    with profile set, each command is followed by its timings
+    """
+    global engine, library, wrapped, ranked, paged, scan_jobs
 
-    print(Fore.GREEN)
-    search=input("COMMAND: ")
-    print(Style.RESET_ALL,end="")
+    scan_jobs = jobs
+
+    # colorize the status
+    print(Style.DIM,end="")
+    print(sys.argv[0] + " version: " + str(version))
 
-    if (re.findall(',',search)):
-
-        # figure out if you want B,C or B,C,V
-        search_params = search.split(",")
-        
-        if (len(search_params) == 2):
-            # looking for a book, chapter
-            book,chapter=map(str.strip,search.split(","))
-            key=(book + ' ' + chapter)
-            
-            # get a list of verses that match our final string
-            keys_list = search_books(bible_dict, key)
-
-            if(len(keys_list)<1):
-                print("No such Book, Chapter was found: ", key)
-                print("\n")
+    # load the compiled corpus (31,103 verses), it's built from the text file
+    # the first time and again whenever the text file changes
+    print("indexing...",end="")
+    # the word index comes precompiled too, searches don't scan all the verses
+    # other translations aren't loaded until T or C asks for them
+    library = Library(find_translations(bibledata), jobs=scan_jobs)
+    switch_translation(library.default)
+    print("done")
+    if len(library.names()) > 1:
+        print("translations: " + ", ".join(name.upper() for name in library.names()))
+
+    """
+    dump data to json format to verify structure
+    Not required, just wanted to see the structure
+    fixme: use json data instead of munging line by line
+    chiken and egg - already wrote line munger
+    """
+    #print("Dumping to json...",end="")
+    #with open (biblejson, 'w') as outfile:
+    #    json.dump(bible_dict, outfile, indent=2)
+    #print("done: ",biblejson)
+
+
+    # reset colorized
+    print(Style.RESET_ALL,end="")
+    print(quickhelp)
+    print(Style.RESET_ALL,end="")
+    if profile:
+        print(Style.DIM + engine.timings.summary() + Style.RESET_ALL)
+
+    mark = None
+    while True:
+        """
+        loop over our commands and do stuff:
+        W: toggle wrapp
+        Q: quit
+        S: Search
+        ?: prints list of books and help message
+        BCV: prints that vers
+        """
+
+        # the timings of the last command, whichever way it ended
+        if profile and mark is not None:
+            timed = engine.timings.summary(since=mark)
+            print(Style.DIM + (timed or "nothing timed") + Style.RESET_ALL)
+
+        print(Fore.GREEN)
+        search=input("COMMAND: ")
+        print(Style.RESET_ALL,end="")
+        mark = engine.timings.mark()
+
+        # T and C take an argument, so they're checked before anything else
+        command, _, argument = search.strip().partition(" ")
+        argument = argument.strip()
+        if command in ("T", "t"):
+            if not argument:
+                print(list_translations())
+            elif argument in library:
+                switch_translation(argument)
+                print("Now reading " + translation.upper())
             else:
-                # iterate over them and print
-                for bcv in keys_list:
-                    print_verse(bcv)
-
-        elif (len(search_params) == 3):
-            # looking for a book, chapter verse
-            # looks like you entered bcv format, or this is default at least
-            # fixme: if they don't enter a proper b,c,v it dies, do a re or 
-            # otherwise look for 2 commands
-            book,chapter,verse=map(str.strip,search.split(","))
-
-            # rebuild it the way our database key stores it
-            key=(book + ' ' + chapter + ':' + verse)
-
-            # now go ahead and search
-            if(key in bible_dict):
-                # key exists, so wrap it to 60 characters with natural breaks
-                print_verse(key)
+                print("No such translation: " + argument + ", enter T to list them")
+            continue
+        if command in ("C", "c") and argument:
+            try:
+                print_parallel(argument)
+            except RefError as e:
+                print(str(e))
+            continue
+        if command.lower() in ("tag", "untag", "note", "unnote"):
+            try:
+                annotate(command.lower(), argument)
+            except (RefError, ValueError) as e:
+                print(str(e))
+            continue
+        if search.strip().lower() == "tags":
+            print(list_tags())
+            continue
+
+        if looks_like_refs(search):
+            # a reference list like Joh 3:16-21; Ro 8; 1Co 13:4-8,13
+            # resolved to ordinal ranges, so it's just the verses in them
+            try:
+                print_verses(engine.lookup(search))
+            except RefError as e:
+                print(str(e))
+
+        elif (re.findall(',',search)):
+
+            # figure out if you want B,C or B,C,V
+            search_params = search.split(",")
+
+            if (len(search_params) == 2):
+                # looking for a book, chapter
+                book,chapter=map(str.strip,search.split(","))
+                key=(book + ' ' + chapter)
+
+                # get a list of verses that match our final string
+                verse_list = search_books(book, chapter)
+
+                if(len(verse_list)<1):
+                    print("No such Book, Chapter was found: ", key)
+                    print("\n")
+                else:
+                    # print them all in one go
+                    print_verses(verse_list)
+
+            elif (len(search_params) == 3):
+                # looking for a book, chapter verse
+                # looks like you entered bcv format, or this is default at least
+                book,chapter,verse=map(str.strip,search.split(","))
+
+                # rebuild it the way the text file writes it
+                key=(book + ' ' + chapter + ':' + verse)
+
+                # now go ahead and look it up
+                try:
+                    verse_list = engine.lookup(key) if verse.isdigit() else []
+                except RefError:
+                    verse_list = []
+                if(verse_list):
+                    # key exists, so wrap it to 60 characters with natural breaks
+                    print_verse(verse_list[0])
+                else:
+                    # key doesn't exist, remind them 
+                    print("No such Book, Chapter, Verse was found: ", key)
             else:
-                # key doesn't exist, remind them 
-                print("No such Book, Chapter, Verse was found: ", key)
+                print("Invalid Command.  Enter ? for help")
         else:
-            print("Invalid Command.  Enter ? for help")
-    else:
-        if search=="Q" or search=='q': 
-            break
-        elif search=="?":
-            # I can't remember the book names either...
-            print(books)
-            print(quickhelp)
-        elif search=="W" or search=="w":
-            # swap
-            wrapped = not wrapped
-            print("Wrap mode has now swapped")
-        elif search=='S' or search=='s':
-            # type cast input into list, then we'll force to string
-            keyword = list(map(str,input("Search for: ").split()))
-            
-            # convert 1 or more words to string
-            final = ' '.join(keyword)
-
-            # get a list of verses that match our final string
-            keys_list = search_bible(bible_dict, final)
-
-            # iterate over them and print
-            for bcv in keys_list:
-                print_verse(bcv)
-
-            # done
-            if(len(keys_list)<1):
-                print("Nothing matched your search: '" + final + "'")
+            if search=="Q" or search=='q': 
+                break
+            elif search.lower()=="stats":
+                print_stats()
+            elif search=="?":
+                # I can't remember the book names either...
+                print(book_list())
+                print(quickhelp)
+            elif search=="W" or search=="w":
+                # swap, the renderer keeps both layouts cached
+                wrapped = not wrapped
+                renderer.width = WRAP_WIDTH if wrapped else None
+                print("Wrap mode has now swapped")
+            elif search=="R" or search=="r":
+                ranked = not ranked
+                if ranked:
+                    print("Searches now show the %d best verses first" % RANKED_RESULTS)
+                else:
+                    print("Searches now show every verse in order")
+            elif search=="P" or search=="p":
+                paged = not paged
+                if paged:
+                    print("Long searches are now shown a screen at a time")
+                else:
+                    print("Searches now print every verse in one go")
+            elif search=='S' or search=='s':
+                # type cast input into list, then we'll force to string
+                keyword = list(map(str,input("Search for: ").split()))
+
+                # convert 1 or more words to string
+                final = ' '.join(keyword)
+
+                # get a list of verses that match our final string
+                try:
+                    verse_list = search_bible(final)
+                    best = search_ranked(final) if ranked else verse_list
+                except (re.error, ValueError) as e:
+                    print("Invalid search: '" + final + "' (" + str(e) + ")")
+                    continue
+
+                if(len(verse_list)<1):
+                    print("Nothing matched your search: '" + final + "'")
+                    # misspelt KJV words are the usual reason, offer the
+                    # closest words the text does have
+                    suggestion = engine.suggest(final, mode="regex")
+                    if suggestion:
+                        print("Did you mean: '" + suggestion + "'?")
+                    continue
+
+                if len(best) < len(verse_list):
+                    found = "The %d best of %d verses found in search: '%s'" % (len(best), len(verse_list), final)
+                else:
+                    found = str(len(verse_list)) + " verses were found in search: '" + final + "'"
+
+                if paged and len(best) > page_size():
+                    # the count first, then a screen at a time
+                    print(found)
+                    page_verses(best)
+                else:
+                    # print them all in one go
+                    print_verses(engine.verses(best))
+                    print(found)
             else:
-                print(str(len(keys_list)) + " verses were found in search: '" + final + "'" )
-        else:
-            print("Invalid Command.  Enter ? for help")
-
+                print("Invalid Command.  Enter ? for help")
 
 
-# cleanup
-sys.exit()
+if __name__ == "__main__":
+    main()
 
 # sample data from #http://www.bibleprotector.com/TEXT-PCE.zip
 """
@@ -0,0 +1,468 @@
+"""
+HTTP/JSON search service
+
+Serves the engine (see bibleengine.py) over HTTP with nothing but the
+standard library.  The corpus is loaded once and one asyncio event loop
+answers every client; connections are kept alive between requests.
+Searches run on a single worker thread, so a slow regex scan doesn't hold
+up lookups and the engine's result cache is only used from one thread.
+
+Other translations beside the source file (biblesearch.asv.txt, ...) are
+opened on first use and closed again to stay within --budget MB, see
+bibletranslations.py.  Every endpoint but /translations takes
+&translation=asv, the default is the source file's.  With --scan-jobs N,
+regexes the word index can't answer are scanned on N processes that every
+translation shares (see bibleparallel.py); it's off by default.
+
+Endpoints (GET, results are JSON):
+    /lookup?ref=Joh 3:16-21; Ro 8           {"verses": [...]}
+    /search?q=faith NEAR/5 hope             {"total": 12, "offset": 0,
+        &mode=word|regex                     "limit": 50, "verses": [...]}
+        &book=Ro&chapter=8
+        &offset=0&limit=50
+        &rank=bm25                           (best first, see bibleranking.py)
+    /chapter?book=John&chapter=3            {"book": "John", "chapter": 3,
+                                             "verses": [...]}
+    /complete?prefix=nebu&limit=10          {"words": ["nebuchadnezzar", ...]}
+    /parallel?ref=Joh 3:16                  {"translations": ["kjv", "asv"],
+        &translations=kjv,asv                "verses": [{"ref": "Joh 3:16",
+                                             "texts": {"kjv": ..., "asv": ...}}]}
+    /translations                           {"translations": [...],
+                                             "default": "kjv", "loaded": {...}}
+    /stats                                  {"spans": {...}, "cache": {...},
+                                             "translations": {...}}
+
+Each verse is {"ref", "book", "name", "chapter", "verse", "text",
+"red_letter"}.  A search that finds nothing also has "suggestion", the
+search with misspelt words corrected (or null).  Bad input gets a 400 with
+{"error": "..."}, anything else that goes wrong a 500, and the traceback
+is printed.
+
+Usage:
+    python bibleserver.py [--host 127.0.0.1] [--port 8080]
+                          [--source biblesearch.txt] [--budget 64]
+                          [--scan-jobs 1]
+
+    python bibleload.py                     (requests/sec and latency)
+"""
+import argparse
+import asyncio
+import json
+import re
+import signal
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from bibletranslations import DEFAULT_BUDGET, Library, find_translations
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# how long an idle keep-alive connection is held open
+KEEP_ALIVE_SECONDS = 15
+
+MAX_HEADERS = 100
+
+
+class RequestError(ValueError):
+    """
+    Raised for a request that can't be answered, carries the HTTP status.
+    """
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def verse_json(verse):
+    """
+    JSON form of a verse.
+
+    Parameters:
+    - verse (Verse): From the engine.
+
+    Returns:
+    - dict: ref, book, name, chapter, verse, text and red_letter.
+    """
+    return {
+        "ref": verse.ref,
+        "book": verse.book,
+        "name": verse.name,
+        "chapter": verse.chapter,
+        "verse": verse.number,
+        "text": verse.text,
+        "red_letter": verse.red_letter,
+    }
+
+
+def _int(params, name, default, lowest=0, highest=None):
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    if not value.isdigit():
+        raise RequestError("%s must be a number" % name)
+    value = max(lowest, int(value))
+    return min(value, highest) if highest is not None else value
+
+
+class BibleServer:
+    """
+    Answers the HTTP endpoints from the engines of a library.
+
+    Parameters:
+    - library (Library): The translations, see bibletranslations.py; each
+      scans regexes on library.jobs processes.
+
+    Attributes:
+    - executor (ThreadPoolExecutor): The one thread searches run on.
+    """
+
+    def __init__(self, library):
+        self.library = library
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.routes = {
+            "/lookup": self.lookup,
+            "/search": self.search,
+            "/chapter": self.chapter,
+            "/complete": self.complete,
+            "/parallel": self.parallel,
+            "/translations": self.translations,
+            "/stats": self.stats,
+        }
+
+    async def engine(self, params):
+        """
+        The engine of the request's translation.
+
+        Parameters:
+        - params (dict): Query parameters, translation is optional.
+
+        Returns:
+        - BibleEngine: The engine, opened on the worker thread if it wasn't
+          already so the event loop doesn't wait for the file.
+        """
+        name = params.get("translation") or None
+        if name is not None and name not in self.library:
+            raise RequestError("no such translation: %s" % name)
+        engine = self.library.loaded_engine(name)
+        if engine is None:
+            loop = asyncio.get_running_loop()
+            engine = await loop.run_in_executor(
+                self.executor, self.library.engine, name
+            )
+        return engine
+
+    async def lookup(self, params):
+        refs = params.get("ref")
+        if not refs:
+            raise RequestError("ref is required")
+        engine = await self.engine(params)
+        verses = engine.lookup(refs)
+        return {"verses": [verse_json(verse) for verse in verses]}
+
+    async def search(self, params):
+        query = params.get("q", "").strip()
+        if not query:
+            raise RequestError("q is required")
+        mode = params.get("mode", "word")
+        offset = _int(params, "offset", 0)
+        limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        rank = params.get("rank") or None
+        if rank not in (None, "bm25"):
+            raise RequestError("unknown ranking: %s" % rank)
+
+        engine = await self.engine(params)
+        book = params.get("book") or None
+        chapter = params.get("chapter") or None
+        if chapter is not None and book is None:
+            raise RequestError("chapter needs a book")
+        if book is not None and engine.find_book(book) is None:
+            raise RequestError("no such book: %s" % book)
+        scope = engine.scope(book, chapter)
+
+        loop = asyncio.get_running_loop()
+        hits = await loop.run_in_executor(
+            self.executor, engine.search, query, scope, mode
+        )
+        total = len(hits)
+        # past the last hit the page is just empty, and ranking stops there
+        offset = min(offset, total)
+        if rank is not None and offset < total:
+            # only the pages up to this one are ranked, not every hit
+            hits = await loop.run_in_executor(
+                self.executor,
+                engine.ranked,
+                query,
+                scope,
+                mode,
+                min(offset + limit, total),
+            )
+        page = hits[offset : offset + limit]
+        body = {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "verses": [verse_json(verse) for verse in engine.verses(page)],
+        }
+        if not total:
+            body["suggestion"] = await loop.run_in_executor(
+                self.executor, engine.suggest, query, mode
+            )
+        return body
+
+    async def chapter(self, params):
+        book = params.get("book")
+        chapter = params.get("chapter")
+        if not book or not chapter:
+            raise RequestError("book and chapter are required")
+        engine = await self.engine(params)
+        verses = engine.iter_chapter(book, chapter)
+        verses = [verse_json(verse) for verse in verses]
+        if not verses:
+            raise RequestError(
+                "no such chapter: %s %s" % (book, chapter), HTTPStatus.NOT_FOUND
+            )
+        return {"book": verses[0]["name"], "chapter": int(chapter), "verses": verses}
+
+    async def complete(self, params):
+        prefix = params.get("prefix", "").strip()
+        if not prefix:
+            raise RequestError("prefix is required")
+        limit = _int(params, "limit", 10, 1, MAX_LIMIT)
+        engine = await self.engine(params)
+        # builds the speller the first time, so on the search thread
+        loop = asyncio.get_running_loop()
+        words = await loop.run_in_executor(
+            self.executor, engine.complete, prefix, limit
+        )
+        return {"words": words}
+
+    async def parallel(self, params):
+        refs = params.get("ref")
+        if not refs:
+            raise RequestError("ref is required")
+        names = params.get("translations") or None
+        if names is not None:
+            names = [name.strip() for name in names.split(",") if name.strip()]
+            for name in names:
+                if name not in self.library:
+                    raise RequestError("no such translation: %s" % name)
+        names = [name.lower() for name in names or self.library.names()]
+        # may open several translations, so off the event loop
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(
+            self.executor, self.library.parallel, refs, names
+        )
+        return {
+            "translations": names,
+            "verses": [
+                {
+                    "ref": ref,
+                    "texts": {
+                        name: None if verse is None else verse.text
+                        for name, verse in zip(names, verses)
+                    },
+                }
+                for ref, verses in rows
+            ],
+        }
+
+    async def translations(self, params):
+        return {
+            "translations": self.library.names(),
+            "default": self.library.default,
+            "loaded": self.library.stats(),
+        }
+
+    async def stats(self, params):
+        # timing spans and cache counters, see BibleEngine.stats()
+        engine = await self.engine(params)
+        stats = engine.stats()
+        stats["translations"] = self.library.stats()
+        return stats
+
+    async def respond(self, method, target):
+        """
+        Answer one request.
+
+        Parameters:
+        - method (str): HTTP method.
+        - target (str): Path and query string.
+
+        Returns:
+        - tuple[HTTPStatus, dict]: Status and JSON body.
+        """
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": "no such endpoint: %s" % url.path}
+        if method not in ("GET", "HEAD"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "only GET is supported"}
+        params = dict(parse_qsl(url.query))
+        try:
+            return HTTPStatus.OK, await handler(params)
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, re.error) as e:
+            # bad queries and regexes (QueryError, RefError, re.error, ...)
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception:
+            print("error answering %s %s" % (method, target), file=sys.stderr)
+            traceback.print_exc()
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+    async def handle(self, reader, writer):
+        """
+        Serve one connection, request after request while it's kept alive.
+        """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader), KEEP_ALIVE_SECONDS
+                    )
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except ValueError:
+                    body = {"error": "bad request"}
+                    writer.write(response(HTTPStatus.BAD_REQUEST, body, False))
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive = request
+                status, body = await self.respond(method, target)
+                writer.write(response(status, body, keep_alive, method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def read_request(reader):
+    """
+    Read a request line and headers.  Bodies aren't used by any endpoint,
+    one given with Content-Length is read and thrown away.
+
+    Parameters:
+    - reader (asyncio.StreamReader): The connection.
+
+    Returns:
+    - tuple[str, str, bool] or None: (method, target, keep alive), None if
+      the client closed the connection.
+
+    Raises:
+    - ValueError: For a malformed request.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise ValueError("bad request line")
+    method, target, version = parts
+
+    headers = {}
+    for _ in range(MAX_HEADERS):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("too many headers")
+
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise ValueError("bad content length")
+    if int(length):
+        await reader.readexactly(int(length))
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+    return method, target, keep_alive
+
+
+def response(status, body, keep_alive, head=False):
+    """
+    Encode a JSON response.
+
+    Parameters:
+    - status (HTTPStatus): Response status.
+    - body (dict): JSON body.
+    - keep_alive (bool): Leave the connection open afterwards.
+    - head (bool): Send the headers only.
+
+    Returns:
+    - bytes: The whole response.
+    """
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    headers = (
+        "HTTP/1.1 %d %s\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        "Content-Length: %d\r\n"
+        "Connection: %s\r\n"
+        "\r\n"
+        % (
+            status.value,
+            status.phrase,
+            len(payload),
+            "keep-alive" if keep_alive else "close",
+        )
+    )
+    return headers.encode("latin-1") + (b"" if head else payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON Bible search service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--source", default="biblesearch.txt")
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=DEFAULT_BUDGET // (1024 * 1024),
+        help="MB of translations to keep open",
+    )
+    parser.add_argument(
+        "--scan-jobs",
+        type=int,
+        default=1,
+        help="processes to scan regexes on (default 1, no pool)",
+    )
+    args = parser.parse_args()
+
+    library = Library(
+        find_translations(args.source), args.budget * 1024 * 1024, args.scan_jobs
+    )
+    # the default translation is loaded up front and kept, the others are
+    # opened when asked for
+    engine = library.engine()
+    library.pin(library.default)
+    print(
+        "serving %d verses (%s) on http://%s:%d"
+        % (len(engine), ", ".join(library.names()), args.host, args.port)
+    )
+    # exit normally on a plain kill too, which also stops the scan workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(BibleServer(library).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Word completion and spelling suggestions for searches
+
+KJV spellings are easy to get wrong ("beleive", "sheperd",
+"Nebuchadnezar") and a misspelt word just finds nothing.  This looks words
+up in the vocabulary of the word index instead of comparing against every
+word:
+
+    prefixes    the vocabulary sorted, so the words starting with a prefix
+                are one bisect away (a trie laid flat), most frequent first
+    typos       a bigram index over the vocabulary: an edit breaks at
+                most three letter pairs, so only words sharing nearly all
+                their pairs with the typo are candidates, and only those
+                get an edit distance, cut off as soon as it goes over the
+                limit
+
+Words of up to MAX_DISTANCE edits (1 for short words) are suggested, the
+closest first and then the most frequent.  Transposed letters count as one
+edit.  Everything is built from the index on first use, about 60 ms for a
+vocabulary the size of the KJV's, and a correction takes a few ms.
+
+Usage:
+    speller = Speller(corpus.index())
+    speller.complete("nebu")        ["nebuchadnezzar", "nebuzaradan", ...]
+    speller.correct("beleive")      ["believe", "believed", ...]
+    speller.suggest("sheperd AND flock")        "shepherd AND flock"
+"""
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from biblequery import OPERATORS
+
+# most edits a correction may be away, and for words this short or shorter
+MAX_DISTANCE = 2
+SHORT_WORD = 4
+
+# words of a query worth correcting: not an operator, a NEAR/n, a number or
+# a book:/chapter: filter
+QUERY_WORD_RE = re.compile(r"(?<![\w:/-])[^\W\d_]+(?![\w:/])")
+
+
+def bigrams(word):
+    """
+    Two letter pieces of a word, padded so the ends count too.
+
+    Parameters:
+    - word (str): A lower case word.
+
+    Returns:
+    - set[str]: e.g. "love" -> {"^l", "lo", "ov", "ve", "e$"}.
+    """
+    padded = "^" + word + "$"
+    return {padded[i : i + 2] for i in range(len(padded) - 1)}
+
+
+def distance(a, b, limit):
+    """
+    Edit distance with adjacent transpositions (optimal string alignment),
+    giving up once it must be over the limit.
+
+    Parameters:
+    - a (str), b (str): The words.
+    - limit (int): Largest distance of interest.
+
+    Returns:
+    - int: The distance, or limit + 1 if it's more than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, y in enumerate(b, start=1):
+            cost = x != y
+            best = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and x == b[j - 2] and a[i - 2] == y:
+                best = min(best, before[j - 2] + 1)
+            current[j] = best
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class Speller:
+    """
+    Completion and correction over the words of a word index.
+
+    Parameters:
+    - index (WordIndex): The index whose vocabulary to use.
+
+    Attributes:
+    - words (list[str]): The vocabulary, sorted.
+    - counts (array): Verses each word is in, lined up with words.
+    - sizes (array): Distinct bigrams in each word.
+    - grams (dict[str, array]): Bigram -> numbers of the words with it.
+    """
+
+    def __init__(self, index):
+        self.words = sorted(index.postings)
+        self.numbers = {word: number for number, word in enumerate(self.words)}
+        self.counts = array("I", (len(index.postings[word]) for word in self.words))
+        self.sizes = array("B")
+        grams = {}
+        for number, word in enumerate(self.words):
+            pieces = bigrams(word)
+            self.sizes.append(min(len(pieces), 255))
+            for gram in pieces:
+                grams.setdefault(gram, []).append(number)
+        self.grams = {gram: array("I", numbers) for gram, numbers in grams.items()}
+
+    def __contains__(self, word):
+        return word in self.numbers
+
+    def complete(self, prefix, limit=10):
+        """
+        Words starting with a prefix.
+
+        Parameters:
+        - prefix (str): What has been typed so far, any case.
+        - limit (int): Most words to return.
+
+        Returns:
+        - list[str]: Most frequent first, then alphabetical.
+        """
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        first = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + "\uffff", first)
+        best = heapq.nsmallest(
+            limit, range(first, end), key=lambda number: -self.counts[number]
+        )
+        return [self.words[number] for number in best]
+
+    def correct(self, word, limit=5):
+        """
+        Words close to a possibly misspelt one.
+
+        Parameters:
+        - word (str): The word, any case.
+        - limit (int): Most words to return.
+
+        Returns:
+        - list[str]: Closest first, then most frequent.  Empty if nothing
+          is close enough; a word that is in the vocabulary isn't included.
+        """
+        word = word.lower()
+        most = 1 if len(word) <= SHORT_WORD else MAX_DISTANCE
+        grams = bigrams(word)
+
+        # an edit breaks at most two bigrams, and a transposition ("lvoe")
+        # three, either way round, so a word within `most` edits shares at
+        # least this many with the typo, and all but 3 * most of its own
+        needed = max(1, len(grams) - 3 * most)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+
+        found = []
+        sizes = self.sizes
+        for number, count in shared.items():
+            if count < needed or count < sizes[number] - 3 * most:
+                continue
+            candidate = self.words[number]
+            if abs(len(candidate) - len(word)) > most:
+                continue
+            edits = distance(word, candidate, most)
+            if 0 < edits <= most:
+                found.append((edits, -self.counts[number], candidate))
+        return [candidate for _, _, candidate in heapq.nsmallest(limit, found)]
+
+    def suggest(self, text):
+        """
+        A search with its unknown words replaced by their best correction.
+
+        Parameters:
+        - text (str): Search text as typed; operators, NEAR/n and book:/
+          chapter: filters are left alone.
+
+        Returns:
+        - str or None: The corrected search, None if every word is known or
+          nothing close was found for the unknown ones.
+        """
+        changed = False
+
+        def replace(match):
+            nonlocal changed
+            word = match.group()
+            if word in OPERATORS or word.lower() in self.numbers:
+                return word
+            corrections = self.correct(word, 1)
+            if not corrections:
+                return word
+            changed = True
+            return corrections[0].capitalize() if word[0].isupper() else corrections[0]
+
+        suggestion = QUERY_WORD_RE.sub(replace, text)
+        return suggestion if changed else None
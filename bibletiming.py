@@ -0,0 +1,250 @@
+"""
+Timing spans and profiling hooks
+
+The engine and both front ends time their hot paths with named spans so a
+slow search can be pinned on one step:
+
+    load        reading or compiling the corpus
+    index       opening the word index
+    search      a whole search, cache lookups included
+    parse       parsing a query
+    compile     compiling a regex
+    lookup      answering from the index (or scanning the texts)
+    filter      cutting results down to a book or chapter
+    rank        scoring results and keeping the best (BM25)
+    spell       completing and correcting search words
+    render      formatting verses for the screen
+    output      writing them to the terminal
+
+Spans add up per name (count, total, max, last), cost a couple of
+microseconds and are always on.  For more detail, profiled() runs a block
+under cProfile and traced_memory() under tracemalloc, each writing a report
+to a file.
+
+Usage:
+    timings = Timings()
+    with timings.span("lookup"):
+        ...
+    print(timings.report())
+"""
+import cProfile
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# the spans report() lists first, in this order; any others follow
+SPAN_ORDER = (
+    "load",
+    "index",
+    "search",
+    "parse",
+    "compile",
+    "lookup",
+    "filter",
+    "rank",
+    "spell",
+    "render",
+    "output",
+)
+
+
+class Timings:
+    """
+    Running totals of named timing spans.  Safe to use from several threads
+    (the Tk app searches on a worker thread).
+
+    Parameters:
+    - enabled (bool): False makes span() a no-op.
+
+    Attributes:
+    - spans (dict[str, list]): name -> [count, total, max, last] in seconds.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        """
+        Record one timing.
+
+        Parameters:
+        - name (str): Span name.
+        - seconds (float): How long it took.
+        """
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                if seconds > span[2]:
+                    span[2] = seconds
+                span[3] = seconds
+
+    def span(self, name):
+        """
+        Context manager that times its block as one span.
+
+        Parameters:
+        - name (str): Span name.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return _Span(self, name)
+
+    def last(self, name):
+        """
+        Returns:
+        - float or None: Seconds the latest span of that name took.
+        """
+        span = self.spans.get(name)
+        return span[3] if span else None
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+
+    def snapshot(self):
+        """
+        Returns:
+        - dict: name -> {"count", "total_ms", "max_ms", "last_ms"}.
+        """
+        with self._lock:
+            items = [(name, list(span)) for name, span in self.spans.items()]
+        return {
+            name: {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "max_ms": round(most * 1000, 3),
+                "last_ms": round(last * 1000, 3),
+            }
+            for name, (count, total, most, last) in _ordered(items)
+        }
+
+    def report(self):
+        """
+        Returns:
+        - str: A table of every span, in pipeline order.
+        """
+        lines = [
+            "%-10s %7s %11s %9s %9s %9s"
+            % ("span", "count", "total ms", "mean ms", "max ms", "last ms")
+        ]
+        for name, span in self.snapshot().items():
+            lines.append(
+                "%-10s %7d %11.2f %9.3f %9.3f %9.3f"
+                % (
+                    name,
+                    span["count"],
+                    span["total_ms"],
+                    span["total_ms"] / span["count"],
+                    span["max_ms"],
+                    span["last_ms"],
+                )
+            )
+        return "\n".join(lines)
+
+    def mark(self):
+        """
+        Returns:
+        - dict: name -> count so far, for summary(since=...).
+        """
+        with self._lock:
+            return {name: span[0] for name, span in self.spans.items()}
+
+    def summary(self, names=SPAN_ORDER, since=None):
+        """
+        One line of the latest timings, e.g. "search 1.2 ms, render 3.4 ms".
+
+        Parameters:
+        - names (list[str]): Spans to include, missing ones are skipped.
+        - since (dict, optional): A mark(), leaves out spans that haven't
+          run since, so one command's line doesn't show the one before.
+
+        Returns:
+        - str: The summary.
+        """
+        parts = []
+        for name in names:
+            span = self.spans.get(name)
+            if span is None or (since is not None and since.get(name) == span[0]):
+                continue
+            parts.append("%s %.1f ms" % (name, span[3] * 1000))
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _ordered(items):
+    rank = {name: k for k, name in enumerate(SPAN_ORDER)}
+    return sorted(items, key=lambda item: (rank.get(item[0], len(rank)), item[0]))
+
+
+# for code that can be called without any timings to record into
+NO_TIMINGS = Timings(enabled=False)
+
+
+@contextmanager
+def profiled(path, sort="cumulative", limit=40):
+    """
+    Run a block under cProfile and write the stats.
+
+    Parameters:
+    - path (str): Where to write.  A .prof file gets the raw stats (for
+      pstats or snakeviz), anything else a text report.
+    - sort (str): pstats sort key for the text report.
+    - limit (int): Functions in the text report.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if path.endswith(".prof"):
+            profile.dump_stats(path)
+        else:
+            with open(path, "w") as f:
+                pstats.Stats(profile, stream=f).sort_stats(sort).print_stats(limit)
+
+
+@contextmanager
+def traced_memory(path, limit=40):
+    """
+    Run a block under tracemalloc and write the biggest allocations still
+    held at the end, and the peak.
+
+    Parameters:
+    - path (str): Where to write the text report.
+    - limit (int): Allocation sites in the report.
+    """
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(path, "w") as f:
+            f.write("current %d bytes, peak %d bytes\n\n" % (current, peak))
+            for stat in snapshot.statistics("lineno")[:limit]:
+                f.write("%s\n" % stat)
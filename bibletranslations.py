@@ -0,0 +1,301 @@
+"""
+Several translations in one process
+
+Every translation is a text file in the format of biblesearch.txt, kept
+next to it and named after it:
+
+    biblesearch.txt         KJV
+    biblesearch.asv.txt     ASV
+    biblesearch.web.txt     WEB
+
+and each compiles to its own .bin, verses and word index (see
+biblecorpus.py).  A Library opens the engine of a translation the first
+time it's asked for, so translations nobody reads cost nothing, and keeps
+the engines it has open within a memory budget: opening one that takes it
+over the budget closes the least recently used others, never one that is
+pinned (the translation a program is reading, say).  An engine's size is
+counted as its mapped file plus its cached search results, see
+footprint().  With jobs, every engine it opens scans regexes on the same
+pool of worker processes (see bibleparallel.py), so there are that many
+however many translations are open.
+
+parallel() looks the same verses up in several translations at once.  When
+two translations number their verses the same way (the usual case) a verse
+is at the same ordinal in both and that is checked first; otherwise it is
+found by book, chapter and verse, and is None if the other translation
+doesn't have it.
+
+Usage:
+    library = Library(find_translations("biblesearch.txt"), jobs=4)
+    library.names()                         ["kjv", "asv", "web"]
+    engine = library.engine("asv")
+    library.pin("asv")                      never closed to save memory
+    for ref, verses in library.parallel("Joh 3:16-18", ["kjv", "web"]):
+        ...
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from bibleengine import BibleEngine
+from bibleparallel import ScanPool
+
+# what the translation in biblesearch.txt itself is called
+DEFAULT_NAME = "kjv"
+
+# bytes of open engines to keep, a KJV sized one is about 17 MB
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+
+def find_translations(source="biblesearch.txt", name=DEFAULT_NAME):
+    """
+    The translations next to a text file: the file itself, then any
+    <stem>.<name>.txt beside it, or just its compiled .bin if the text
+    isn't there.
+
+    Parameters:
+    - source (str): Path to the main text file.
+    - name (str): Name of the translation in that file.
+
+    Returns:
+    - dict[str, str]: Translation name -> text file path, the main one
+      first and the rest by name.
+    """
+    directory, filename = os.path.split(source)
+    stem, extension = os.path.splitext(filename)
+    pattern = re.compile(
+        re.escape(stem) + r"\.(\w+)(%s|\.bin)" % re.escape(extension), re.IGNORECASE
+    )
+    found = {name.lower(): source}
+    try:
+        entries = sorted(os.listdir(directory or "."))
+    except OSError:
+        entries = []
+    for entry in entries:
+        match = pattern.fullmatch(entry)
+        if match and match.group(1).lower() not in found:
+            # load_corpus() falls back to the .bin when there's no text
+            path = os.path.join(directory, stem + "." + match.group(1) + extension)
+            found[match.group(1).lower()] = path
+    return found
+
+
+def footprint(engine):
+    """
+    Bytes an open engine counts for against a Library's budget.
+
+    Parameters:
+    - engine (BibleEngine): The engine.
+
+    Returns:
+    - int: Size of its compiled corpus plus its cached search results.
+    """
+    return len(engine.corpus.buffer) + engine.query_cache.nbytes
+
+
+def align(verse, engine):
+    """
+    The same verse in another translation.
+
+    Parameters:
+    - verse (Verse): A verse of one translation.
+    - engine (BibleEngine): Another translation.
+
+    Returns:
+    - Verse or None: The verse with the same book, chapter and verse number,
+      None if the other translation doesn't have it.
+    """
+    corpus = engine.corpus
+    ordinal = verse.ordinal
+    book, chapter, number = verse.book, verse.chapter, verse.number
+    if (
+        ordinal < len(corpus)
+        and corpus.verse[ordinal] == number
+        and corpus.chapter[ordinal] == chapter
+        and corpus.books[corpus.book[ordinal]] == book
+    ):
+        return engine.verse(ordinal)
+    book = corpus.find_book(book)
+    ordinal = None if book is None else corpus.verse_ordinal(book, chapter, number)
+    return None if ordinal is None else engine.verse(ordinal)
+
+
+class Library:
+    """
+    The engines of several translations, opened on first use and closed
+    again to stay within a memory budget.  Safe to use from several
+    threads; each engine still has to be searched from one at a time.
+
+    Parameters:
+    - translations (dict[str, str]): Name -> text file path, see
+      find_translations().  The first one is the default.
+    - budget (int): Bytes of open engines to keep, see footprint().  The
+      engine just asked for and pinned ones are always kept, even over the
+      budget.
+    - jobs (int): Processes the engines share to scan regexes on, see
+      BibleEngine.parallel_scan(); 1, the default, scans in this one.
+
+    Attributes:
+    - pool (ScanPool or None): The engines' worker processes.
+    - opened (int): Engines opened so far.
+    - closed (int): Engines closed to stay within the budget.
+    """
+
+    def __init__(self, translations, budget=DEFAULT_BUDGET, jobs=1):
+        if not translations:
+            raise ValueError("no translations")
+        self.translations = {name.lower(): path for name, path in translations.items()}
+        self.default = next(iter(self.translations))
+        self.budget = budget
+        self.jobs = jobs
+        self.pool = ScanPool(jobs) if jobs > 1 else None
+        self.opened = 0
+        self.closed = 0
+        self._engines = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name.lower() in self.translations
+
+    def names(self):
+        """
+        Returns:
+        - list[str]: Every translation, the default first.
+        """
+        return list(self.translations)
+
+    def loaded(self):
+        """
+        Returns:
+        - list[str]: Translations open now, least recently used first.
+        """
+        with self._lock:
+            return list(self._engines)
+
+    def loaded_engine(self, name=None):
+        """
+        The engine of a translation if it's open, without opening it.
+
+        Parameters:
+        - name (str, optional): Translation name, the default if not given.
+
+        Returns:
+        - BibleEngine or None: The engine, None if it isn't open.
+        """
+        name = (name or self.default).lower()
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is not None:
+                self._engines.move_to_end(name)
+            return engine
+
+    def engine(self, name=None):
+        """
+        The engine of a translation, opened (and compiled, the first time
+        ever) if it isn't already.
+
+        Parameters:
+        - name (str, optional): Translation name, any case; the default one
+          if not given.
+
+        Returns:
+        - BibleEngine: The engine.
+
+        Raises:
+        - ValueError: For a translation the library doesn't have.
+        """
+        name = (name or self.default).lower()
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is not None:
+                self._engines.move_to_end(name)
+                return engine
+            source = self.translations.get(name)
+            if source is None:
+                raise ValueError("no such translation: %s" % name)
+            engine = BibleEngine(source)
+            engine.parallel_scan(self.jobs, self.pool)
+            self.opened += 1
+            self._engines[name] = engine
+            self._shrink()
+            return engine
+
+    def pin(self, name):
+        """
+        Keep a translation's engine open whatever the budget, e.g. the one
+        a program is reading.  It's opened the next time it's asked for if
+        it isn't already.
+
+        Parameters:
+        - name (str): Translation name, any case.
+        """
+        with self._lock:
+            self._pinned.add(name.lower())
+
+    def unpin(self, name):
+        """
+        Let a pinned translation be closed again to stay within the budget.
+
+        Parameters:
+        - name (str): Translation name, any case.
+        """
+        with self._lock:
+            self._pinned.discard(name.lower())
+
+    def _shrink(self):
+        # close the least recently used engines, never the newest or a
+        # pinned one, until the rest fit in the budget; the shared worker
+        # processes keep running for the ones left open
+        total = sum(footprint(engine) for engine in self._engines.values())
+        newest = next(reversed(self._engines))
+        for name in list(self._engines):
+            if total <= self.budget:
+                break
+            if name == newest or name in self._pinned:
+                continue
+            engine = self._engines.pop(name)
+            engine.parallel_scan(1)
+            total -= footprint(engine)
+            self.closed += 1
+
+    def parallel(self, refs, names=None):
+        """
+        The same verses in several translations, side by side.
+
+        Parameters:
+        - refs (str): Reference list, e.g. "Joh 3:16-18; Ro 8", read by
+          the first translation.
+        - names (list[str], optional): Translations, every one if not given.
+
+        Returns:
+        - list[tuple[str, list]]: (reference, [Verse or None per
+          translation]) per verse of the first translation.
+
+        Raises:
+        - ValueError: For an unknown translation.
+        - RefError: For a reference the first translation can't read.
+        """
+        engines = [self.engine(name) for name in names or self.names()]
+        rows = []
+        for verse in engines[0].lookup(refs):
+            others = [align(verse, engine) for engine in engines[1:]]
+            rows.append((verse.ref, [verse] + others))
+        return rows
+
+    def stats(self):
+        """
+        Returns:
+        - dict: budget, open engines and their sizes, opened and closed
+          counts.
+        """
+        with self._lock:
+            sizes = {name: footprint(engine) for name, engine in self._engines.items()}
+        return {
+            "budget": self.budget,
+            "loaded": sizes,
+            "bytes": sum(sizes.values()),
+            "opened": self.opened,
+            "closed": self.closed,
+        }
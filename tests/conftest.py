@@ -0,0 +1,39 @@
+"""
+A few KJV verses compiled into a fresh corpus for each test, so the tests
+don't need biblesearch.txt.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bibleengine import BibleEngine  # noqa: E402
+
+VERSES = """\
+Ge 1:1 In the beginning God created the heaven and the earth.
+Ge 1:2 And the earth was without form, and void; and darkness [was] upon the face of the deep. And the Spirit of God moved upon the face of the waters.
+Ge 1:3 And God said, Let there be light: and there was light.
+Ps 23:1 The LORD [is] my shepherd; I shall not want.
+Ps 23:2 He maketh me to lie down in green pastures: he leadeth me beside the still waters.
+Ps 23:3 He restoreth my soul: he leadeth me in the paths of righteousness for his name's sake.
+Mt 22:37 Jesus said unto him, Thou shalt love the Lord thy God with all thy heart, and with all thy soul, and with all thy mind.
+Mt 22:38 This is the first and great commandment.
+Mt 22:39 And the second [is] like unto it, Thou shalt love thy neighbour as thyself.
+Joh 3:16 For God so loved the world, that he gave his only begotten Son, that whosoever believeth in him should not perish, but have everlasting life.
+Joh 3:17 For God sent not his Son into the world to condemn the world; but that the world through him might be saved.
+1Jo 4:8 He that loveth not knoweth not God; for God is love.
+"""
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "biblesearch.txt"
+    path.write_text(VERSES, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def engine(source):
+    return BibleEngine(source)
@@ -0,0 +1,36 @@
+import io
+import json
+
+import biblecorpus
+from biblebatch import run_batch, run_command
+
+OPTIONS = {"format": "jsonl", "mode": "regex", "refs_only": True}
+COMMANDS = [(1, "S love"), (2, "Ps 23:1-2"), (3, "S shepherd")]
+
+
+def results(source, jobs):
+    out = io.StringIO()
+    failed = run_batch(list(COMMANDS), source, OPTIONS, jobs=jobs, out=out)
+    return failed, [json.loads(line)["verses"] for line in out.getvalue().splitlines()]
+
+
+def test_workers_give_the_same_results(source):
+    assert results(source, 2) == results(source, 1)
+
+
+def test_corpus_in_memory_runs_without_workers(source, monkeypatch):
+    def unwritable(path, data):
+        raise OSError("read only")
+
+    monkeypatch.setattr(biblecorpus, "write_cache", unwritable)
+    failed, found = results(source, 2)
+    assert failed == 0
+    assert found[1] == ["Ps 23:1", "Ps 23:2"]
+
+
+def test_s_followed_by_a_number_is_a_search(engine):
+    assert list(run_command(engine, "S 3")) == list(engine.search("3", mode="regex"))
+    assert list(run_command(engine, "s 23 the")) == list(
+        engine.search("23 the", mode="regex")
+    )
+    assert list(run_command(engine, "Ps 23:1")) == [3]
@@ -0,0 +1,14 @@
+from biblecache import normalize_query
+
+
+def test_spaces_are_kept_for_word_and_regex_searches(engine):
+    for mode in ("word", "regex"):
+        assert len(engine.search("shalt  love", mode=mode)) == 0
+        assert len(engine.search("shalt love", mode=mode)) == 2
+        assert len(engine.search("shalt  love", mode=mode)) == 0
+
+
+def test_queries_ignore_spaces():
+    assert normalize_query("love  AND   god") == normalize_query("love AND god")
+    assert normalize_query("Love God") == "love god"
+    assert normalize_query("Love  God") == "Love  God"
@@ -0,0 +1,34 @@
+import os
+
+from bibleengine import BibleEngine
+
+
+def edit(source, old, new):
+    with open(source, encoding="utf-8") as f:
+        text = f.read()
+    with open(source, "w", encoding="utf-8") as f:
+        f.write(text.replace(old, new))
+    # make sure the change shows even on a coarse clock
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_editing_the_text_drops_cached_results(engine, source):
+    assert len(engine.search("shepherd")) == 1
+    edit(source, "shepherd", "keeper")
+    assert len(engine.search("shepherd")) == 0
+    assert len(engine.search("keeper")) == 1
+    assert engine.query_cache.version == engine.corpus.digest
+
+
+def test_unchanged_text_keeps_the_corpus(engine, source):
+    corpus = engine.corpus
+    os.utime(source, ns=(1, 1))
+    assert not engine.refresh()
+    assert engine.corpus is corpus
+
+
+def test_attached_engine_is_never_reloaded(engine):
+    attached = BibleEngine.attach(engine.corpus.path)
+    assert attached.source is None
+    assert not attached.refresh()
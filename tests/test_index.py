@@ -0,0 +1,20 @@
+import re
+
+import pytest
+
+
+def brute_force(engine, query, mode):
+    if mode == "regex":
+        pattern = re.compile(query, re.IGNORECASE)
+    else:
+        pattern = re.compile(
+            r"(?:\W|^)" + re.escape(query.lower()) + r"(?:\W|$)", re.IGNORECASE
+        )
+    text = engine.corpus.text
+    return [o for o in range(len(engine)) if pattern.search(text(o))]
+
+
+@pytest.mark.parametrize("query", ["love", " love", "love ", " shalt love ", "God "])
+@pytest.mark.parametrize("mode", ["regex", "word"])
+def test_spaces_around_words_count(engine, query, mode):
+    assert list(engine.search(query, mode=mode)) == brute_force(engine, query, mode)
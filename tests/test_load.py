@@ -0,0 +1,13 @@
+import asyncio
+import socket
+
+from bibleload import run
+
+
+def test_refused_connections_count_as_errors():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    latencies, errors, _ = asyncio.run(run("127.0.0.1", port, 2, 0.3, ["/stats"]))
+    assert latencies == []
+    assert errors
@@ -0,0 +1,21 @@
+from biblequery import filter_ranges
+
+
+def test_reversed_chapter_range_is_the_same_range(engine):
+    corpus = engine.corpus
+    assert filter_ranges(corpus, ["Ge-Ps"], ["23-1"]) == filter_ranges(
+        corpus, ["Ge-Ps"], ["1-23"]
+    )
+    assert engine.count("chapter:23-22") == engine.count("chapter:22-23") == 6
+
+
+def test_reversed_book_range(engine):
+    reversed_books = engine.search("God book:Joh-Ge")
+    assert list(reversed_books) == list(engine.search("God book:Ge-Joh"))
+
+
+def test_huge_chapter_range_is_clamped_to_the_corpus(engine):
+    corpus = engine.corpus
+    assert filter_ranges(corpus, [], ["1-999999999"]) == [(0, len(corpus))]
+    assert engine.count("love chapter:1-999999999") == engine.count("love")
+    assert engine.count("chapter:999999998-999999999") == 0
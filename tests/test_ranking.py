@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+import bibleranking
+from bibleranking import BM25
+
+
+def expected_scores(ranker, terms, hits):
+    # BM25 a verse and a term at a time
+    index, norms = ranker.index, ranker.norms()
+    scores = {}
+    for ordinal in hits:
+        score = 0.0
+        for term in set(terms):
+            postings = list(index.postings.get(term, ()))
+            if ordinal in postings:
+                tf = index.frequencies[term][postings.index(ordinal)]
+                score += ranker.idf(term) * (ranker.k1 + 1) * tf / (tf + norms[ordinal])
+        scores[ordinal] = score
+    return scores
+
+
+@pytest.mark.parametrize("ratio", [0, 10**9])
+def test_top_is_the_best_scores_in_file_order(engine, monkeypatch, ratio):
+    # 0 bisects every term's postings for each hit, 10**9 walks them
+    monkeypatch.setattr(bibleranking, "BISECT_RATIO", ratio)
+    ranker = BM25(engine.corpus.index())
+    terms = ["god", "love", "shepherd", "god"]
+    hits = engine.search("god OR love OR shepherd")
+    expected = expected_scores(ranker, terms, hits)
+    scores = ranker.scores(terms, hits)
+    assert sorted(scores) == sorted(expected)
+    assert all(math.isclose(scores[o], expected[o]) for o in expected)
+    best = sorted(hits, key=lambda ordinal: (-expected[ordinal], ordinal))
+    assert list(ranker.top(terms, hits, 4)) == best[:4]
+    assert list(ranker.top(terms, hits, 100)) == best
@@ -0,0 +1,29 @@
+import pytest
+
+from bibleengine import BibleEngine
+from biblerefs import RefError, parse_refs
+
+PSALMS = """\
+Ps 1:1 Blessed [is] the man that walketh not in the counsel of the ungodly.
+Ps 2:1 Why do the heathen rage, and the people imagine a vain thing?
+Ps 3:1 LORD, how are they increased that trouble me!
+"""
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "biblesearch.txt"
+    path.write_text(PSALMS, encoding="utf-8")
+    return BibleEngine(str(path)).corpus
+
+
+def test_chapter_range(corpus):
+    assert parse_refs(corpus, "Ps 1-3") == [(0, 3)]
+    assert parse_refs(corpus, "Ps 2-2") == [(1, 2)]
+
+
+@pytest.mark.parametrize("ref", ["Ps 3-1", "Ps 3:1-1:1"])
+def test_backwards_ranges_are_refused(corpus, ref):
+    # chapter runs the same as verse runs
+    with pytest.raises(RefError, match="backwards"):
+        parse_refs(corpus, ref)
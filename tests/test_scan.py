@@ -0,0 +1,33 @@
+import re
+
+
+def test_empty_search_matches_every_verse(engine):
+    assert list(engine.search("", mode="regex")) == list(range(len(engine)))
+
+
+def test_empty_find_in_a_range(engine):
+    scanner = engine.corpus.scanner()
+    assert list(scanner.find("", 2, 5)) == [2, 3, 4]
+
+
+def test_find_stops_at_end(engine):
+    scanner = engine.corpus.scanner()
+    every = [o for o in range(len(engine)) if "the" in engine.corpus.text(o).lower()]
+    assert list(scanner.find("the", 0, 4)) == [o for o in every if o < 4]
+
+
+def test_scan_matches_verse_by_verse(engine):
+    for source in (r"l.ve", r"\w+eth\b", r"world.*world", "god;"):
+        pattern = re.compile(source, re.IGNORECASE)
+        expected = [
+            o for o in range(len(engine)) if pattern.search(engine.corpus.text(o))
+        ]
+        assert list(engine.search(source, mode="regex")) == expected
+
+
+def test_case_sensitive_groups_are_left_to_the_verse_scan(engine):
+    # the scan buffer is lower cased, so it can't honour (?-i:...)
+    pattern = re.compile("(?-i:god) created", re.IGNORECASE)
+    assert engine.corpus.scanner().search(pattern) is None
+    assert list(engine.search("(?-i:god) created", mode="regex")) == []
+    assert list(engine.search("(?-i:God) created", mode="regex")) == [0]
@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.mark.parametrize(
+    "typo, word",
+    [("lvoe", "love"), ("olve", "love"), ("lrod", "lord"), ("lodr", "lord")],
+)
+def test_transposed_short_words(engine, typo, word):
+    assert engine.speller().correct(typo)[:1] == [word]
+
+
+def test_transposed_long_word(engine):
+    assert engine.speller().correct("sheprehd")[:1] == ["shepherd"]
+
+
+def test_suggest_corrects_a_transposition(engine):
+    assert engine.suggest("shalt lvoe") == "shalt love"
@@ -0,0 +1,63 @@
+import shutil
+
+import pytest
+
+from bibleparallel import ParallelScanner
+from bibletranslations import Library, find_translations
+
+
+@pytest.fixture
+def library(source):
+    for name in ("asv", "web"):
+        shutil.copy(source, source.replace(".txt", ".%s.txt" % name))
+    return Library(find_translations(source), budget=1, jobs=2)
+
+
+def test_budget_closes_the_least_recently_used(library):
+    library.engine("kjv")
+    library.engine("asv")
+    assert library.loaded() == ["asv"]
+
+
+def test_pinned_engine_stays_open(library):
+    kjv = library.engine("kjv")
+    library.pin("kjv")
+    library.engine("asv")
+    library.engine("web")
+    assert library.loaded() == ["kjv", "web"]
+    assert library.loaded_engine("kjv") is kjv
+
+    library.unpin("kjv")
+    library.engine("asv")
+    assert library.loaded() == ["asv"]
+
+
+def test_engines_keep_the_jobs_setting(library):
+    library.pin("kjv")
+    kjv = library.engine("kjv")
+    library.engine("asv")
+    library.engine("web")
+    for engine in (kjv, library.engine("asv")):
+        assert isinstance(engine.index.scanner, ParallelScanner)
+        assert engine.index.scanner.jobs == 2
+
+
+def test_engines_share_one_pool(library):
+    # asv says "Lord" where kjv says "God", so a worker that scanned the
+    # wrong corpus would find other verses
+    asv = library.translations["asv"]
+    with open(asv, encoding="utf-8") as f:
+        text = f.read()
+    with open(asv, "w", encoding="utf-8") as f:
+        f.write(text.replace("God", "Lord"))
+    library.pin("kjv")
+    library.pin("asv")
+    kjv, asv = library.engine("kjv"), library.engine("asv")
+    assert kjv.index.scanner.pool is library.pool
+    assert asv.index.scanner.pool is library.pool
+    try:
+        assert list(kjv.search(r"g\w?d\b", mode="regex")) == [0, 1, 2, 6, 9, 10, 11]
+        assert list(asv.search(r"g\w?d\b", mode="regex")) == []
+        assert list(asv.search(r"l\w?rd\b", mode="regex")) == [0, 1, 2, 3, 6, 9, 10, 11]
+    finally:
+        library.pool.close()
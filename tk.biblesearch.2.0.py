@@ -8,14 +8,23 @@ verses from various books and chapters of the Bible. The application uses the
 - Highlighting specific verses.
 - Displaying a popup window to view verses from a selected chapter.
 
-The verse data for each book and chapter is defined in the `books` dictionary.
+The verse data, book names and searches all come from `bibleengine`, the
+same engine biblesearch.py uses.  "Best first" ranks search results by
+relevance and shows only the best of them.  Typing in the search box lists
+words of the text that start with what's typed (Down to pick one), and a
+search that finds nothing suggests a spelling that would.  The status bar
+shows how long the last search took, step by step; click it for the
+running totals.
 
 Dependencies:
 - tkinter
 - re (for potential regex operations)
+- bibleengine (corpus, word index and searches shared with biblesearch.py)
 
 Usage:
 Run this script directly to launch the Bible Verse Viewer application.
+`--cprofile FILE` and `--tracemalloc FILE` write a profile of the session
+when the window is closed (see bibletiming.py).
 
 Author: James Fraze (guiding AI)
 Version: 1.0
@@ -23,77 +32,34 @@ Date: 2023-08-27
 """
 import tkinter as tk
 from tkinter import ttk, messagebox
+import argparse
+import queue
 import re
+import threading
+import time
+from contextlib import ExitStack
 
-books = {
-    "All": [0, 0, "All Books"],
-    "Ge": [1, 50, "Genesis"],
-    "Ex": [2, 40, "Exodus"],
-    "Le": [3, 27, "Leviticus"],
-    "Nu": [4, 36, "Numbers"],
-    "De": [5, 34, "Deuteronomy"],
-    "Jos": [6, 24, "Joshua"],
-    "Jg": [7, 21, "Judges"],
-    "Ru": [8, 4, "Ruth"],
-    "1Sa": [9, 31, "1 Samuel"],
-    "2Sa": [10, 24, "2 Samuel"],
-    "1Ki": [11, 22, "1 Kings"],
-    "2Ki": [12, 25, "2 Kings"],
-    "1Ch": [13, 29, "1 Chronicles"],
-    "2Ch": [14, 36, "2 Chronicles"],
-    "Ezr": [15, 10, "Ezra"],
-    "Ne": [16, 13, "Nehemiah"],
-    "Es": [17, 10, "Esther"],
-    "Job": [18, 42, "Job"],
-    "Ps": [19, 150, "Psalms"],
-    "Pr": [20, 31, "Proverbs"],
-    "Ec": [21, 12, "Ecclesiastes"],
-    "Song": [22, 8, "Song of Solomon"],
-    "Isa": [23, 66, "Isaiah"],
-    "Jer": [24, 52, "Jeremiah"],
-    "La": [25, 5, "Lamentations"],
-    "Eze": [26, 48, "Ezekiel"],
-    "Da": [27, 12, "Daniel"],
-    "Ho": [28, 14, "Hosea"],
-    "Joe": [29, 3, "Joel"],
-    "Am": [30, 9, "Amos"],
-    "Ob": [31, 1, "Obadiah"],
-    "Jon": [32, 4, "Jonah"],
-    "Mic": [33, 7, "Micah"],
-    "Na": [34, 3, "Nahum"],
-    "Hab": [35, 3, "Habakkuk"],
-    "Zep": [36, 3, "Zephaniah"],
-    "Hag": [37, 2, "Haggai"],
-    "Zec": [38, 14, "Zechariah"],
-    "Mal": [39, 4, "Malachi"],
-    "Mt": [40, 28, "Matthew"],
-    "Mr": [41, 16, "Mark"],
-    "Lu": [42, 24, "Luke"],
-    "Joh": [43, 21, "John"],
-    "Ac": [44, 28, "Acts"],
-    "Ro": [45, 16, "Romans"],
-    "1Co": [46, 16, "1 Corinthians"],
-    "2Co": [47, 13, "2 Corinthians"],
-    "Ga": [48, 6, "Galatians"],
-    "Eph": [49, 6, "Ephesians"],
-    "Php": [50, 4, "Philippians"],
-    "Col": [51, 4, "Colossians"],
-    "1Th": [52, 5, "1 Thessalonians"],
-    "2Th": [53, 3, "2 Thessalonians"],
-    "1Ti": [54, 6, "1 Timothy"],
-    "2Ti": [55, 4, "2 Timothy"],
-    "Tit": [56, 3, "Titus"],
-    "Phm": [57, 1, "Philemon"],
-    "Heb": [58, 13, "Hebrews"],
-    "Jas": [59, 5, "James"],
-    "1Pe": [60, 5, "1 Peter"],
-    "2Pe": [61, 3, "2 Peter"],
-    "1Jo": [62, 5, "1 John"],
-    "2Jo": [63, 1, "2 John"],
-    "3Jo": [64, 1, "3 John"],
-    "Jude": [65, 1, "Jude"],
-    "Re": [66, 22, "Revelation"],
-}
+from bibleengine import BibleEngine
+from bibletiming import profiled, traced_memory
+
+# Search results are shown a page at a time so big result sets ("the",
+# "lord") don't freeze the window: the first page right away, the rest in
+# chunks from after() callbacks.
+RESULTS_FIRST_PAGE = 100
+RESULTS_CHUNK = 250
+RESULTS_CHUNK_DELAY_MS = 1
+
+# "Best first" shows this many verses, ranked by BM25 (see bibleranking.py)
+RANKED_RESULTS = 100
+
+# Autocomplete lists this many words once this much of a word is typed
+COMPLETIONS = 8
+COMPLETE_FROM = 2
+
+# Searches run on a worker thread.  Typing waits this long for a pause
+# before searching, and results are picked up by polling from the Tk thread.
+SEARCH_DEBOUNCE_MS = 300
+RESULT_POLL_MS = 20
 
 # python -m vulture tk.biblesearch.1.0.py
 # python -m site --user-base
@@ -110,10 +76,12 @@ class BibleSearchApp(tk.Tk):
     search for specific terms, and navigate to specific books and chapters.
 
     Attributes:
-    - data (list[str]): Loaded Bible verses.
+    - engine (BibleEngine): Verses, book names and searches.
     - selected_book_var (tk.StringVar): Holds the currently selected book's name.
     - selected_chapter_var (tk.StringVar): Holds the currently selected chapter.
     - search_var (tk.StringVar): Holds the text the user wishes to search for.
+    - ranked_var (tk.BooleanVar): Show the best results first, and only those.
+    - status_var (tk.StringVar): Timings of the last search, see show_status().
     - ... (additional GUI elements)
     """
 
@@ -139,24 +107,62 @@ class BibleSearchApp(tk.Tk):
         self.style.configure("TLabel", font=font_tuple)
         self.style.configure("TEntry", font=font_tuple)
         self.style.configure("TCombobox", font=font_tuple)
-        self.style.configure("Treeview", font=font_tuple)
+        self.style.configure("Treeview", font=font_tuple, rowheight=25)
         self.style.configure("Treeview.Heading", font=font_tuple)
 
         # Variables
         self.selected_book_var = tk.StringVar(self)
         self.selected_chapter_var = tk.StringVar(self)
         self.search_var = tk.StringVar(self)
+        self.ranked_var = tk.BooleanVar(self, value=False)
+        self.status_var = tk.StringVar(self)
         self.chapter_popup = None
 
+        # Results still waiting to be inserted, see show_results(), and the
+        # timings of the search they came from for the status bar
+        self.pending_results = []
+        self.pending_pos = 0
+        self.populate_job = None
+        self.search_timings = ""
+        self.search_total = 0
+        self.search_suggestion = None
+        self.render_seconds = 0.0
+
         # Load data
-        self.data = self.load_data("biblesearch.txt")
+        self.engine = self.load_data("biblesearch.txt")
+
+        # Search worker, see perform_search() and poll_results().  It's the only
+        # thread that uses the engine, whose result cache and lazily built
+        # speller aren't locked, so completions go through it as well.
+        self.worker = SearchWorker(
+            self.run_search, self.engine.timings, complete=self.run_complete
+        )
+        self.worker.start()
+        self.search_token = None
+        self.completion_token = None
+        self.completion_prefix = None
+        self.search_quiet = False
+        self.poll_job = None
+        self.debounce_job = None
+        self.search_var.trace_add("write", self.on_search_changed)
 
         # Search
         self.search_entry = ttk.Entry(self, textvariable=self.search_var, width=50)
         self.search_entry.grid(column=0, row=0, padx=10, pady=10, sticky="ew")
+        self.search_entry.bind("<KeyRelease>", self.update_completions)
+        self.search_entry.bind("<Down>", self.focus_completions)
+        self.search_entry.bind("<Escape>", lambda event: self.hide_completions())
+
+        # Autocomplete, placed under the search box while there are words
+        self.completion_list = tk.Listbox(
+            self, height=COMPLETIONS, exportselection=False
+        )
+        self.completion_list.bind("<Return>", self.accept_completion)
+        self.completion_list.bind("<Double-1>", self.accept_completion)
+        self.completion_list.bind("<Escape>", self.cancel_completion)
 
         # Dropdowns
-        book_names = [book_data[2] for book_data in books.values()]
+        book_names = ["All Books"] + [book.name for book in self.engine.books()]
         self.book_dropdown = ttk.Combobox(
             self, textvariable=self.selected_book_var, values=book_names
         )
@@ -175,13 +181,20 @@ class BibleSearchApp(tk.Tk):
         self.search_button.grid(column=3, row=0, padx=10, pady=10)
         self.go_button = ttk.Button(self, text="Go", command=self.go_to_chapter)
         self.go_button.grid(column=4, row=0, padx=10, pady=10)
+        self.ranked_check = ttk.Checkbutton(
+            self,
+            text="Best first",
+            variable=self.ranked_var,
+            command=self.on_ranked_changed,
+        )
+        self.ranked_check.grid(column=5, row=0, padx=10, pady=10)
 
         # Results tree
         self.tree = ttk.Treeview(
             self, columns=("Book", "Chapter", "VerseNum", "Verse"), show="headings"
         )
 
-        max_book_length = max(len(book_data[2]) for book_data in books.values())
+        max_book_length = max(len(name) for name in book_names)
         id_width = 0
         book_width = min(150, max_book_length * 12)
         chapter_width = 50
@@ -206,10 +219,18 @@ class BibleSearchApp(tk.Tk):
         self.tree.heading("VerseNum", text="V#")
         self.tree.heading("Verse", text="Verse")
 
-        self.tree.grid(column=0, row=1, columnspan=5, padx=10, pady=10, sticky="nsew")
+        self.tree.grid(column=0, row=1, columnspan=6, padx=10, pady=10, sticky="nsew")
 
-        # Create an invisible image to adjust row height in treeview
-        self.transparent_image = tk.PhotoImage(width=1, height=25)
+        # Status bar
+        self.status_label = ttk.Label(self, textvariable=self.status_var, anchor="w")
+        self.status_label.grid(
+            column=0, row=2, columnspan=6, padx=10, pady=(0, 5), sticky="ew"
+        )
+        self.status_label.bind("<Button-1>", lambda event: self.show_stats())
+        self.status_var.set(
+            f"{len(self.engine):,} verses, "
+            + self.engine.timings.summary(["load", "index"])
+        )
 
         self.grid_columnconfigure(0, weight=2)
         self.grid_rowconfigure(1, weight=1)
@@ -258,16 +279,16 @@ class BibleSearchApp(tk.Tk):
         """
         Load Bible data from a file.
 
+        The text file is compiled to a binary corpus next to it the first
+        time (and whenever it changes), later runs just map that in.
+
         Parameters:
         - filename (str): Path to the file containing Bible data.
 
         Returns:
-        - list[str]: List of lines (verses) loaded from the file.
+        - BibleEngine: The loaded engine.
         """
-        #with open(filename, "r", encoding="utf-8") as f:
-        #    return f.readlines()
-        with open(filename, "r", encoding="windows-1252") as f:
-            return f.readlines()
+        return BibleEngine(filename)
 
     def update_chapters(self, event):
         """
@@ -280,101 +301,332 @@ class BibleSearchApp(tk.Tk):
         if book_full_name == "All Books":
             self.chapter_dropdown["values"] = ["ALL"]
             return
-        abbrev = next(
-            abbrev
-            for abbrev, book_data in books.items()
-            if book_data[2] == book_full_name
-        )
-        max_chapter = books[abbrev][1]
+        max_chapter = self.engine.chapter_count(book_full_name)
         self.chapter_dropdown["values"] = ["ALL"] + list(range(1, max_chapter + 1))
 
-    def perform_search(self):
+    def on_search_changed(self, *args):
         """
-        Search the Bible data based on user's input and display the results.
+        Search as you type: restart the debounce timer on every keystroke
+        and only search once typing pauses.
+        """
+        if self.debounce_job is not None:
+            self.after_cancel(self.debounce_job)
+        self.debounce_job = self.after(SEARCH_DEBOUNCE_MS, self.search_as_you_type)
+
+    def search_as_you_type(self):
+        """
+        Run the debounced search.  Half typed queries are often invalid
+        (`love AND`), so errors aren't shown for these.
         """
+        self.debounce_job = None
+        if self.search_var.get().strip():
+            self.perform_search(quiet=True)
 
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def update_completions(self, event):
+        """
+        Look up the words that start with the word being typed.  The worker
+        does the lookup, show_completions() lists them once it's done.
 
-        search_str = self.search_var.get().lower()
-        selected_book_full = self.selected_book_var.get()
-        selected_chapter = self.selected_chapter_var.get()
+        Event Params:
+        - event: The key release in the search box.
+        """
+        if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+            return
+        prefix = self.typed_word()
+        if prefix is None or len(prefix) < COMPLETE_FROM:
+            self.completion_token = None
+            self.hide_completions()
+            return
+        self.completion_prefix = prefix
+        self.completion_token = self.worker.submit(prefix, kind="complete")
+        if self.poll_job is None:
+            self.poll_job = self.after(RESULT_POLL_MS, self.poll_results)
 
-        # Filter data based on selected book and chapter
-        if selected_book_full != "All Books":
-            abbrev = next(
-                abbrev
-                for abbrev, book_data in books.items()
-                if book_data[2] == selected_book_full
-            )
-            filtered_data = [line for line in self.data if line.startswith(abbrev)]
-            if selected_chapter != "ALL":
-                filtered_data = [
-                    line
-                    for line in filtered_data
-                    if line.split()[1].startswith(selected_chapter + ":")
-                ]
-        else:
-            filtered_data = self.data
-
-        # Using regex to search for whole word matches
-        pattern = r"(?:\W|^)" + re.escape(search_str) + r"(?:\W|$)"
-        for line in filtered_data:
-            if re.search(pattern, line, re.IGNORECASE):  # Using re.IGNORECASE to make it case insensitive
-                parts = re.match(r"(\w+) (\d+):(\d+) (.+)", line)
-                if parts:
-                    book_abbrev, chapter, verse_num, verse_text = parts.groups()
-                    book_full = books[book_abbrev][2]
-                    self.tree.insert(
-                        "",
-                        "end",
-                        values=(book_full, chapter, verse_num, verse_text),
-                        image=self.transparent_image,
-                    )
-
-    def perform_search2(self):
+    def typed_word(self):
         """
-        Search the Bible data based on user's input and display the results.
+        Returns:
+        - str or None: The word before the cursor in the search box.
+        """
+        before = self.search_var.get()[: self.search_entry.index(tk.INSERT)]
+        match = re.search(r"\w+$", before)
+        return match.group() if match else None
+
+    def run_complete(self, prefix):
+        """
+        Words to offer for a prefix.  Runs on the worker thread.
+
+        Parameters:
+        - prefix (str): The word being typed.
+
+        Returns:
+        - list[str]: Completions, none if the word is already whole.
+        """
+        words = self.engine.complete(prefix, COMPLETIONS)
+        if words == [prefix.lower()]:
+            words = []
+        return words
+
+    def show_completions(self, prefix, words):
+        """
+        List the words the worker found, unless the word being typed has
+        changed since.
+
+        Parameters:
+        - prefix (str): The word they were looked up for.
+        - words (list[str]): Completions.
+        """
+        if not words or prefix != self.typed_word():
+            self.hide_completions()
+            return
+        self.completion_list.delete(0, tk.END)
+        self.completion_list.insert(tk.END, *words)
+        self.completion_list.configure(height=len(words))
+        self.completion_list.place(in_=self.search_entry, x=0, rely=1.0, relwidth=1.0)
+        self.completion_list.lift()
+
+    def focus_completions(self, event):
+        """
+        Move from the search box into the word list, if it's showing.
+        """
+        if not self.completion_list.winfo_ismapped():
+            return None
+        self.completion_list.focus_set()
+        self.completion_list.selection_clear(0, tk.END)
+        self.completion_list.selection_set(0)
+        self.completion_list.activate(0)
+        return "break"
+
+    def accept_completion(self, event):
+        """
+        Replace the word being typed with the picked one, which searches.
+        """
+        chosen = self.completion_list.get(tk.ACTIVE)
+        text = self.search_var.get()
+        cursor = self.search_entry.index(tk.INSERT)
+        before = re.sub(r"\w+$", chosen, text[:cursor])
+        self.search_var.set(before + text[cursor:])
+        self.search_entry.icursor(len(before))
+        self.cancel_completion(event)
+        return "break"
+
+    def cancel_completion(self, event):
+        self.hide_completions()
+        self.search_entry.focus_set()
+        return "break"
+
+    def hide_completions(self):
+        self.completion_list.place_forget()
+
+    def on_ranked_changed(self):
+        """
+        Search again when "Best first" is toggled.
         """
+        if self.search_var.get().strip():
+            self.perform_search(quiet=True)
+
+    def perform_search(self, quiet=False):
+        """
+        Search the Bible data based on user's input and display the results.
 
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        The search itself runs on the worker thread, this only hands it the
+        query and starts polling for the result.  Any search still running
+        is cancelled and its results are thrown away.
 
-        search_str = self.search_var.get().lower()
+        Parameters:
+        - quiet (bool): Don't pop up a message for an invalid query.
+        """
+        if self.debounce_job is not None:
+            self.after_cancel(self.debounce_job)
+            self.debounce_job = None
+
+        query = self.search_var.get()
         selected_book_full = self.selected_book_var.get()
         selected_chapter = self.selected_chapter_var.get()
 
-        # Filter data based on selected book and chapter
-        if selected_book_full != "All Books":
-            abbrev = next(
-                abbrev
-                for abbrev, book_data in books.items()
-                if book_data[2] == selected_book_full
+        # Only keep hits in the selected book and chapter
+        scope = self.scope_ranges(selected_book_full, selected_chapter)
+
+        self.search_token = self.worker.submit(query, scope, self.ranked_var.get())
+        self.search_quiet = quiet
+        if self.poll_job is None:
+            self.poll_job = self.after(RESULT_POLL_MS, self.poll_results)
+
+    def poll_results(self):
+        """
+        Pick up finished searches and completions from the worker on the Tk
+        thread.  Results of anything but the latest of each are dropped.
+        """
+        self.poll_job = None
+        while True:
+            try:
+                token, result, error, timings = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if token is self.completion_token:
+                self.completion_token = None
+                self.show_completions(self.completion_prefix, result or [])
+                continue
+            if token is not self.search_token:
+                continue
+            self.search_token = None
+            if error is None:
+                hits, total, suggestion = result
+                self.show_results(hits, timings, total, suggestion)
+            elif not self.search_quiet:
+                messagebox.showinfo("Info", f"Invalid search: {error}")
+
+        if self.search_token is not None or self.completion_token is not None:
+            self.poll_job = self.after(RESULT_POLL_MS, self.poll_results)
+
+    def run_search(self, query, scope, ranked=False):
+        """
+        Find the verses matching a query.  Runs on the worker thread, so it
+        must not touch any widgets.
+
+        Parameters:
+        - query (str): Search text as typed.
+        - scope (list[tuple[int, int]] or None): Ordinal ranges to stay in.
+        - ranked (bool): Only the best RANKED_RESULTS verses, best first.
+
+        Returns:
+        - tuple[list[int], int, str]: Verse ordinals to show, how many
+          verses matched in all, and a corrected search if none did.
+
+        Raises:
+        - ValueError: For an invalid query.
+        """
+        hits = self.engine.search(query, scope, mode="word")
+        if not hits:
+            return hits, 0, self.engine.suggest(query)
+        if ranked:
+            best = self.engine.ranked(query, scope, "word", RANKED_RESULTS)
+            return best, len(hits), None
+        return hits, len(hits), None
+
+    def show_results(self, hits, timings="", total=None, suggestion=None):
+        """
+        Replace the results tree with the given verses.
+
+        The first page is inserted right away and the rest is streamed in by
+        `after()` callbacks, so the window stays responsive however many
+        verses matched.  Starting a new search cancels whatever is still
+        being streamed from the last one.
+
+        Parameters:
+        - hits (list[int]): Verse ordinals to show, in order.
+        - timings (str): How long the search took, for the status bar.
+        - total (int, optional): How many verses matched, if more than are
+          shown.
+        - suggestion (str, optional): A corrected search, for no results.
+        """
+        if self.populate_job is not None:
+            self.after_cancel(self.populate_job)
+            self.populate_job = None
+
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+
+        self.pending_results = hits
+        self.pending_pos = 0
+        self.search_timings = timings
+        self.search_total = len(hits) if total is None else total
+        self.search_suggestion = suggestion
+        self.render_seconds = 0.0
+        self.insert_results(RESULTS_FIRST_PAGE)
+
+    def insert_results(self, count):
+        """
+        Insert the next `count` pending results, then schedule the next chunk
+        if there are more.
+
+        Parameters:
+        - count (int): How many rows to insert now.
+        """
+        self.populate_job = None
+        started = time.perf_counter()
+        start = self.pending_pos
+        self.pending_pos = min(start + count, len(self.pending_results))
+        for i in range(start, self.pending_pos):
+            values = self.result_values(self.pending_results[i])
+            if values:
+                self.tree.insert("", "end", values=values)
+        # render time is the chunks added up, not the gaps between them
+        self.render_seconds += time.perf_counter() - started
+
+        if self.pending_pos < len(self.pending_results):
+            self.populate_job = self.after(
+                RESULTS_CHUNK_DELAY_MS, self.insert_results, RESULTS_CHUNK
             )
-            filtered_data = [line for line in self.data if line.startswith(abbrev)]
-            if selected_chapter != "ALL":
-                filtered_data = [
-                    line
-                    for line in filtered_data
-                    if line.split()[1].startswith(selected_chapter + ":")
-                ]
+            self.show_status("rendering...")
+        else:
+            self.engine.timings.add("render", self.render_seconds)
+            self.show_status("render %.1f ms" % (self.render_seconds * 1000))
+
+    def show_status(self, rendering):
+        """
+        Put the verse count and the timings of the last search in the
+        status bar.
+
+        Parameters:
+        - rendering (str): How far along inserting the results is.
+        """
+        shown = len(self.pending_results)
+        if not shown and self.search_suggestion:
+            parts = [f"no verses, did you mean: {self.search_suggestion}?"]
+        elif shown < self.search_total:
+            parts = [f"best {shown:,} of {self.search_total:,} verses"]
         else:
-            filtered_data = self.data
-
-        for line in filtered_data:
-            if search_str in line.lower():
-                parts = re.match(r"(\w+) (\d+):(\d+) (.+)", line)
-                if parts:
-                    book_abbrev, chapter, verse_num, verse_text = parts.groups()
-                    book_full = books[book_abbrev][2]
-                    self.tree.insert(
-                        "",
-                        "end",
-                        values=(book_full, chapter, verse_num, verse_text),
-                        image=self.transparent_image,
-                    )
+            parts = [f"{shown:,} verses"]
+        if self.search_timings:
+            parts.append(self.search_timings)
+        parts.append(rendering)
+        self.status_var.set(", ".join(parts))
+
+    def show_stats(self):
+        """
+        Show the running totals of every timing span and the search cache.
+        """
+        cache = self.engine.query_cache.stats()
+        report = self.engine.timings.report() + (
+            f"\n\nsearch cache: {cache['hits']} hits, {cache['misses']} misses,"
+            f" {cache['entries']} entries"
+        )
+        window = tk.Toplevel(self)
+        window.title("Timings")
+        text = tk.Text(window, font=("Courier", 12), width=64, height=16)
+        text.insert(tk.END, report)
+        text.config(state=tk.DISABLED)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def result_values(self, ordinal):
+        """
+        Row values for one verse in the results tree.
+
+        Parameters:
+        - ordinal (int): Verse ordinal.
+
+        Returns:
+        - tuple or None: (book, chapter, verse number, verse text).
+        """
+        verse = self.engine.verse(ordinal)
+        return (verse.name, verse.chapter, verse.number, verse.text)
+
+    def scope_ranges(self, book_full_name, chapter):
+        """
+        Ordinal ranges that limit results to the selected scope.
+
+        Parameters:
+        - book_full_name (str): Full name of the book, or "All Books".
+        - chapter (str): Chapter number, or "ALL".
+
+        Returns:
+        - list[tuple[int, int]] or None: (first, end) ranges, None for
+          everything.
+        """
+        if book_full_name == "All Books":
+            return None
+        return self.engine.scope(book_full_name, None if chapter == "ALL" else chapter)
 
     def get_verses_for_chapter(self, book_full_name, chapter):
         """
@@ -387,17 +639,27 @@ class BibleSearchApp(tk.Tk):
         Returns:
         - list[str]: List of verses for the given book and chapter.
         """
-        abbrev = next(
-            abbrev
-            for abbrev, book_data in books.items()
-            if book_data[2] == book_full_name
-        )
-        chapter_prefix = f"{abbrev} {chapter}:"
-        return [
-            " ".join(line.split()[2:])
-            for line in self.data
-            if line.startswith(chapter_prefix)
-        ]
+        # the engine knows which ordinals each chapter covers, so this only
+        # touches the verses of the chapter
+        verses = self.engine.iter_chapter(book_full_name, chapter)
+        return [verse.text for verse in verses]
+
+    def get_red_letter_verses(self, book_full_name, chapter):
+        """
+        Verse numbers in a chapter that are words of Jesus.
+
+        Parameters:
+        - book_full_name (str): Full name of the book.
+        - chapter (str): Chapter number.
+
+        Returns:
+        - set[int]: Verse numbers flagged red letter in the corpus.
+        """
+        return {
+            verse.number
+            for verse in self.engine.iter_chapter(book_full_name, chapter)
+            if verse.red_letter
+        }
 
     def go_to_chapter(self):
         """
@@ -418,6 +680,74 @@ class BibleSearchApp(tk.Tk):
         )
 
 
+class SearchWorker(threading.Thread):
+    """
+    Runs searches off the Tk event thread so the window never blocks.
+
+    Each request carries a cancel token (a threading.Event).  Submitting a
+    new request cancels the previous one of the same kind: the worker skips
+    cancelled requests still in the queue and never posts results for a
+    request that was cancelled while it ran.  Results go on `results`, which
+    the app polls with `after()` so only the Tk thread touches widgets.
+
+    Parameters:
+    - search (callable): Takes the arguments given to submit() and returns
+      the result, or raises ValueError for an invalid query.  Any other exception is
+      reported the same way rather than killing the worker.
+    - timings (Timings): Where the search records its spans.  Only this
+      thread searches, so the spans since the start of a search are its own.
+    - complete (callable, optional): Takes the arguments given to
+      submit(..., kind="complete") and returns completions.
+
+    Attributes:
+    - requests (queue.Queue): (token, kind, arguments) waiting to run.
+    - results (queue.Queue): (token, result, error, timings summary) of
+      finished searches.
+    """
+
+    def __init__(self, search, timings, complete=None):
+        super().__init__(daemon=True)
+        self.jobs = {"search": search, "complete": complete}
+        self.timings = timings
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.current = {}
+
+    def submit(self, *args, kind="search"):
+        """
+        Queue a search or completion, cancelling the one of the same kind
+        before it.
+
+        Parameters:
+        - *args: For the callable, e.g. (query, scope, ranked).
+        - kind (str): "search" or "complete".
+
+        Returns:
+        - threading.Event: The cancel token, which also identifies the result.
+        """
+        previous = self.current.get(kind)
+        if previous is not None:
+            previous.set()
+        token = threading.Event()
+        self.current[kind] = token
+        self.requests.put((token, kind, args))
+        return token
+
+    def run(self):
+        while True:
+            token, kind, args = self.requests.get()
+            if token.is_set():
+                continue
+            mark = self.timings.mark()
+            try:
+                result, error = self.jobs[kind](*args), None
+            except Exception as e:
+                result, error = None, e
+            if not token.is_set():
+                summary = self.timings.summary(since=mark)
+                self.results.put((token, result, error, summary))
+
+
 class ChapterPopup(tk.Toplevel):
     """
     Initialize a popup window to display the verses of a given book and chapter.
@@ -483,6 +813,7 @@ class ChapterPopup(tk.Toplevel):
         # Configure the tags for bold, italic and highlight, etc
         self.text_widget.tag_configure("bold", font=("Arial", 14, "bold"))
         self.text_widget.tag_configure("highlight", background="yellow")
+        self.text_widget.tag_configure("red", foreground="red")
 
         # Populate the text widget with the verses from the list passed
         self.populate_verses(verses)
@@ -501,18 +832,19 @@ class ChapterPopup(tk.Toplevel):
         the provided list. The inserted verses are formatted with their
         corresponding verse number in bold. If a verse number matches the
         `highlight_verse` attribute, that verse is highlighted with a yellow background.
+        Words of Jesus are shown in red.
         """
+        red = self.parent.get_red_letter_verses(self.book, self.chapter)
         self.text_widget.delete(1.0, tk.END)
         for idx, verse in enumerate(verses, start=1):
             reference = f"{idx}.  "
+            tags = ("red",) if idx in red else ()
 
             # Highlight the specific verse if specified
             if self.highlight_verse and idx == self.highlight_verse:
-                self.text_widget.insert(tk.END, reference, ("bold", "highlight"))
-                self.text_widget.insert(tk.END, f" {verse}\n\n", "highlight")
-            else:
-                self.text_widget.insert(tk.END, reference, "bold")
-                self.text_widget.insert(tk.END, f" {verse}\n\n")
+                tags += ("highlight",)
+            self.text_widget.insert(tk.END, reference, ("bold",) + tags)
+            self.text_widget.insert(tk.END, f" {verse}\n\n", tags)
 
     def next_chapter(self):
         """
@@ -559,6 +891,23 @@ class ChapterPopup(tk.Toplevel):
             self.prev_button.config(state=tk.DISABLED)
 
 
+def main():
+    """
+    Launch the app, under cProfile and tracemalloc if asked.
+    """
+    parser = argparse.ArgumentParser(description="Bible Verse Viewer")
+    parser.add_argument("--cprofile", metavar="FILE", help="write cProfile stats")
+    parser.add_argument("--tracemalloc", metavar="FILE", help="write allocations")
+    args = parser.parse_args()
+
+    with ExitStack() as dumps:
+        if args.cprofile:
+            dumps.enter_context(profiled(args.cprofile))
+        if args.tracemalloc:
+            dumps.enter_context(traced_memory(args.tracemalloc))
+        app = BibleSearchApp()
+        app.mainloop()
+
+
 if __name__ == "__main__":
-    app = BibleSearchApp()
-    app.mainloop()
+    main()